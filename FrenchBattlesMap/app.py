@@ -4,24 +4,36 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import inspect
+from services.database import RoutingSession, configure_database
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# INFO par défaut : les messages DEBUG ne sont ni formatés ni émis en production
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
 # Initialize Flask extensions
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 # Configure caching
+# Cache partagé entre les workers gunicorn : Redis si configuré, sinon un
+# fichier SQLite local borné par un budget en octets (éviction LRU)
 cache_config = {
-    'CACHE_TYPE': 'simple',  # Using simple cache for development
     'CACHE_DEFAULT_TIMEOUT': 300,  # Default timeout in seconds
-    'CACHE_THRESHOLD': 1000,  # Maximum number of items in the cache
     'CACHE_KEY_PREFIX': 'battles_',  # Prefix for all cache keys
 }
+if os.environ.get("CACHE_REDIS_URL"):
+    cache_config.update({
+        'CACHE_TYPE': 'RedisCache',
+        'CACHE_REDIS_URL': os.environ["CACHE_REDIS_URL"],
+    })
+else:
+    cache_config.update({
+        'CACHE_TYPE': 'services.cache_backend.SQLiteLRUCache',
+        'CACHE_DIR': os.environ.get("CACHE_DIR"),  # Par défaut : instance/cache
+        'CACHE_MAX_BYTES': int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    })
 cache = Cache(config=cache_config)
 
 # Create Flask app
@@ -29,32 +41,26 @@ app = Flask(__name__)
 
 # Configure app
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "historical-battles-secret-key")
-# Use SQLite database with absolute path
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///battles.db"
+# DATABASE_URL (SQLite dans instance/ par défaut), pool de connexions et réplique en lecture
+configure_database(app)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize extensions with app
 db.init_app(app)
 cache.init_app(app)
 
-# Import routes after app creation to avoid circular imports
-with app.app_context():
-    logging.info("Creating database tables...")
-    try:
-        import models  # Import models to ensure they are registered
-        # Check if tables need to be created using inspector
-        inspector = inspect(db.engine)
-        if not inspector.has_table("battle"):
-            # Create all tables with new schema
-            db.create_all()
-            logging.info("Database tables created successfully")
-
-            # Import routes and initialize database with mock data
-            import routes  # noqa: F401
-            routes.init_db()  # Initialize database with mock data
-        else:
-            logging.info("Tables already exist, skipping creation")
-            import routes  # noqa: F401
-    except Exception as e:
-        logging.error(f"Error creating database: {str(e)}")
-        raise
\ No newline at end of file
+# Import routes after app creation to avoid circular imports.
+# Le schéma et les données sont gérés par `flask --app app init-db` (voir migrations.py) :
+# l'import dans un worker se limite à enregistrer les modèles et les routes.
+import models  # noqa: F401
+import routes  # noqa: F401
+import commands  # noqa: F401  # Commandes CLI (flask init-db, flask load-battles, ...)
+from services import instrumentation
+instrumentation.init_app(app)  # Durées par phase, comptage SQL, /metrics
+
+if os.environ.get("AUTO_INIT_DB") == "1":
+    # Option pour les environnements sans étape de déploiement dédiée ;
+    # le verrou fichier évite que les workers initialisent la base en parallèle
+    from migrations import init_database
+    with app.app_context():
+        init_database()
@@ -0,0 +1,330 @@
+"""
+Banc d'essai de l'API et de la chaîne de données.
+
+Pour chaque taille demandée, régénère la base via create_mock_data (durée
+mesurée), puis mesure latences p50/p99 et débit des principaux endpoints
+avec des clients concurrents, à froid puis cache chaud. Mesure enfin
+l'enrichissement contre un serveur HTTP local simulant Gallica et Persée.
+
+La base SQLite configurée (instance/battles.db par défaut) est sauvegardée
+avant la mesure et restaurée ensuite. À exécuter depuis le répertoire du projet :
+
+    python benchmarks/api.py --sizes 15000,150000 --clients 8 --output api.json
+    python benchmarks/api.py --compare api.json        # écarts par rapport à une mesure précédente
+
+Avec --base-url, les requêtes visent un serveur déjà lancé sur la même base
+(par ex. gunicorn) au lieu du client de test Flask.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+STUB_PAGE = """<html><head><title>Résultats</title></head><body><article>
+<h1>Résultats de recherche</h1>
+<p>La bataille fit s'affronter des armées nombreuses ; les chroniques du temps en
+décrivent le déroulement, les forces en présence et les conséquences politiques.</p>
+<p>Les historiens ont depuis discuté les effectifs engagés et la chronologie exacte
+des combats, à partir des sources conservées dans les archives.</p>
+</article></body></html>
+"""
+
+class StubSourceHandler(BaseHTTPRequestHandler):
+    """
+    Répond à toute requête par une page de résultats fixe, après un délai simulant le réseau
+    """
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = STUB_PAGE.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(latency):
+    StubSourceHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubSourceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(sorted_values, p):
+    # Rang le plus proche : pas d'interpolation, valeur réellement observée
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+def summarize(latencies, statuses, wall):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
+
+def make_requester(app, base_url):
+    """
+    Fonction url -> code HTTP, utilisable depuis plusieurs threads
+    """
+    if base_url:
+        import urllib3
+        pool = urllib3.PoolManager(maxsize=64)
+        return lambda url: pool.request('GET', base_url.rstrip('/') + url, preload_content=True).status
+
+    local = threading.local()
+
+    def request(url):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.get(url).status_code
+    return request
+
+def run_load(requester, urls, clients):
+    def timed(url):
+        started = time.perf_counter()
+        status = requester(url)
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(timed, urls))
+    wall = time.perf_counter() - started
+    return summarize([r[0] for r in results], [r[1] for r in results], wall)
+
+def build_scenarios(min_id, max_id, total, requests, rng):
+    """
+    URLs de chaque scénario ; les plages et identifiants varient d'une requête à l'autre
+    """
+    years = [rng.randint(-100, 1900) for _ in range(requests)]
+    return {
+        'battles_marker': [f"/api/battles?format=marker&start_year={y}&end_year={y + 50}" for y in years],
+        'battles_full': [f"/api/battles?start_year={y}&end_year={y + 5}" for y in years],
+        'v1_battles_shallow': [f"/api/v1/battles?limit=50&offset={rng.randrange(0, 1000)}" for _ in range(requests)],
+        'v1_battles_deep': [
+            f"/api/v1/battles?limit=50&offset={max(total - rng.randrange(50, 1050), 0)}" for _ in range(requests)
+        ],
+        'v1_battle_detail': [f"/api/v1/battles/{rng.randint(min_id, max_id)}" for _ in range(requests)],
+        'v1_statistics': ["/api/v1/statistics"] * requests,
+    }
+
+def bench_endpoints(app, requester, scenarios, clients):
+    """
+    Passe à froid puis à chaud pour chaque scénario.
+
+    À froid, un paramètre inutilisé et unique par requête rend chaque clé de
+    cache nouvelle ; à chaud, les mêmes URLs sont rejouées après amorçage.
+    """
+    from services.year_index import year_index
+
+    results = {}
+    for name, urls in scenarios.items():
+        year_index.invalidate()
+        cold_urls = [f"{url}{'&' if '?' in url else '?'}_cold={time.time_ns()}-{i}" for i, url in enumerate(urls)]
+        cold = run_load(requester, cold_urls, clients)
+        for url in set(urls):
+            requester(url)
+        warm = run_load(requester, urls, clients)
+        results[name] = {'cold': cold, 'warm': warm}
+        print(f"  {name}: froid p50 {cold['p50_ms']} ms / p99 {cold['p99_ms']} ms, "
+              f"chaud p50 {warm['p50_ms']} ms / p99 {warm['p99_ms']} ms", file=sys.stderr)
+    return results
+
+def bench_enrichment(db, battle_ids, rng, count):
+    """
+    Enrichissement unitaire (latence par bataille) puis par tâche d'arrière-plan (débit)
+    """
+    from models import Battle, EnrichmentJob
+    from services.battle_enrichment import process_battle_enrichment
+    from services.enrichment_jobs import submit_enrichment_job
+
+    sample = rng.sample(battle_ids, min(count * 2, len(battle_ids)))
+    single_ids, job_ids = sample[:count], sample[count:]
+
+    latencies = []
+    started = time.perf_counter()
+    for battle_id in single_ids:
+        t = time.perf_counter()
+        process_battle_enrichment(db.session.get(Battle, battle_id))
+        latencies.append(time.perf_counter() - t)
+    single = summarize(latencies, [200] * len(latencies), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    job_id = submit_enrichment_job(battle_ids=job_ids, only_missing=False).id
+    while True:
+        db.session.expire_all()
+        job = db.session.get(EnrichmentJob, job_id)
+        if job.status in ('completed', 'failed'):
+            break
+        time.sleep(0.05)
+    wall = time.perf_counter() - started
+    return {
+        'single': single,
+        'job': {
+            'battles': job.total,
+            'status': job.status,
+            'failed': job.failed,
+            'wall_s': round(wall, 3),
+            'throughput_bps': round(job.total / wall, 1),
+        },
+    }
+
+def bench_size(app, db, size, args, requester, rng):
+    from utils import create_mock_data
+    from models import Battle
+
+    print(f"Taille {size} : génération...", file=sys.stderr)
+    started = time.perf_counter()
+    create_mock_data(size, workers=args.workers)
+    seed_s = time.perf_counter() - started
+
+    min_id, max_id, total = db.session.query(
+        db.func.min(Battle.id), db.func.max(Battle.id), db.func.count(Battle.id)
+    ).one()
+    scenarios = build_scenarios(min_id, max_id, total, args.requests, rng)
+    result = {
+        'size': size,
+        'seed_s': round(seed_s, 3),
+        'seed_rows_per_s': round(size / seed_s, 1),
+        'endpoints': bench_endpoints(app, requester, scenarios, args.clients),
+    }
+    if args.enrich:
+        battle_ids = [row[0] for row in db.session.query(Battle.id).limit(10000)]
+        result['enrichment'] = bench_enrichment(db, battle_ids, rng, args.enrich)
+    return result
+
+def copy_sqlite(source, destination):
+    # API de sauvegarde SQLite : copie cohérente, y compris le journal WAL
+    with sqlite3.connect(source) as src, sqlite3.connect(destination) as dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare(previous, current):
+    """
+    Rapport des latences p50/p99 courantes divisées par celles de la mesure précédente
+    """
+    by_size = {entry['size']: entry for entry in previous['results']}
+    for entry in current['results']:
+        before = by_size.get(entry['size'])
+        if before is None:
+            continue
+        print(f"Taille {entry['size']} (seed {entry['seed_s'] / before['seed_s']:.2f}x)", file=sys.stderr)
+        for name, phases in entry['endpoints'].items():
+            for phase, stats in phases.items():
+                old = before['endpoints'].get(name, {}).get(phase)
+                if old:
+                    print(f"  {name} [{phase}] p50 {stats['p50_ms'] / old['p50_ms']:.2f}x, "
+                          f"p99 {stats['p99_ms'] / old['p99_ms']:.2f}x", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='15000', help="Tailles de base, séparées par des virgules (ex. 15000,150000,1500000)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Processus générant les données fictives")
+    parser.add_argument('--clients', type=int, default=8, help="Clients concurrents")
+    parser.add_argument('--requests', type=int, default=200, help="Requêtes par scénario et par passe")
+    parser.add_argument('--enrich', type=int, default=20, help="Batailles enrichies par mode (0 pour ignorer)")
+    parser.add_argument('--stub-latency', type=float, default=0.05, help="Délai (s) du serveur simulant les sources")
+    parser.add_argument('--base-url', help="Serveur à interroger au lieu du client de test Flask")
+    parser.add_argument('--seed', type=int, default=42, help="Graine des requêtes générées")
+    parser.add_argument('--compare', help="Résultats précédents (JSON) à comparer")
+    parser.add_argument('--output', help="Fichier JSON de résultats (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    # Sources simulées, cache de sources jetable et sans limitation de débit par hôte
+    stub = start_stub_server(args.stub_latency)
+    work_dir = tempfile.mkdtemp(prefix='battles-bench-')
+    os.environ['GALLICA_SEARCH_URL'] = f"http://127.0.0.1:{stub.server_port}/gallica"
+    os.environ['PERSEE_SEARCH_URL'] = f"http://127.0.0.1:{stub.server_port}/persee"
+    os.environ['SOURCE_CACHE_DIR'] = os.path.join(work_dir, 'source_cache')
+    os.environ['SOURCE_HOST_INTERVAL'] = '0'
+
+    from app import app, db, cache
+    from migrations import init_lock, apply_migrations
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        parser.error("la mesure remplace les données : seule une base SQLite (sauvegardée puis restaurée) est acceptée")
+    db_path = url.database
+    backup_path = os.path.join(work_dir, 'battles.db')
+    had_db = os.path.exists(db_path)
+    if had_db:
+        copy_sqlite(db_path, backup_path)
+
+    rng = random.Random(args.seed)
+    report = {
+        'benchmark': 'api',
+        'git_commit': git_commit(),
+        'python': sys.version.split()[0],
+        'mode': 'http' if args.base_url else 'test_client',
+        'clients': args.clients,
+        'requests_per_pass': args.requests,
+        'stub_latency_s': args.stub_latency,
+        'results': [],
+    }
+    try:
+        with app.app_context():
+            with init_lock():
+                apply_migrations()
+            requester = make_requester(app, args.base_url)
+            for size in (int(s) for s in args.sizes.split(',')):
+                report['results'].append(bench_size(app, db, size, args, requester, rng))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        stub.shutdown()
+        if had_db:
+            copy_sqlite(backup_path, db_path)
+        elif os.path.exists(db_path):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+        # Les vues mises en cache pendant la mesure ne correspondent plus à la base restaurée.
+        # Avec --base-url, le cache appartient au serveur interrogé : on n'y touche pas
+        if not args.base_url:
+            with app.app_context():
+                cache.clear()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Mesure le temps de démarrage à froid d'un worker.
+
+Lance N processus en parallèle (comme gunicorn au démarrage) qui importent
+l'application puis servent une première requête, et affiche les latences
+en JSON. À exécuter depuis le répertoire du projet :
+
+    python benchmarks/startup.py --workers 4 --runs 3 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SNIPPET = """
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/api/v1/battles/1')
+first_request = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'first_request_s': first_request - imported,
+    'status': response.status_code,
+}))
+"""
+
+def run_worker_batch(workers):
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen([sys.executable, '-c', WORKER_SNIPPET], cwd=PROJECT_DIR,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(workers)
+    ]
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"Le worker a échoué (code {process.returncode})")
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    wall = time.perf_counter() - started
+    return results, wall
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'min': values[0],
+        'median': statistics.median(values),
+        'max': values[-1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help="Processus démarrés simultanément")
+    parser.add_argument('--runs', type=int, default=3, help="Nombre de répétitions")
+    parser.add_argument('--output', help="Fichier JSON de résultats (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    # La base doit être initialisée une fois, hors mesure
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=PROJECT_DIR,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    samples, walls = [], []
+    for _ in range(args.runs):
+        results, wall = run_worker_batch(args.workers)
+        samples.extend(results)
+        walls.append(wall)
+
+    report = {
+        'benchmark': 'startup',
+        'workers': args.workers,
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'import_s': summarize([s['import_s'] for s in samples]),
+        'first_request_s': summarize([s['first_request_s'] for s in samples]),
+        'batch_wall_s': summarize(walls),
+        'errors': sum(1 for s in samples if s['status'] != 200),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import logging
+import click
+from app import app, db, cache
+from services.bulk_loader import bulk_insert_battles, read_csv, read_ndjson
+from services.data_version import bump_data_version
+from services.snapshot import SNAPSHOT_DIR, export_snapshot, refresh_snapshot
+from utils import MOCK_SEED, MOCK_WORKERS, create_mock_data
+from migrations import init_database, current_schema_version, MIGRATIONS
+
+@app.cli.command('init-db')
+@click.option('--reseed', is_flag=True, help="Régénérer les données fictives même si le seed est à jour")
+def init_db(reseed):
+    """
+    Applique les migrations du schéma et génère les données si nécessaire
+    """
+    applied, seeded = init_database(reseed=reseed)
+    click.echo(f"Schéma en version {current_schema_version()} / {MIGRATIONS[-1][0]}"
+               f" ({len(applied)} migration(s) appliquée(s)), données {'générées' if seeded else 'inchangées'}")
+
+@app.cli.command('load-battles')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help="Format du fichier (déduit de l'extension par défaut)")
+@click.option('--replace', is_flag=True, help="Remplacer les batailles existantes")
+@click.option('--chunk-size', default=10000, show_default=True, help="Nombre de lignes par executemany")
+def load_battles(source, input_format, replace, chunk_size):
+    """
+    Charge des batailles depuis un fichier CSV ou NDJSON ("-" pour l'entrée standard)
+    """
+    if input_format is None:
+        input_format = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    reader = read_ndjson if input_format == 'ndjson' else read_csv
+
+    try:
+        total = bulk_insert_battles(reader(source), replace=replace, chunk_size=chunk_size)
+    except ValueError as e:
+        # Transaction annulée : aucune ligne du fichier n'est conservée
+        raise click.ClickException(str(e))
+    bump_data_version()
+    db.session.commit()
+    cache.clear()
+    refresh_snapshot()
+    logging.info("%s batailles chargées depuis %s", total, source.name)
+    click.echo(f"{total} batailles chargées")
+
+@app.cli.command('generate-battles')
+@click.option('--size', type=click.IntRange(min=1), default=None,
+              help="Nombre de batailles (15 000 par défaut, réparties comme le seed)")
+@click.option('--seed', type=int, default=MOCK_SEED, show_default=True, help="Graine du générateur")
+@click.option('--workers', type=click.IntRange(min=1), default=MOCK_WORKERS, show_default=True,
+              help="Processus de génération (sans effet sur les données produites)")
+def generate_battles(size, seed, workers):
+    """
+    Remplace les batailles par des données fictives reproductibles (tests de charge)
+    """
+    create_mock_data(size, seed=seed, workers=workers)
+    refresh_snapshot()
+    click.echo(f"{size or 15000} batailles générées (graine {seed})")
+
+@app.cli.command('export-snapshot')
+@click.option('--output', default=SNAPSHOT_DIR, show_default=True, help="Répertoire de destination")
+@click.option('--period', type=click.Choice(['10', '100']), default='100', show_default=True,
+              help="Largeur des périodes en années (décennie ou siècle)")
+@click.option('--tile-degrees', type=float, default=None, help="Découper aussi chaque période en tuiles de N degrés")
+@click.option('--prune', is_flag=True, help="Supprimer les fichiers absents du nouveau manifeste")
+def export_snapshot_command(output, period, tile_degrees, prune):
+    """
+    Exporte les marqueurs en fichiers statiques versionnés (servis par nginx ou un CDN)
+    """
+    manifest = export_snapshot(output, period_size=int(period), tile_degrees=tile_degrees, prune=prune)
+    click.echo(f"{manifest['total']} batailles exportées en {len(manifest['shards'])} fichiers dans {output}")
@@ -1,4 +1,8 @@
 from app import app
 
 if __name__ == "__main__":
+    # Serveur de développement : initialiser la base avant de démarrer
+    from migrations import init_database
+    with app.app_context():
+        init_database()
     app.run(host="0.0.0.0", port=5000, debug=True)
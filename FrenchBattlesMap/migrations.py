@@ -0,0 +1,239 @@
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app import app, db
+from models import (Battle, BattleChange, BattleStatistic, BattleValue, DataVersion, YearHistogram, GridHistogram,
+                    BATTLE_TYPES)
+
+# Version des données fictives : l'incrémenter force une régénération au prochain init-db
+SEED_VERSION = 1
+SEED_VERSION_NAME = 'seed'
+
+def _initial_schema(conn):
+    db.metadata.create_all(conn)
+
+def _battle_type_and_statistics(conn):
+    from services.statistics import refresh_statistics
+
+    columns = {column['name'] for column in inspect(conn).get_columns('battle')}
+    if 'battle_type' not in columns:
+        conn.execute(text("ALTER TABLE battle ADD COLUMN battle_type VARCHAR(50)"))
+    # Même règle que battle_type_from_name : premier mot du nom
+    conn.execute(text(
+        "UPDATE battle SET battle_type = CASE "
+        + " ".join(f"WHEN name LIKE '{t} %' THEN '{t}'" for t in BATTLE_TYPES)
+        + " END WHERE battle_type IS NULL"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_battle_year ON battle (year)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_battle_battle_type ON battle (battle_type)"))
+    BattleStatistic.__table__.create(conn, checkfirst=True)
+    refresh_statistics(conn)
+
+def _search_index(conn):
+    from services.search import create_search_index
+
+    if conn.dialect.name != 'sqlite':
+        logging.warning("Index plein texte non créé : FTS5 n'est disponible qu'avec SQLite")
+        return
+    # Rempli par la migration 8, une fois les colonnes encodées en dictionnaire
+    create_search_index(conn)
+
+def _spatial_index(conn):
+    from services.spatial import create_spatial_index, rebuild_spatial_index
+
+    if conn.dialect.name != 'sqlite':
+        logging.warning("Index R*Tree non créé : filtres spatiaux par parcours de la table")
+        return
+    create_spatial_index(conn)
+    rebuild_spatial_index(conn)
+
+def _data_version_timestamp(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('data_version')}
+    if 'updated_at' not in columns:
+        conn.execute(text("ALTER TABLE data_version ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text(
+        "INSERT INTO data_version (name, version, updated_at) "
+        "SELECT 'content', COALESCE(MAX(version), 0), :now FROM data_version WHERE name = 'battles' "
+        "AND NOT EXISTS (SELECT 1 FROM data_version WHERE name = 'content')"
+    ), {'now': datetime.utcnow()})
+
+def _year_histograms(conn):
+    from services.histogram import rebuild_histograms
+
+    YearHistogram.__table__.create(conn, checkfirst=True)
+    GridHistogram.__table__.create(conn, checkfirst=True)
+    rebuild_histograms(conn)
+
+def _change_log(conn):
+    from services.changes import record_reset
+
+    columns = {column['name'] for column in inspect(conn).get_columns('battle')}
+    if 'version' not in columns:
+        conn.execute(text("ALTER TABLE battle ADD COLUMN version INTEGER"))
+    if 'updated_at' not in columns:
+        conn.execute(text("ALTER TABLE battle ADD COLUMN updated_at TIMESTAMP"))
+    BattleChange.__table__.create(conn, checkfirst=True)
+    # Point de départ du journal : les clients plus anciens rechargent tout
+    record_reset(conn)
+
+def _job_heartbeat(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('enrichment_job')}
+    if 'worker' not in columns:
+        conn.execute(text("ALTER TABLE enrichment_job ADD COLUMN worker VARCHAR(100)"))
+    if 'heartbeat_at' not in columns:
+        conn.execute(text("ALTER TABLE enrichment_job ADD COLUMN heartbeat_at TIMESTAMP"))
+
+# Anciennes colonnes texte remplacées par une référence vers battle_value
+_ENCODED_COLUMNS = ('participants', 'outcome', 'image_url', 'media_urls')
+_ENCODING_BATCH_SIZE = 10000
+
+def _dictionary_encoding(conn):
+    from services.search import rebuild_search_index
+    from services.value_dictionary import value_dictionary, split_context
+
+    BattleValue.__table__.create(conn, checkfirst=True)
+    columns = {column['name'] for column in inspect(conn).get_columns('battle')}
+    for column in ('participants_id', 'outcome_id', 'context_id', 'image_url_id', 'media_urls_id'):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE battle ADD COLUMN {column} INTEGER"))
+    if 'context_detail' not in columns:
+        conn.execute(text("ALTER TABLE battle ADD COLUMN context_detail TEXT"))
+
+    legacy = [column for column in _ENCODED_COLUMNS + ('historical_context',) if column in columns]
+    if legacy:
+        # Conversion par tranches d'identifiants : mises à jour par clé primaire uniquement
+        last_id = 0
+        while True:
+            rows = conn.execute(text(
+                f"SELECT id, {', '.join(legacy)} FROM battle WHERE id > :last ORDER BY id LIMIT :size"
+            ), {'last': last_id, 'size': _ENCODING_BATCH_SIZE}).mappings().all()
+            if not rows:
+                break
+            contexts = [split_context(row.get('historical_context')) for row in rows]
+            ids = value_dictionary.encode_many(
+                conn, [row.get(column) for row in rows for column in _ENCODED_COLUMNS] + [p for p, _ in contexts]
+            )
+            conn.execute(text(
+                "UPDATE battle SET participants_id = :participants, outcome_id = :outcome, "
+                "image_url_id = :image_url, media_urls_id = :media_urls, "
+                "context_id = :context, context_detail = :detail WHERE id = :id"
+            ), [
+                {**{column: ids.get(row.get(column)) for column in _ENCODED_COLUMNS},
+                 'context': ids.get(prefix), 'detail': detail, 'id': row['id']}
+                for row, (prefix, detail) in zip(rows, contexts)
+            ])
+            last_id = rows[-1]['id']
+        for column in legacy:
+            conn.execute(text(f"ALTER TABLE battle DROP COLUMN {column}"))
+        logging.info("Colonnes %s encodées en dictionnaire ; VACUUM récupère l'espace libéré", ', '.join(legacy))
+
+    if conn.dialect.name == 'sqlite':
+        rebuild_search_index(conn)
+
+# Migrations versionnées, appliquées dans l'ordre et une seule fois.
+# Chaque fonction reçoit une connexion dans une transaction ouverte.
+MIGRATIONS = [
+    (1, "Schéma initial", _initial_schema),
+    (2, "Colonne battle_type, index et statistiques agrégées", _battle_type_and_statistics),
+    (3, "Index de recherche plein texte (FTS5)", _search_index),
+    (4, "Index spatial R*Tree (latitude, longitude, année)", _spatial_index),
+    (5, "Version de contenu datée (ETag / Last-Modified)", _data_version_timestamp),
+    (6, "Histogrammes par année, par type et par cellule de grille", _year_histograms),
+    (7, "Journal des modifications (version et updated_at par bataille)", _change_log),
+    (8, "Valeurs répétées des batailles encodées en dictionnaire (battle_value)", _dictionary_encoding),
+    (9, "Worker et signe de vie des tâches d'enrichissement", _job_heartbeat),
+]
+
+@contextmanager
+def init_lock():
+    """
+    Verrou fichier empêchant deux processus d'initialiser la base en même temps
+    """
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, 'init.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def current_schema_version():
+    with db.engine.connect() as conn:
+        if not inspect(conn).has_table('schema_migrations'):
+            return 0
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+def apply_migrations():
+    """
+    Applique les migrations manquantes ; retourne la liste des versions appliquées
+    """
+    applied = []
+    with db.engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        done = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        logging.info("Migration %s : %s", version, description)
+        with db.engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append(version)
+    return applied
+
+def seed_database(force=False):
+    """
+    Génère les données fictives si la version de seed enregistrée est dépassée.
+
+    Une base déjà peuplée sans version enregistrée est adoptée telle quelle.
+    """
+    from utils import create_mock_data
+    from services.snapshot import refresh_snapshot
+
+    row = db.session.get(DataVersion, SEED_VERSION_NAME)
+    has_battles = db.session.query(Battle.id).first() is not None
+    if row is None and has_battles and not force:
+        db.session.add(DataVersion(name=SEED_VERSION_NAME, version=SEED_VERSION))
+        db.session.commit()
+        logging.info("Données existantes adoptées comme seed courant")
+        return False
+    if not force and has_battles and row is not None and row.version >= SEED_VERSION:
+        logging.info("Seed à jour (version %s), aucune régénération", row.version)
+        return False
+
+    create_mock_data()
+    # Identifiants réattribués : un instantané exporté désignerait d'autres batailles
+    refresh_snapshot()
+    row = db.session.get(DataVersion, SEED_VERSION_NAME)
+    if row is None:
+        row = DataVersion(name=SEED_VERSION_NAME, version=SEED_VERSION)
+        db.session.add(row)
+    row.version = SEED_VERSION
+    db.session.commit()
+    return True
+
+def init_database(reseed=False):
+    """
+    Phase d'initialisation : migrations puis seed, sous verrou
+    """
+    from services.enrichment_jobs import expire_orphaned_jobs
+
+    with init_lock():
+        applied = apply_migrations()
+        seeded = seed_database(force=reseed)
+        # Tâches d'un worker arrêté avant de les terminer (redémarrage, plantage)
+        expire_orphaned_jobs()
+    logging.info("Base initialisée (migrations appliquées : %s, seed : %s)", applied or 'aucune', 'oui' if seeded else 'non')
+    return applied, seeded
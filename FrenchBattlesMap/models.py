@@ -1,20 +1,117 @@
+import json
+from datetime import datetime
+from sqlalchemy.orm.attributes import flag_dirty
 from app import db
 
+# Types d'événements, déduits du premier mot du nom de la bataille
+BATTLE_TYPES = ['Bataille', 'Siège', 'Escarmouche', 'Défense', 'Assaut']
+
+def battle_type_from_name(name):
+    """
+    Retourne le type d'une bataille d'après son nom (None si non reconnu)
+    """
+    first_word = name.split(' ', 1)[0] if name else ''
+    return first_word if first_word in BATTLE_TYPES else None
+
+_dictionary_module = None
+
+def _dictionary():
+    # Import tardif (services.value_dictionary importe ce module), une seule fois
+    global _dictionary_module
+    if _dictionary_module is None:
+        from services import value_dictionary
+        _dictionary_module = value_dictionary
+    return _dictionary_module
+
+def _dictionary_value(battle, column):
+    pending = battle._pending_values
+    if pending and column in pending:
+        return pending[column]
+    return _dictionary().value_dictionary.decode(getattr(battle, column))
+
+def _set_dictionary_value(battle, column, value):
+    if battle._pending_values is None:
+        battle._pending_values = {}
+    battle._pending_values[column] = value
+    # Objet présenté au prochain flush même si aucune colonne n'a encore changé
+    flag_dirty(battle)
+
+class DictionaryValue:
+    """
+    Attribut texte stocké comme référence vers battle_value (colonne `column`).
+
+    Une valeur affectée reste en attente sur l'objet ; elle est encodée au
+    prochain flush (services.value_dictionary, événement before_flush).
+    """
+
+    def __init__(self, column):
+        self.column = column
+
+    def __get__(self, battle, owner=None):
+        if battle is None:
+            return self
+        return _dictionary_value(battle, self.column)
+
+    def __set__(self, battle, value):
+        _set_dictionary_value(battle, self.column, value)
+
+class BattleValue(db.Model):
+    """
+    Dictionnaire des valeurs répétées des batailles (participants, issue, médias...).
+
+    Les identifiants ne sont jamais réattribués ; `hash` (SHA-1 de la valeur)
+    porte l'unicité, un index sur le texte lui-même pouvant dépasser les limites.
+    """
+    __tablename__ = 'battle_value'
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(40), nullable=False, unique=True)
+    value = db.Column(db.Text, nullable=False)
+
 class Battle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    year = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False, index=True)
+    battle_type = db.Column(db.String(50), index=True)  # Dérivé du nom (insertion et renommage)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text)
-    participants = db.Column(db.String(500))
-    outcome = db.Column(db.String(500))
-    historical_context = db.Column(db.Text)  # Contexte historique simple
+    # Valeurs très répétées : références vers battle_value
+    participants_id = db.Column(db.Integer)
+    outcome_id = db.Column(db.Integer)
+    context_id = db.Column(db.Integer)  # Premier paragraphe du contexte historique
+    context_detail = db.Column(db.Text)  # Suite du contexte, propre à la bataille
     sources = db.Column(db.Text)  # Liens vers des sources externes (format JSON)
-    image_url = db.Column(db.String(500))  # URL de l'image principale
-    media_urls = db.Column(db.Text)  # URLs des médias additionnels (format JSON)
+    image_url_id = db.Column(db.Integer)  # URL de l'image principale
+    media_urls_id = db.Column(db.Integer)  # URLs des médias additionnels (format JSON)
+    version = db.Column(db.Integer)  # Entrée du journal des modifications ayant produit cette ligne
+    updated_at = db.Column(db.DateTime)
+
+    participants = DictionaryValue('participants_id')
+    outcome = DictionaryValue('outcome_id')
+    image_url = DictionaryValue('image_url_id')
+    media_urls = DictionaryValue('media_urls_id')
+    _pending_values = None  # {colonne: valeur} affectées depuis le dernier flush
+
+    @property
+    def historical_context(self):
+        return _dictionary().join_context(_dictionary_value(self, 'context_id'), self.context_detail)
+
+    @historical_context.setter
+    def historical_context(self, value):
+        prefix, self.context_detail = _dictionary().split_context(value)
+        _set_dictionary_value(self, 'context_id', prefix)
 
     def to_dict(self):
+        if self._pending_values:
+            # Valeurs affectées mais pas encore encodées : lecture par les attributs
+            participants, outcome, context = self.participants, self.outcome, self.historical_context
+            image_url, media_urls = self.image_url, self.media_urls
+        else:
+            dictionary = _dictionary()
+            decode = dictionary.value_dictionary.decode
+            participants, outcome = decode(self.participants_id), decode(self.outcome_id)
+            context = dictionary.join_context(decode(self.context_id), self.context_detail)
+            image_url, media_urls = decode(self.image_url_id), decode(self.media_urls_id)
         return {
             'id': self.id,
             'name': self.name,
@@ -22,10 +119,112 @@ class Battle(db.Model):
             'latitude': self.latitude,
             'longitude': self.longitude,
             'description': self.description,
-            'participants': self.participants,
-            'outcome': self.outcome,
-            'historical_context': self.historical_context,
+            'participants': participants,
+            'outcome': outcome,
+            'historical_context': context,
             'sources': self.sources,
-            'image_url': self.image_url,
-            'media_urls': self.media_urls
-        }
\ No newline at end of file
+            'image_url': image_url,
+            'media_urls': media_urls
+        }
+
+@db.event.listens_for(Battle, 'before_insert')
+def _set_battle_type(mapper, connection, battle):
+    if battle.battle_type is None:
+        battle.battle_type = battle_type_from_name(battle.name)
+
+@db.event.listens_for(Battle, 'before_update')
+def _update_battle_type(mapper, connection, battle):
+    # Type dérivé du nom : à recalculer quand le nom change, sauf s'il est fixé en même temps
+    state = db.inspect(battle)
+    if state.attrs.name.history.has_changes() and not state.attrs.battle_type.history.has_changes():
+        battle.battle_type = battle_type_from_name(battle.name)
+
+class BattleStatistic(db.Model):
+    """
+    Statistiques agrégées, maintenues à chaque écriture pour un accès en O(1).
+
+    kind : 'total', 'type', 'century', 'earliest' ou 'latest'
+    """
+    __tablename__ = 'battle_statistic'
+    kind = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(50), primary_key=True, default='')
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class YearHistogram(db.Model):
+    """
+    Nombre de batailles par année et par type, maintenu à chaque écriture.
+
+    battle_type vaut '' pour les batailles sans type reconnu.
+    """
+    __tablename__ = 'battle_year_histogram'
+    year = db.Column(db.Integer, primary_key=True)
+    battle_type = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class GridHistogram(db.Model):
+    """
+    Même histogramme, par cellule d'une grille régulière (filtre par zone)
+    """
+    __tablename__ = 'battle_grid_histogram'
+    cell_x = db.Column(db.Integer, primary_key=True)
+    cell_y = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    battle_type = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    """
+    Compteur de version des données, partagé entre les workers via la base
+    """
+    __tablename__ = 'data_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)  # Sert d'en-tête Last-Modified
+
+class BattleChange(db.Model):
+    """
+    Journal des modifications des batailles, numéroté de façon croissante.
+
+    operation : 'upsert', 'delete' ou 'reset' (rechargement en masse, battle_id nul)
+    """
+    __tablename__ = 'battle_change'
+    __table_args__ = {'sqlite_autoincrement': True}  # Numéros jamais réutilisés
+    version = db.Column(db.Integer, primary_key=True)
+    battle_id = db.Column(db.Integer)
+    operation = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+class EnrichmentJob(db.Model):
+    """
+    Tâche d'enrichissement en arrière-plan, suivie en base pour être
+    consultable depuis n'importe quel worker
+    """
+    __tablename__ = 'enrichment_job'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    parameters = db.Column(db.Text)  # Paramètres de la demande (format JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Worker (hôte:pid) qui exécute la tâche, et dernier signe de vie de ce worker
+    worker = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'progress': round(self.processed / self.total, 4) if self.total else 1.0,
+            'parameters': json.loads(self.parameters) if self.parameters else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
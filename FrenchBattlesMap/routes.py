@@ -1,74 +1,222 @@
-from flask import render_template, jsonify, request, make_response
+from flask import (render_template, jsonify, request, make_response, Response, send_file, send_from_directory,
+                   url_for, stream_with_context)
 from app import app, db, cache
-from models import Battle
-from utils import create_mock_data
+from models import Battle, EnrichmentJob
 from services.battle_enrichment import process_battle_enrichment
+from services.clustering import parse_bbox, get_clusters
+from services.markers import MARKER_FORMATS, PACKED_MIMETYPE, marker_columns, marker_response, markers_to_dicts
+from services.year_index import year_index
+from services.enrichment_jobs import ACTIVE_STATUSES, MAX_JOB_SIZE, expire_orphaned_jobs, submit_enrichment_job
+from services.statistics import get_statistics
+from services.histogram import get_histogram
+from services.search import SearchUnavailable, search_battles
+from services.spatial import (MAX_NEAREST, parse_point, bbox_filter, near_filter, nearest_query,
+                              distance_km_expr, distance_km)
+from services.pagination import COUNT_MODES, encode_cursor, decode_cursor, ordered, after_cursor, estimate_count
+from services.cache_tags import (cached_view, battle_tag, year_bucket_tags, view_keys,
+                                 store_view_response)
+from services.http_caching import (conditional_view, current_validators, is_not_modified, not_modified_response,
+                                   compress_variants, encoded_response, build_response)
+from services.batch import MAX_BATCH_IDS, parse_ids
+from services.changes import CHANGES_PAGE_SIZE, CHANGE_STREAM_ENABLED, get_changes, change_events
+from services.database import read_replica
+from services.snapshot import SNAPSHOT_DIR, MANIFEST_NAME
+from services.streaming import battle_columns, stream_battles
+from services.media_proxy import THUMBNAIL_SIZES, DEFAULT_THUMBNAIL_SIZE, get_media_proxy
+from services.instrumentation import (METRICS_ENABLED, PROFILER_ENABLED, metrics, metrics_authorized, sampler, phase,
+                                      record_cache)
 import logging
 
-def init_db():
-    logging.info("Initializing database...")
-    try:
-        # Always recreate mock data
-        logging.info("Creating fresh mock data...")
-        create_mock_data()
-        logging.info("Mock data creation completed")
-    except Exception as e:
-        logging.error(f"Error in init_db: {str(e)}")
-        db.session.rollback()
-        raise
-
 @app.route('/')
 @cache.cached(timeout=3600)  # Cache the homepage for 1 hour
 def index():
     return render_template('index.html')
 
 @app.route('/api/battles')
-@cache.memoize(timeout=300)  # Cache battle results for 5 minutes
+@read_replica
+@conditional_view()
 def get_battles():
+    # Pas de cache par plage : les plages du curseur sont quasiment toujours uniques,
+    # les projections compactes sont servies depuis l'index en mémoire ;
+    # un client qui rejoue une plage déjà chargée reçoit un 304
     try:
         start_year = request.args.get('start_year', 0, type=int)
         end_year = request.args.get('end_year', 2025, type=int)
+        output_format = request.args.get('format', 'full')
+        if output_format not in MARKER_FORMATS:
+            return jsonify({"error": f"format doit être l'un de : {', '.join(MARKER_FORMATS)}"}), 400
 
-        logging.info(f"Fetching battles between years {start_year} and {end_year}")
+        logging.debug("Fetching battles between years %s and %s (%s)", start_year, end_year, output_format)
 
-        battles = Battle.query.filter(
+        if output_format == 'packed':
+            return Response(year_index.packed(start_year, end_year), mimetype=PACKED_MIMETYPE)
+        if output_format == 'columnar':
+            return jsonify(year_index.columns(start_year, end_year))
+        if output_format == 'marker':
+            return jsonify(markers_to_dicts(year_index.rows(start_year, end_year)))
+
+        # Liste complète encodée en flux : ni objets ORM ni document entier en mémoire
+        return stream_battles(db.session.query(*battle_columns()).filter(
             Battle.year >= start_year,
             Battle.year <= end_year
-        ).all()
+        ))
+    except Exception as e:
+        logging.error("Error in get_battles: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-        result = [battle.to_dict() for battle in battles]
-        logging.info(f"Found {len(result)} battles in the specified range")
+@app.route('/api/battles/clusters')
+@read_replica
+@cached_view(timeout=300, tags=['markers'])  # Clé de cache incluant bbox, zoom et années
+def get_battle_clusters():
+    try:
+        start_year = request.args.get('start_year', 0, type=int)
+        end_year = request.args.get('end_year', 2025, type=int)
+        zoom = min(max(request.args.get('zoom', 6, type=int), 0), 20)
+        battle_type = request.args.get('type')
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        return jsonify(result)
+        return jsonify(get_clusters(start_year, end_year, zoom, bbox=bbox, battle_type=battle_type))
     except Exception as e:
-        logging.error(f"Error in get_battles: {str(e)}")
+        logging.error("Error in get_battle_clusters: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/battles/<int:battle_id>/enrich', methods=['POST'])
 def enrich_battle(battle_id):
     try:
         battle = Battle.query.get_or_404(battle_id)
+        if request.args.get('async', 1, type=int):
+            # Par défaut en arrière-plan : le worker web n'attend pas les sources externes.
+            # Le client suit la tâche (Location) ; ?async=0 garde l'enrichissement synchrone.
+            job = submit_enrichment_job(battle_ids=[battle_id], only_missing=False)
+            response = make_response(jsonify(job.to_dict()), 202)
+            response.headers['Location'] = f"/api/v1/enrichment/jobs/{job.id}"
+            return response
         success = process_battle_enrichment(battle)
         if success:
+            # Le commit invalide les seules entrées contenant cette bataille (services.cache_tags)
             db.session.commit()
             return jsonify({"message": "Informations de la bataille enrichies avec succès", "battle": battle.to_dict()})
         return jsonify({"error": "Échec de l'enrichissement des informations"}), 500
     except Exception as e:
-        logging.error(f"Erreur lors de l'enrichissement de la bataille {battle_id}: {str(e)}")
+        logging.error("Erreur lors de l'enrichissement de la bataille %s: %s", battle_id, e)
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/v1/enrichment/jobs', methods=['POST'])
+def create_enrichment_job():
+    try:
+        payload = request.get_json(silent=True)
+        if payload is None:
+            payload = {}
+        if not isinstance(payload, dict):
+            return jsonify({"error": "Corps JSON attendu : un objet"}), 400
+        battle_ids = payload.get('battle_ids')
+        start_year = payload.get('start_year')
+        end_year = payload.get('end_year')
+        only_missing = payload.get('only_missing', True)
+        if battle_ids is not None and not isinstance(battle_ids, list):
+            return jsonify({"error": "battle_ids doit être une liste d'identifiants"}), 400
+        # ValueError (identifiant invalide, liste trop longue) : 400 plus bas
+        battle_ids = parse_ids(battle_ids, max_ids=MAX_JOB_SIZE) if battle_ids else None
+        for name, value in (('start_year', start_year), ('end_year', end_year)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                return jsonify({"error": f"{name} doit être un entier"}), 400
+        if not isinstance(only_missing, bool):
+            return jsonify({"error": "only_missing doit être un booléen"}), 400
+        if not battle_ids and start_year is None and end_year is None:
+            return jsonify({"error": "Préciser battle_ids ou une plage start_year/end_year"}), 400
+
+        job = submit_enrichment_job(
+            battle_ids=battle_ids,
+            start_year=start_year,
+            end_year=end_year,
+            only_missing=only_missing
+        )
+        response = make_response(jsonify(job.to_dict()), 202)
+        response.headers['Location'] = f"/api/v1/enrichment/jobs/{job.id}"
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error("Error in create_enrichment_job: %s", e)
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/v1/enrichment/jobs')
+def list_enrichment_jobs():
+    try:
+        expire_orphaned_jobs()
+        jobs = EnrichmentJob.query.order_by(EnrichmentJob.id.desc()).limit(50).all()
+        return jsonify([job.to_dict() for job in jobs])
+    except Exception as e:
+        logging.error("Error in list_enrichment_jobs: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/v1/enrichment/jobs/<int:job_id>')
+def get_enrichment_job(job_id):
+    job = db.session.get(EnrichmentJob, job_id)
+    if job is None:
+        return jsonify({"error": "Tâche introuvable"}), 404
+    # Une tâche active dont le worker s'est arrêté ne progresserait plus jamais
+    if job.status in ACTIVE_STATUSES and expire_orphaned_jobs():
+        db.session.refresh(job)
+    return jsonify(job.to_dict())
+
 @app.route('/api/cache/clear', methods=['POST'])
 def clear_cache():
     try:
-        cache.delete_memoized(get_battles)
-        cache.delete('view//index.html')  # Clear homepage cache
+        cache.clear()  # Cache partagé : vidé pour tous les workers
         logging.info("Cache cleared successfully")
         return jsonify({"message": "Cache cleared successfully"}), 200
     except Exception as e:
-        logging.error(f"Error clearing cache: {str(e)}")
+        logging.error("Error clearing cache: %s", e)
         return jsonify({"error": str(e)}), 500
 
+# Instantané statique (flask export-snapshot) ; en production, servi directement par nginx
+@app.route('/snapshot/<path:filename>')
+def snapshot_file(filename):
+    if filename == MANIFEST_NAME:
+        response = send_from_directory(SNAPSHOT_DIR, filename, max_age=60)
+    else:
+        # Noms dérivés du contenu : un fichier ne change jamais
+        response = send_from_directory(SNAPSHOT_DIR, filename, max_age=365 * 24 * 3600)
+        response.headers['Cache-Control'] += ', immutable'
+    return response
+
+# Métriques au format texte Prometheus (par worker), activées par METRICS_ENABLED=1
+# et protégées par METRICS_TOKEN s'il est défini
+@app.route('/metrics')
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Métriques désactivées (METRICS_ENABLED=1 pour les activer)"}), 404
+    if not metrics_authorized(request.headers.get('Authorization')):
+        return jsonify({"error": "Jeton d'accès aux métriques invalide"}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Profileur par échantillonnage, activé par PROFILER_ENABLED=1 :
+# POST ?action=start|stop|reset, GET renvoie les piles repliées (flamegraph / speedscope)
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def profiler():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profileur désactivé (PROFILER_ENABLED=1 pour l'activer)"}), 404
+    if request.method == 'POST':
+        action = request.args.get('action', 'start')
+        if action == 'start':
+            sampler.start()
+        elif action == 'stop':
+            sampler.stop()
+        elif action == 'reset':
+            sampler.reset()
+        else:
+            return jsonify({"error": "action doit être start, stop ou reset"}), 400
+        return jsonify({"running": sampler.running})
+    response = Response(sampler.collapsed(), mimetype='text/plain')
+    response.headers['X-Profiler-Running'] = str(sampler.running).lower()
+    return response
+
 # Documentation de l'API
 @app.route('/api/docs')
 def api_documentation():
@@ -83,21 +231,100 @@ def api_documentation():
                     "end_year": "int (optionnel) - Année de fin",
                     "type": "string (optionnel) - Type de bataille",
                     "limit": "int (optionnel) - Nombre maximum de résultats",
-                    "offset": "int (optionnel) - Décalage pour la pagination"
+                    "offset": "int (optionnel) - Décalage pour la pagination",
+                    "cursor": "string (optionnel) - Jeton next_cursor de la page précédente (vide pour la première page) ; pagination par (année, id)",
+                    "count": "string (optionnel) - exact (défaut), estimate ou none",
+                    "bbox": "string (optionnel) - Zone ouest,sud,est,nord",
+                    "near": "string (optionnel) - Point lat,lon ; résultats triés par distance (distance_km)",
+                    "radius": "float (optionnel) - Rayon en km autour de near",
+                    "k": "int (optionnel) - Les k batailles les plus proches de near (500 max)",
+                    "format": "string (optionnel) - full (défaut), marker, columnar, packed (binaire) ou ndjson (export complet en flux)"
                 }
             },
             "GET /api/v1/battles/{battle_id}": {
                 "description": "Récupérer les détails d'une bataille spécifique"
             },
+            "GET|POST /api/v1/battles/batch": {
+                "description": "Récupérer plusieurs batailles en une requête, dans l'ordre demandé ; "
+                               "les identifiants inconnus sont listés dans `missing`",
+                "parameters": {
+                    "ids": f"string (GET) - Identifiants séparés par des virgules ({MAX_BATCH_IDS} max) ; "
+                           'en POST, corps JSON {"ids": [1, 2, ...]}'
+                }
+            },
             "GET /api/v1/statistics": {
                 "description": "Obtenir des statistiques sur les batailles"
+            },
+            "GET /api/v1/histogram": {
+                "description": "Nombre de batailles par année (ou par classe de `bin` années), maintenu à chaque écriture",
+                "parameters": {
+                    "start_year": "int (optionnel) - Année de début",
+                    "end_year": "int (optionnel) - Année de fin",
+                    "type": "string (optionnel) - Type de bataille",
+                    "bbox": "string (optionnel) - Zone ouest,sud,est,nord (cellules de 1°, approchée hors grille)",
+                    "bin": "int (optionnel, défaut 1) - Largeur des classes en années",
+                    "by_type": "int (optionnel) - 1 pour détailler les comptes par type"
+                }
+            },
+            "GET /api/v1/search": {
+                "description": "Recherche plein texte (insensible aux accents) dans les noms, participants, issues, descriptions et contextes",
+                "parameters": {
+                    "q": "string - Termes recherchés (le dernier terme est un préfixe)",
+                    "start_year": "int (optionnel) - Année de début",
+                    "end_year": "int (optionnel) - Année de fin",
+                    "bbox": "string (optionnel) - Zone ouest,sud,est,nord",
+                    "type": "string (optionnel) - Type de bataille",
+                    "limit": "int (optionnel) - Nombre maximum de résultats (100 max)",
+                    "offset": "int (optionnel) - Décalage pour la pagination"
+                }
+            },
+            "GET /api/v1/changes": {
+                "description": "Batailles modifiées depuis une version du journal (dernier état, une entrée par bataille)",
+                "parameters": {
+                    "since": "int (optionnel) - Version déjà appliquée ; sans since, renvoie seulement la version courante",
+                    "limit": f"int (optionnel) - Entrées du journal lues ({CHANGES_PAGE_SIZE} max) ; has_more si tronqué"
+                },
+                "notes": "reset=true : tout recharger puis reprendre à `version`"
+            },
+            "GET /api/v1/changes/stream": {
+                "description": "Server-Sent Events annonçant chaque nouvelle version (si CHANGE_STREAM_ENABLED=1)",
+                "parameters": {
+                    "since": "int (optionnel) - Version connue du client (ou en-tête Last-Event-ID)"
+                }
+            },
+            "GET /api/v1/media/thumbnail": {
+                "description": "Vignette d'une image des batailles, téléchargée une fois puis servie depuis le cache local",
+                "parameters": {
+                    "url": "string - URL de l'image d'origine (image_url ou media_urls, hôtes de MEDIA_ALLOWED_HOSTS)",
+                    "w": f"int (optionnel, défaut {DEFAULT_THUMBNAIL_SIZE}) - Largeur souhaitée, arrondie à "
+                         f"{', '.join(map(str, THUMBNAIL_SIZES))}"
+                },
+                "notes": "Réponse immuable (Cache-Control: immutable) ; 502 si l'image est indisponible"
+            },
+            "POST /api/v1/enrichment/jobs": {
+                "description": "Lancer l'enrichissement en arrière-plan d'un ensemble de batailles",
+                "parameters": {
+                    "battle_ids": "list[int] (optionnel) - Identifiants des batailles",
+                    "start_year": "int (optionnel) - Année de début",
+                    "end_year": "int (optionnel) - Année de fin",
+                    "only_missing": "bool (optionnel, défaut true) - Ignorer les batailles déjà enrichies"
+                }
+            },
+            "GET /api/v1/enrichment/jobs/{job_id}": {
+                "description": "Suivre l'état et la progression d'une tâche d'enrichissement"
             }
-        }
+        },
+        "caching": "Les réponses GET portent un ETag fort et un en-tête Last-Modified ; "
+                   "If-None-Match / If-Modified-Since renvoient 304 tant que les données n'ont pas changé. "
+                   "Corps compressés (gzip, br si disponible) selon Accept-Encoding."
     })
 
 # Endpoint pour récupérer la liste des batailles (v1)
 @app.route('/api/v1/battles')
-@cache.memoize(timeout=300)
+@read_replica
+@cached_view(timeout=300, tags=lambda: year_bucket_tags(
+    request.args.get('start_year', type=int), request.args.get('end_year', type=int)
+))
 def get_battles_v1():
     try:
         # Paramètres de filtrage et pagination
@@ -106,6 +333,21 @@ def get_battles_v1():
         battle_type = request.args.get('type')
         limit = min(request.args.get('limit', 100, type=int), 1000)  # Max 1000 résultats
         offset = request.args.get('offset', 0, type=int)
+        output_format = request.args.get('format', 'full')
+        count_mode = request.args.get('count', 'exact')
+        if output_format not in MARKER_FORMATS + ('ndjson',):
+            return jsonify({"error": f"format doit être l'un de : {', '.join(MARKER_FORMATS + ('ndjson',))}"}), 400
+        if count_mode not in COUNT_MODES:
+            return jsonify({"error": f"count doit être l'un de : {', '.join(COUNT_MODES)}"}), 400
+
+        # Pagination par curseur (keyset) dès que le paramètre est présent, même vide
+        cursor = None
+        keyset = 'cursor' in request.args
+        if request.args.get('cursor'):
+            try:
+                cursor = decode_cursor(request.args['cursor'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
         # Construction de la requête
         query = Battle.query
@@ -116,86 +358,326 @@ def get_battles_v1():
         if end_year is not None:
             query = query.filter(Battle.year <= end_year)
         if battle_type:
-            query = query.filter(Battle.name.startswith(battle_type))
+            query = query.filter(Battle.battle_type == battle_type)
 
-        # Récupération du compte total
-        total_count = query.count()
+        # Filtres spatiaux, servis par l'index R*Tree (latitude, longitude, année)
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            near = parse_point(request.args['near']) if request.args.get('near') else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        radius = request.args.get('radius', type=float)
+        nearest = request.args.get('k', type=int)
+        if bbox:
+            query = query.filter(bbox_filter(bbox, start_year, end_year))
+        if near:
+            if not radius and not nearest:
+                return jsonify({"error": "near nécessite radius (km) et/ou k"}), 400
+            if output_format not in ('full', 'marker') or keyset:
+                return jsonify({"error": "near n'est compatible qu'avec format=full|marker et la pagination par offset"}), 400
+            return _nearby_battles_response(query, near, radius, nearest, start_year, end_year,
+                                            output_format, count_mode, limit, offset)
 
-        # Application de la pagination
-        battles = query.offset(offset).limit(limit).all()
+        # Export complet en flux NDJSON : une bataille par ligne, mémoire constante
+        if output_format == 'ndjson':
+            response = stream_battles(ordered(query.with_entities(*battle_columns())), 'ndjson')
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            return response
 
-        # Préparation de la réponse
-        result = {
+        # Récupération du compte total (optionnelle ou estimée)
+        if count_mode == 'exact':
+            total_count = query.count()
+        elif count_mode == 'estimate':
+            total_count = estimate_count(year_index, start_year, end_year, battle_type)
+        else:
+            total_count = None
+
+        page = ordered(query)
+        if cursor is not None:
+            page = after_cursor(page, cursor)
+        elif not keyset:
+            page = page.offset(offset)
+
+        # Projection compacte : pas d'hydratation ORM ni de colonnes texte
+        if output_format != 'full':
+            rows = page.with_entities(*marker_columns()).limit(limit + 1).all()
+            next_cursor = encode_cursor(rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+            rows = rows[:limit]
+        else:
+            with phase('orm'):
+                rows = page.limit(limit + 1).all()
+            next_cursor = encode_cursor(rows[limit - 1].year, rows[limit - 1].id) if len(rows) > limit else None
+            rows = rows[:limit]
+
+        pagination = {
             "total": total_count,
-            "offset": offset,
             "limit": limit,
-            "battles": [battle.to_dict() for battle in battles]
+            "next_cursor": next_cursor
         }
+        if not keyset:
+            pagination["offset"] = offset
 
-        response = make_response(jsonify(result))
+        if output_format != 'full':
+            response = marker_response(rows, output_format, extra=pagination)
+            if total_count is not None:
+                response.headers['X-Total-Count'] = str(total_count)
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            return response
+
+        # Préparation de la réponse
+        with phase('to_dict'):
+            result = {
+                **pagination,
+                "battles": [battle.to_dict() for battle in rows]
+            }
+
+        with phase('jsonify'):
+            response = make_response(jsonify(result))
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
     except Exception as e:
-        logging.error(f"Error in get_battles_v1: {str(e)}")
+        logging.error("Error in get_battles_v1: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def _nearby_battles_response(query, near, radius, nearest, start_year, end_year,
+                             output_format, count_mode, limit, offset):
+    """
+    Réponse de /api/v1/battles pour une recherche autour d'un point, triée par distance
+    """
+    latitude, longitude = near
+    if nearest:
+        page = nearest_query(query, latitude, longitude, min(nearest, MAX_NEAREST), radius, start_year, end_year)
+        total_count = None
+    else:
+        query = query.filter(near_filter(latitude, longitude, radius, start_year, end_year))
+        total_count = query.count() if count_mode != 'none' else None
+        page = query.order_by(distance_km_expr(latitude, longitude), Battle.id).offset(offset).limit(limit)
+
+    if output_format == 'marker':
+        battles = markers_to_dicts(page.with_entities(*marker_columns()).all())
+    else:
+        battles = [battle.to_dict() for battle in page.all()]
+    for battle in battles:
+        battle['distance_km'] = round(distance_km(latitude, longitude, battle['latitude'], battle['longitude']), 3)
+
+    response = make_response(jsonify({
+        "total": len(battles) if nearest else total_count,
+        "offset": 0 if nearest else offset,
+        "limit": min(nearest, MAX_NEAREST) if nearest else limit,
+        "next_cursor": None,
+        "battles": battles
+    }))
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def _battle_detail_response(battle):
+    with phase('to_dict'):
+        result = battle.to_dict()
+    with phase('jsonify'):
+        response = make_response(jsonify(result))
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
 # Endpoint pour récupérer une bataille spécifique (v1)
 @app.route('/api/v1/battles/<int:battle_id>')
-@cache.memoize(timeout=300)
+@cached_view(timeout=300, tags=lambda battle_id: [battle_tag(battle_id)])
 def get_battle_v1(battle_id):
     try:
-        battle = Battle.query.get_or_404(battle_id)
-        response = make_response(jsonify(battle.to_dict()))
+        with phase('orm'):
+            battle = Battle.query.get_or_404(battle_id)
+        return _battle_detail_response(battle)
+    except Exception as e:
+        logging.error("Error in get_battle_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint groupé : plusieurs batailles par identifiant en un aller-retour (v1)
+@app.route('/api/v1/battles/batch', methods=['GET', 'POST'])
+def get_battles_batch_v1():
+    try:
+        if request.method == 'POST':
+            payload = request.get_json(silent=True)
+            values = payload.get('ids') if isinstance(payload, dict) else payload
+            if not isinstance(values, list):
+                return jsonify({"error": 'Corps attendu : {"ids": [1, 2, ...]}'}), 400
+        else:
+            values = request.args.getlist('ids')
+            etag_base, last_modified = current_validators()
+            if is_not_modified(etag_base, last_modified):
+                return not_modified_response(etag_base, last_modified)
+        try:
+            ids = parse_ids(values)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Entrées mises en cache par get_battle_v1, lues en un seul get_many
+        with phase('cache'):
+            keys = view_keys([(url_for('get_battle_v1', battle_id=battle_id), [battle_tag(battle_id)])
+                              for battle_id in ids])
+            entries = cache.get_many(*keys)
+        bodies = {battle_id: entry[0] for battle_id, entry in zip(ids, entries) if entry is not None}
+        misses = [battle_id for battle_id in ids if battle_id not in bodies]
+        record_cache('miss' if misses else 'hit')
+
+        if misses:
+            # Une seule requête IN pour tous les absents ; le cache de get_battle_v1 en profite aussi
+            with phase('orm'):
+                battles = Battle.query.filter(Battle.id.in_(misses)).all()
+            key_of = dict(zip(ids, keys))
+            for battle in battles:
+                entry = store_view_response(key_of[battle.id], _battle_detail_response(battle), timeout=300)
+                bodies[battle.id] = entry[0]
+
+        # Corps JSON déjà sérialisés, assemblés dans l'ordre de la requête
+        with phase('jsonify'):
+            found = b','.join(bodies[battle_id].rstrip() for battle_id in ids if battle_id in bodies)
+            missing = ','.join(str(battle_id) for battle_id in ids if battle_id not in bodies)
+            body = b'{"battles":[' + found + b'],"missing":[' + missing.encode('ascii') + b']}'
+        with phase('compress'):
+            variants = compress_variants(body)
+        headers = [('Content-Type', 'application/json'), ('Access-Control-Allow-Origin', '*')]
+        if request.method == 'POST':
+            return encoded_response(body, 200, headers, variants)
+        return build_response(body, 200, headers, variants, etag_base, last_modified)
+    except Exception as e:
+        logging.error("Error in get_battles_batch_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint de recherche plein texte (v1)
+@app.route('/api/v1/search')
+@read_replica
+@cached_view(timeout=300, tags=lambda: year_bucket_tags(
+    request.args.get('start_year', type=int), request.args.get('end_year', type=int)
+))
+def search_battles_v1():
+    try:
+        user_query = request.args.get('q', '').strip()
+        if not user_query:
+            return jsonify({"error": "Le paramètre q est obligatoire"}), 400
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        offset = request.args.get('offset', 0, type=int)
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        total, results = search_battles(
+            user_query,
+            start_year=request.args.get('start_year', type=int),
+            end_year=request.args.get('end_year', type=int),
+            bbox=bbox,
+            battle_type=request.args.get('type'),
+            limit=limit,
+            offset=offset
+        )
+
+        response = make_response(jsonify({
+            "query": user_query,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "results": results
+        }))
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
+    except SearchUnavailable as e:
+        return jsonify({"error": str(e)}), 501
     except Exception as e:
-        logging.error(f"Error in get_battle_v1: {str(e)}")
+        logging.error("Error in search_battles_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Histogramme des batailles par année (v1), pour la densité du curseur temporel
+@app.route('/api/v1/histogram')
+@read_replica
+@cached_view(timeout=3600, tags=['statistics'])
+def get_histogram_v1():
+    try:
+        start_year = request.args.get('start_year', type=int)
+        end_year = request.args.get('end_year', type=int)
+        bin_size = request.args.get('bin', 1, type=int)
+        if bin_size < 1:
+            return jsonify({"error": "bin doit être un entier positif"}), 400
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            histogram = get_histogram(start_year, end_year, request.args.get('type'), bbox, bin_size,
+                                      by_type=bool(request.args.get('by_type', type=int)))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = make_response(jsonify(histogram))
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+    except Exception as e:
+        logging.error("Error in get_histogram_v1: %s", e)
         return jsonify({"error": str(e)}), 500
 
 # Endpoint pour les statistiques (v1)
 @app.route('/api/v1/statistics')
-@cache.memoize(timeout=3600)  # Cache pour 1 heure
+@read_replica
+@cached_view(timeout=3600, tags=['statistics'])  # Cache pour 1 heure
 def get_statistics_v1():
     try:
-        # Statistiques globales
-        total_battles = Battle.query.count()
-        earliest_battle = Battle.query.order_by(Battle.year).first()
-        latest_battle = Battle.query.order_by(Battle.year.desc()).first()
-
-        # Distribution par type
-        battle_types = ['Bataille', 'Siège', 'Escarmouche', 'Défense', 'Assaut']
-        types_distribution = {}
-        for battle_type in battle_types:
-            count = Battle.query.filter(Battle.name.like(f'{battle_type}%')).count()
-            if count > 0:
-                types_distribution[battle_type] = count
-
-        # Distribution par siècle
-        century_query = db.session.query(
-            db.func.cast(db.func.floor(Battle.year / 100.0), db.Integer).label('century'),
-            db.func.count().label('count')
-        ).group_by('century').order_by('century')
-
-        century_distribution = {
-            f"{century * 100}": count
-            for century, count in century_query.all()
-        }
-
-        statistics = {
-            "total_battles": total_battles,
-            "time_span": {
-                "earliest": earliest_battle.year if earliest_battle else None,
-                "latest": latest_battle.year if latest_battle else None
-            },
-            "types_distribution": types_distribution,
-            "century_distribution": century_distribution
-        }
+        # Statistiques maintenues à l'insertion (table battle_statistic)
+        statistics = get_statistics()
 
         response = make_response(jsonify(statistics))
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
     except Exception as e:
-        logging.error(f"Error in get_statistics_v1: {str(e)}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        logging.error("Error in get_statistics_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Journal des modifications (v1) : les clients n'appliquent que les lignes modifiées
+@app.route('/api/v1/changes')
+def get_changes_v1():
+    try:
+        since = request.args.get('since', type=int)
+        limit = min(request.args.get('limit', CHANGES_PAGE_SIZE, type=int), CHANGES_PAGE_SIZE)
+        if limit < 1:
+            return jsonify({"error": "limit doit être un entier positif"}), 400
+        response = make_response(jsonify(get_changes(since, limit)))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+    except Exception as e:
+        logging.error("Error in get_changes_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+# Notification des nouvelles versions du journal en Server-Sent Events
+@app.route('/api/v1/changes/stream')
+def stream_changes_v1():
+    if not CHANGE_STREAM_ENABLED:
+        return jsonify({"error": "Flux désactivé (CHANGE_STREAM_ENABLED=1) : interroger /api/v1/changes"}), 404
+    # Last-Event-ID : envoyé par le navigateur à la reconnexion
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    response = Response(stream_with_context(change_events(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Pas de mise en tampon par nginx
+    return response
+
+# Vignettes des images des batailles : les navigateurs ne téléchargent plus les originaux
+@app.route('/api/v1/media/thumbnail')
+def media_thumbnail_v1():
+    try:
+        url = request.args.get('url', '')
+        width = request.args.get('w', DEFAULT_THUMBNAIL_SIZE, type=int)
+        if width < 1:
+            return jsonify({"error": "w doit être un entier positif"}), 400
+        thumbnail = get_media_proxy().thumbnail(url, width)
+        if thumbnail is None:
+            return jsonify({"error": "Image indisponible"}), 502
+        path, mimetype, etag = thumbnail
+        # L'URL d'origine n'est jamais retéléchargée : la vignette ne change pas
+        response = send_file(path, mimetype=mimetype, etag=etag, max_age=365 * 24 * 3600)
+        response.headers['Cache-Control'] += ', immutable'
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error("Error in media_thumbnail_v1: %s", e)
+        return jsonify({"error": str(e)}), 500
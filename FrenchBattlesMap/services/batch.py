@@ -0,0 +1,23 @@
+# Nombre maximal d'identifiants par requête groupée
+MAX_BATCH_IDS = 200
+
+def parse_ids(values, max_ids=MAX_BATCH_IDS):
+    """
+    Identifiants de bataille (entiers ou chaînes "1,2,3"), dédoublonnés dans l'ordre
+    """
+    ids = []
+    for value in values:
+        parts = [part.strip() for part in value.split(',') if part.strip()] if isinstance(value, str) else [value]
+        for part in parts:
+            if isinstance(part, bool) or not isinstance(part, (int, str)):
+                raise ValueError(f"Identifiant invalide : {part}")
+            try:
+                ids.append(int(part))
+            except ValueError:
+                raise ValueError(f"Identifiant invalide : {part}")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("Préciser au moins un identifiant (ids)")
+    if len(ids) > max_ids:
+        raise ValueError(f"Au plus {max_ids} identifiants par requête ({len(ids)} demandés)")
+    return ids
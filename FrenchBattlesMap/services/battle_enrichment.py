@@ -1,44 +1,44 @@
 import json
 import logging
-import trafilatura
+import os
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 from datetime import datetime
 from app import db  # Ajout de l'import manquant
+from services.source_fetcher import get_source_fetcher
+from services.data_version import bump_data_version, CONTENT_VERSION
+
+# Points d'entrée des moteurs de recherche (surchargeables, par ex. vers un serveur de test local)
+GALLICA_SEARCH_URL = os.environ.get("GALLICA_SEARCH_URL", "https://gallica.bnf.fr/services/engine/search/sru")
+PERSEE_SEARCH_URL = os.environ.get("PERSEE_SEARCH_URL", "https://www.persee.fr/search")
+
+def _extract_text(downloaded):
+    # Import différé : trafilatura est coûteux à charger et inutile au démarrage des workers
+    import trafilatura
+    return trafilatura.extract(downloaded)
 
 def get_gallica_content(battle_name, year):
     """
-    Recherche des informations sur Gallica BnF
+    Recherche des informations sur Gallica BnF (None si aucun contenu) ; lève SourceFetchError en cas d'échec
     """
-    try:
-        query = quote(f"{battle_name} {year}")
-        url = f"https://gallica.bnf.fr/services/engine/search/sru?operation=searchRetrieve&exactSearch=false&collapsing=true&version=1.2&query={query}"
-        downloaded = trafilatura.fetch_url(url)
-        if downloaded:
-            content = trafilatura.extract(downloaded)
-            if content and len(content.strip()) > 0:
-                return content
-        return None
-    except Exception as e:
-        logging.error(f"Erreur lors de la recherche Gallica pour {battle_name}: {str(e)}")
-        return None
+    query = quote(f"{battle_name} {year}")
+    url = f"{GALLICA_SEARCH_URL}?operation=searchRetrieve&exactSearch=false&collapsing=true&version=1.2&query={query}"
+    content = get_source_fetcher().fetch_text(url, _extract_text)
+    if content and len(content.strip()) > 0:
+        return content
+    return None
 
 def get_persee_content(battle_name, year):
     """
-    Recherche des informations sur Persée
+    Recherche des informations sur Persée (None si aucun contenu) ; lève SourceFetchError en cas d'échec
     """
-    try:
-        period = "antiquite" if year < 500 else "medieval" if year < 1500 else "moderne"
-        query = quote(f"{battle_name} {period}")
-        url = f"https://www.persee.fr/search?q={query}"
-        downloaded = trafilatura.fetch_url(url)
-        if downloaded:
-            content = trafilatura.extract(downloaded)
-            if content and len(content.strip()) > 0:
-                return content
-        return None
-    except Exception as e:
-        logging.error(f"Erreur lors de la recherche Persée pour {battle_name}: {str(e)}")
-        return None
+    period = "antiquite" if year < 500 else "medieval" if year < 1500 else "moderne"
+    query = quote(f"{battle_name} {period}")
+    url = f"{PERSEE_SEARCH_URL}?q={query}"
+    content = get_source_fetcher().fetch_text(url, _extract_text)
+    if content and len(content.strip()) > 0:
+        return content
+    return None
 
 def get_sources_urls(battle_name, year):
     """
@@ -62,66 +62,99 @@ def get_sources_urls(battle_name, year):
 
         return sources
     except Exception as e:
-        logging.error(f"Erreur lors de la génération des URLs pour {battle_name}: {str(e)}")
+        logging.error("Erreur lors de la génération des URLs pour %s: %s", battle_name, e)
         return {}
 
+# Contexte historique de base selon la période : (année de fin exclue, texte).
+# Ces textes ouvrent le contexte de chaque bataille enrichie et sont partagés
+# entre batailles (voir services.value_dictionary.split_context).
+PERIOD_CONTEXTS = (
+    (0, "Cette bataille s'inscrit dans la période gauloise, marquée par les conflits entre tribus et l'expansion romaine."),
+    (500, "Cette bataille a lieu durant l'Antiquité tardive, période de transition entre l'Empire romain et les royaumes francs."),
+    (1000, "Cette bataille se déroule pendant le Haut Moyen Âge, époque marquée par l'émergence du royaume franc et les invasions vikings."),
+    (1500, "Cette bataille s'inscrit dans le contexte du Moyen Âge central et tardif, période de structuration du royaume de France."),
+    (1800, "Cette bataille se déroule sous l'Ancien Régime, période marquée par la centralisation du pouvoir royal et les conflits européens."),
+    (None, "Cette bataille appartient à l'époque contemporaine, caractérisée par les guerres nationales et les conflits mondiaux."),
+)
+
 def get_period_context(year):
     """
     Retourne le contexte historique selon la période
     """
-    if year < 0:
-        return "Cette bataille s'inscrit dans la période gauloise, marquée par les conflits entre tribus et l'expansion romaine."
-    elif year < 500:
-        return "Cette bataille a lieu durant l'Antiquité tardive, période de transition entre l'Empire romain et les royaumes francs."
-    elif year < 1000:
-        return "Cette bataille se déroule pendant le Haut Moyen Âge, époque marquée par l'émergence du royaume franc et les invasions vikings."
-    elif year < 1500:
-        return "Cette bataille s'inscrit dans le contexte du Moyen Âge central et tardif, période de structuration du royaume de France."
-    elif year < 1800:
-        return "Cette bataille se déroule sous l'Ancien Régime, période marquée par la centralisation du pouvoir royal et les conflits européens."
-    else:
-        return "Cette bataille appartient à l'époque contemporaine, caractérisée par les guerres nationales et les conflits mondiaux."
+    for end_year, context in PERIOD_CONTEXTS:
+        if end_year is None or year < end_year:
+            return context
 
-def process_battle_enrichment(battle):
+# Pool partagé pour interroger Gallica et Persée en parallèle
+_fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="enrichment-fetch")
+
+def fetch_enrichment_sources(battle_name, year):
     """
-    Enrichit les informations d'une bataille avec des sources externes et un contexte historique
+    Interroge Gallica et Persée simultanément et retourne (gallica, persee, erreurs).
+
+    Une source sans résultat vaut None ; une source en échec vaut aussi None
+    et son exception est ajoutée à `erreurs`, pour que l'appelant la compte.
     """
-    try:
-        logging.info(f"Enrichissement des informations pour la bataille : {battle.name}")
+    futures = {
+        'Gallica': _fetch_executor.submit(get_gallica_content, battle_name, year),
+        'Persée': _fetch_executor.submit(get_persee_content, battle_name, year),
+    }
+    contents, errors = [], []
+    for source, future in futures.items():
+        try:
+            contents.append(future.result())
+        except Exception as e:
+            logging.error("Erreur lors de la recherche %s pour %s: %s", source, battle_name, e)
+            contents.append(None)
+            errors.append(e)
+    return contents[0], contents[1], errors
+
+def apply_enrichment(battle, gallica_info=None, persee_info=None):
+    """
+    Applique le contexte, les sources et les médias à une bataille (sans commit)
+    """
+    # Ajout du contexte historique de base
+    battle.historical_context = get_period_context(battle.year)
+
+    # Récupération des URLs des sources avec vérification des liens
+    sources = get_sources_urls(battle.name, battle.year)
+    if sources:
+        battle.sources = json.dumps(sources, ensure_ascii=False)
 
-        # Ajout du contexte historique de base
-        battle.historical_context = get_period_context(battle.year)
+    if gallica_info:
+        battle.historical_context += f"\n\nInformations complémentaires de Gallica :\n{gallica_info[:500]}..."
 
-        # Récupération des URLs des sources avec vérification des liens
-        sources = get_sources_urls(battle.name, battle.year)
-        if sources:
-            battle.sources = json.dumps(sources, ensure_ascii=False)
+    if persee_info:
+        battle.historical_context += f"\n\nInformations complémentaires de Persée :\n{persee_info[:500]}..."
 
-        # Tentative de récupération d'informations de Gallica
-        gallica_info = get_gallica_content(battle.name, battle.year)
-        if gallica_info:
-            battle.historical_context += f"\n\nInformations complémentaires de Gallica :\n{gallica_info[:500]}..."
+    # Ajout des médias si nécessaire
+    if not battle.media_urls:
+        from utils import generate_sample_media_urls
+        battle.media_urls = generate_sample_media_urls(battle.year)
 
-        # Tentative de récupération d'informations de Persée
-        persee_info = get_persee_content(battle.name, battle.year)
-        if persee_info:
-            battle.historical_context += f"\n\nInformations complémentaires de Persée :\n{persee_info[:500]}..."
+    if not battle.image_url:
+        from utils import generate_sample_image_url
+        battle.image_url = generate_sample_image_url(battle.year)
 
-        # Ajout des médias si nécessaire
-        if not battle.media_urls:
-            from utils import generate_sample_media_urls
-            battle.media_urls = generate_sample_media_urls(battle.year)
+def process_battle_enrichment(battle):
+    """
+    Enrichit les informations d'une bataille avec des sources externes et un contexte historique
+    """
+    try:
+        logging.info("Enrichissement des informations pour la bataille : %s", battle.name)
 
-        if not battle.image_url:
-            from utils import generate_sample_image_url
-            battle.image_url = generate_sample_image_url(battle.year)
+        # Gallica et Persée sont interrogés en parallèle ; une source en échec est
+        # ignorée ici (erreur journalisée), l'utilisateur peut relancer l'enrichissement
+        gallica_info, persee_info, _ = fetch_enrichment_sources(battle.name, battle.year)
+        apply_enrichment(battle, gallica_info, persee_info)
 
-        # Sauvegarde des modifications
+        # Sauvegarde des modifications ; la version de contenu change les ETags
+        bump_data_version(CONTENT_VERSION)
         db.session.commit()
-        logging.info(f"Enrichissement réussi pour la bataille : {battle.name}")
+        logging.info("Enrichissement réussi pour la bataille : %s", battle.name)
         return True
 
     except Exception as e:
-        logging.error(f"Erreur lors de l'enrichissement de la bataille {battle.name}: {str(e)}")
+        logging.error("Erreur lors de l'enrichissement de la bataille %s: %s", battle.name, e)
         db.session.rollback()
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import logging
+import time
+from itertools import islice
+from app import db
+from models import Battle, battle_type_from_name
+from services.statistics import refresh_statistics
+from services.search import rebuild_search_index
+from services.spatial import rebuild_spatial_index
+from services.histogram import rebuild_histograms
+from services.changes import record_reset
+from services.value_dictionary import value_dictionary, split_context
+
+# Ordre des colonnes attendu pour les tuples chargés en masse
+BATTLE_COLUMNS = (
+    'name', 'year', 'latitude', 'longitude', 'description', 'participants',
+    'outcome', 'historical_context', 'sources', 'image_url', 'media_urls'
+)
+# Colonnes écrites dans la table : les valeurs répétées deviennent des références vers battle_value
+STORED_COLUMNS = (
+    'name', 'year', 'latitude', 'longitude', 'description', 'participants_id', 'outcome_id',
+    'context_id', 'context_detail', 'sources', 'image_url_id', 'media_urls_id', 'battle_type'
+)
+REQUIRED_COLUMNS = ('name', 'year', 'latitude', 'longitude')
+DEFAULT_CHUNK_SIZE = 10000
+
+# Réglages SQLite pour le chargement : pas de fsync, cache de pages élargi
+SQLITE_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': '-65536',  # 64 Mo
+    'temp_store': 'MEMORY',
+}
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _coerce_row(record, line_number):
+    """
+    Convertit un enregistrement (dict) en tuple dans l'ordre de BATTLE_COLUMNS
+    """
+    missing = [column for column in REQUIRED_COLUMNS if record.get(column) in (None, '')]
+    if missing:
+        raise ValueError(f"Ligne {line_number} : colonnes obligatoires manquantes ({', '.join(missing)})")
+    row = []
+    for column in BATTLE_COLUMNS:
+        value = record.get(column)
+        if value == '':
+            value = None
+        elif column == 'year':
+            value = int(value)
+        elif column in ('latitude', 'longitude'):
+            value = float(value)
+        elif column in ('sources', 'media_urls') and not isinstance(value, (str, type(None))):
+            value = json.dumps(value, ensure_ascii=False)
+        row.append(value)
+    return tuple(row)
+
+def read_csv(stream):
+    """
+    Lit un flux CSV avec en-tête (noms de colonnes de BATTLE_COLUMNS)
+    """
+    for line_number, record in enumerate(csv.DictReader(stream), start=2):
+        yield _coerce_row(record, line_number)
+
+def read_ndjson(stream):
+    """
+    Lit un flux NDJSON : un objet JSON par ligne
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if line:
+            yield _coerce_row(json.loads(line), line_number)
+
+def _encode_chunk(conn, chunk):
+    """
+    Tuples de BATTLE_COLUMNS convertis en tuples de STORED_COLUMNS
+    """
+    contexts = [split_context(row[7]) for row in chunk]
+    ids = value_dictionary.encode_many(
+        conn, [row[i] for row in chunk for i in (5, 6, 9, 10)] + [prefix for prefix, _ in contexts]
+    )
+    # Le type est dérivé du nom une fois pour toutes, à l'insertion
+    return [
+        (row[0], row[1], row[2], row[3], row[4], ids.get(row[5]), ids.get(row[6]), ids.get(prefix), detail,
+         row[8], ids.get(row[9]), ids.get(row[10]), battle_type_from_name(row[0]))
+        for row, (prefix, detail) in zip(chunk, contexts)
+    ]
+
+def _apply_pragmas(dbapi_conn, pragmas):
+    cursor = dbapi_conn.cursor()
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = cursor.execute(f"PRAGMA {name}").fetchone()[0]
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+    return previous
+
+def _copy_postgresql(dbapi_conn, chunk, columns):
+    # Équivalent PostgreSQL : COPY depuis un tampon CSV en mémoire
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(chunk)
+    buffer.seek(0)
+    cursor = dbapi_conn.cursor()
+    cursor.copy_expert(
+        f"COPY {Battle.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    cursor.close()
+
+def bulk_insert_battles(rows, replace=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insère des batailles (tuples dans l'ordre de BATTLE_COLUMNS) en une seule transaction.
+
+    Les lignes sont consommées par lots : la mémoire utilisée ne dépend pas
+    de la taille du flux. Retourne le nombre de lignes insérées.
+    """
+    started = time.perf_counter()
+    columns = STORED_COLUMNS
+    placeholders = ', '.join(['?'] * len(columns))
+    insert_sql = f"INSERT INTO {Battle.__tablename__} ({', '.join(columns)}) VALUES ({placeholders})"
+    total = 0
+
+    with db.engine.connect() as conn:
+        dialect = conn.dialect.name
+        dbapi_conn = conn.connection.dbapi_connection
+        previous_pragmas = _apply_pragmas(dbapi_conn, SQLITE_LOAD_PRAGMAS) if dialect == 'sqlite' else {}
+        try:
+            with conn.begin():
+                if replace:
+                    conn.execute(Battle.__table__.delete())
+                for chunk in _chunks(rows, chunk_size):
+                    chunk = _encode_chunk(conn, chunk)
+                    if dialect == 'postgresql':
+                        _copy_postgresql(dbapi_conn, chunk, columns)
+                    elif dialect == 'sqlite':
+                        conn.exec_driver_sql(insert_sql, chunk)
+                    else:
+                        conn.execute(Battle.__table__.insert(), [dict(zip(columns, row)) for row in chunk])
+                    total += len(chunk)
+                    logging.debug("Chargement en masse : %s lignes", total)
+                refresh_statistics(conn)
+                rebuild_search_index(conn)
+                rebuild_spatial_index(conn)
+                rebuild_histograms(conn)
+                record_reset(conn)
+        finally:
+            if previous_pragmas:
+                _apply_pragmas(dbapi_conn, previous_pragmas)
+
+    elapsed = time.perf_counter() - started
+    logging.info("%s batailles chargées en %.2fs (%.0f lignes/s)", total, elapsed, total / elapsed if elapsed else 0)
+    return total
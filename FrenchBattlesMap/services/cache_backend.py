@@ -0,0 +1,156 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from flask_caching.backends.base import BaseCache
+
+# Intervalle minimal entre deux mises à jour de la date d'accès d'une entrée,
+# pour éviter une écriture à chaque lecture
+ACCESS_UPDATE_INTERVAL = 10.0
+
+class SQLiteLRUCache(BaseCache):
+    """
+    Cache partagé entre les workers, stocké dans un fichier SQLite.
+
+    La taille totale des valeurs est bornée par un budget en octets :
+    au-delà, les entrées les moins récemment utilisées sont supprimées.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, default_timeout=300, key_prefix=''):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Connexion temporaire : le cache est créé à l'import de app.py, avant un éventuel
+        # fork des workers (gunicorn --preload), qui ne doivent hériter d'aucune connexion
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed)")
+        finally:
+            conn.close()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        cache_dir = config["CACHE_DIR"] or os.path.join(app.instance_path, "cache")
+        kwargs.update(
+            path=os.path.join(cache_dir, "cache.sqlite3"),
+            max_bytes=config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024),
+            key_prefix=config["CACHE_KEY_PREFIX"],
+        )
+        return cls(*args, **kwargs)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self):
+        """
+        Connexion du thread courant, ouverte à la première utilisation dans chaque processus
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Connexion héritée d'un fork : abandonnée sans être fermée, elle appartient au parent
+            conn = self._connect()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else float("inf")
+
+    def get(self, key):
+        key = self.key_prefix + key
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, expires, accessed FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires <= now:
+            self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return None
+        if now - accessed > ACCESS_UPDATE_INTERVAL:
+            self._connection().execute("UPDATE cache_entries SET accessed = ? WHERE key = ?", (now, key))
+        try:
+            return pickle.loads(value)
+        except Exception:
+            logging.warning("Entrée de cache illisible, suppression : %s", key)
+            self.delete(key[len(self.key_prefix):])
+            return None
+
+    def set(self, key, value, timeout=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return False
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (self.key_prefix + key, data, len(data), self._expires(timeout), now)
+        )
+        self._evict(conn, now)
+        return True
+
+    def add(self, key, value, timeout=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connection()
+        # Une entrée expirée ne doit pas empêcher l'ajout
+        conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires <= ?", (self.key_prefix + key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO cache_entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+            (self.key_prefix + key, data, len(data), self._expires(timeout), now)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        cursor = self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (self.key_prefix + key,))
+        return cursor.rowcount > 0
+
+    def has(self, key):
+        row = self._connection().execute(
+            "SELECT 1 FROM cache_entries WHERE key = ? AND expires > ?", (self.key_prefix + key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+        return True
+
+    def _evict(self, conn, now):
+        """
+        Supprime les entrées expirées puis les moins récemment utilisées
+        jusqu'à repasser sous 90 % du budget
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute("DELETE FROM cache_entries WHERE expires <= ?", (now,))
+        target = int(self.max_bytes * 0.9)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        evicted = 0
+        while total > target:
+            rows = conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed LIMIT 50").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+                if total <= target:
+                    break
+        logging.debug("Cache : %s entrées évincées (budget %s octets)", evicted, self.max_bytes)
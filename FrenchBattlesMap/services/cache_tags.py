@@ -0,0 +1,292 @@
+import functools
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g, request, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db, cache
+from models import Battle
+from services.instrumentation import phase, record_cache
+from services.data_version import MARKER_ATTRIBUTES, get_data_version_info
+from services.http_caching import (DEFAULT_MAX_AGE, request_key, etag_base_for, is_not_modified,
+                                   not_modified_response, compress_variants, build_response)
+
+# Largeur (en années) des tranches utilisées pour l'invalidation par période
+YEAR_BUCKET_SIZE = 100
+# Plage de données couverte lorsqu'une requête ne borne pas les années
+MIN_YEAR, MAX_YEAR = -1000, 2100
+# Variation aléatoire (±10 %) des durées de fraîcheur : les entrées créées ensemble n'expirent pas ensemble
+TTL_JITTER = 0.1
+# Durée de vie maximale du verrou de calcul partagé entre workers, et attente maximale d'un calcul en cours
+SINGLE_FLIGHT_TIMEOUT = 30
+SINGLE_FLIGHT_WAIT = 10.0
+SINGLE_FLIGHT_POLL = 0.05
+
+# Tags des batailles écrites par la transaction en cours d'une session
+_PENDING_TAGS_KEY = 'pending_cache_tags'
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="view-refresh")
+
+def battle_tag(battle_id):
+    return f"battle:{battle_id}"
+
+def year_bucket(year):
+    return (year // YEAR_BUCKET_SIZE) * YEAR_BUCKET_SIZE
+
+def year_bucket_tags(start_year=None, end_year=None):
+    """
+    Tags des tranches d'années recoupant la plage [start_year, end_year].
+
+    Les années hors de [MIN_YEAR, MAX_YEAR] partagent un tag par côté
+    (years:<MIN_YEAR, years:>MAX_YEAR) ; une borne absente couvre aussi ce côté.
+    """
+    tags = []
+    if start_year is None or start_year < MIN_YEAR:
+        tags.append(f"years:<{MIN_YEAR}")
+    start = year_bucket(max(start_year if start_year is not None else MIN_YEAR, MIN_YEAR))
+    end = year_bucket(min(end_year if end_year is not None else MAX_YEAR, MAX_YEAR))
+    if (start_year is None or start_year <= MAX_YEAR) and (end_year is None or end_year >= MIN_YEAR):
+        tags.extend(f"years:{bucket}" for bucket in range(start, end + 1, YEAR_BUCKET_SIZE))
+    if end_year is None or end_year > MAX_YEAR:
+        tags.append(f"years:>{MAX_YEAR}")
+    return tags
+
+def _tag_version_map(tags):
+    keys = [f"tag:{tag}" for tag in tags]
+    versions = cache.get_many(*keys) if keys else []
+    for i, version in enumerate(versions):
+        if version is None:
+            # Tag inconnu ou évincé : nouvelle version, pour ne jamais ressusciter d'anciennes entrées
+            cache.add(keys[i], time.time_ns(), timeout=0)
+            versions[i] = cache.get(keys[i])
+    return dict(zip(tags, versions))
+
+def _tag_versions(tags):
+    versions = _tag_version_map(tags)
+    return ','.join(str(versions[tag]) for tag in tags)
+
+def _view_key(key, tag_versions):
+    return f"view:{key}#{tag_versions}"
+
+def view_etag_base(key, tag_versions):
+    """
+    Base d'ETag d'une vue en cache : dérivée des versions de ses tags, comme sa clé.
+
+    Une entrée n'est donc servie qu'avec l'ETag sous lequel elle a été calculée,
+    et une écriture ne change que l'ETag des vues dont elle touche les tags.
+    """
+    return etag_base_for(key, hashlib.sha1(tag_versions.encode('ascii')).hexdigest()[:12])
+
+def view_keys(entries):
+    """
+    Clés du cache de vues pour des couples (chemin, tags) sans query string,
+    avec une seule lecture des versions de tous les tags
+    """
+    versions = _tag_version_map(list(dict.fromkeys(tag for _, tags in entries for tag in tags)))
+    return [_view_key(f"{path}?", ','.join(str(versions[tag]) for tag in tags)) for path, tags in entries]
+
+def store_view_response(key, response, timeout, stale_timeout=None):
+    """
+    Met en cache une réponse de vue avec ses versions compressées ; retourne l'entrée.
+
+    L'entrée est fraîche pendant `timeout` (±TTL_JITTER), puis servie périmée
+    pendant `stale_timeout` (par défaut `timeout`) le temps d'être recalculée.
+    """
+    body = response.get_data()
+    headers = [(k, v) for k, v in response.headers.items() if k != 'Content-Length']
+    with phase('compress'):
+        variants = compress_variants(body)
+    fresh = timeout * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+    entry = (body, response.status_code, headers, variants, time.time() + fresh)
+    with phase('cache'):
+        cache.set(key, entry, int(fresh + (timeout if stale_timeout is None else stale_timeout)))
+    return entry
+
+def _render(f, args, kwargs, key, timeout):
+    """
+    Exécute la vue ; retourne (réponse, None) si elle n'est pas cacheable, sinon (None, entrée)
+    """
+    response = make_response(f(*args, **kwargs))
+    if response.status_code != 200 or response.is_streamed:
+        return response, None
+    return None, store_view_response(key, response, timeout)
+
+def _wait_for_entry(key, lock_key):
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL)
+        entry = cache.get(key)
+        if entry is not None or not cache.has(lock_key):
+            return entry
+    return None
+
+def _single_flight(key, compute):
+    """
+    Un seul calcul par clé : un thread par processus (verrou local), puis un
+    processus parmi les workers (verrou cache.add). Les autres attendent
+    l'entrée produite ; s'ils ne l'obtiennent pas, ils calculent eux-mêmes.
+    """
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(SINGLE_FLIGHT_WAIT)
+        entry = cache.get(key)
+        return (None, entry) if entry is not None else compute()
+
+    lock_key = f"lock:{key}"
+    try:
+        if cache.add(lock_key, os.getpid(), timeout=SINGLE_FLIGHT_TIMEOUT):
+            try:
+                return compute()
+            finally:
+                cache.delete(lock_key)
+        entry = _wait_for_entry(key, lock_key)
+        return (None, entry) if entry is not None else compute()
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+def _refresh_in_background(key, f, args, kwargs, timeout):
+    """
+    Recalcule une entrée périmée hors de la requête, une seule fois pour tous les workers
+    """
+    lock_key = f"lock:{key}"
+    if not cache.add(lock_key, os.getpid(), timeout=SINGLE_FLIGHT_TIMEOUT):
+        return
+    app = current_app._get_current_object()
+    environ = dict(request.environ)
+    # La vue d'origine lisait peut-être sur la réplique (@read_replica, appliqué hors de ce décorateur)
+    use_replica = g.get('use_replica', False)
+
+    def refresh():
+        try:
+            with app.request_context(environ):
+                g.use_replica = use_replica
+                _render(f, args, kwargs, key, timeout)
+        except Exception as e:
+            logging.warning("Rafraîchissement du cache impossible pour %s : %s", key, e)
+        finally:
+            cache.delete(lock_key)
+
+    _refresh_executor.submit(refresh)
+
+def invalidate_tags(*tags):
+    """
+    Invalide toutes les entrées associées aux tags donnés.
+
+    Chaque tag porte une version incluse dans les clés de cache : la changer
+    rend les anciennes entrées inaccessibles, qui expirent ou sont évincées.
+    """
+    version = time.time_ns()
+    cache.set_many({f"tag:{tag}": version for tag in tags}, timeout=0)
+    logging.debug("Tags de cache invalidés : %s", ', '.join(tags))
+
+def battle_tags(battle, previous_year=None, markers=True):
+    """
+    Tags touchés par l'écriture d'une bataille : la sienne, ses tranches d'années
+    (ancienne et nouvelle) et, si ses marqueurs changent, carte et statistiques
+    """
+    tags = {battle_tag(battle.id), *year_bucket_tags(battle.year, battle.year)}
+    if previous_year is not None:
+        tags.update(year_bucket_tags(previous_year, previous_year))
+    if markers:
+        tags.update(('markers', 'statistics'))
+    return tags
+
+def _pending_tags(battle):
+    return object_session(battle).info.setdefault(_PENDING_TAGS_KEY, set())
+
+# Écritures ORM : les tags sont invalidés après chaque flush puis de nouveau après le commit.
+# Une vue calculée entre les deux a lu les données d'avant le commit : la seconde
+# invalidation écarte ses entrées, et aucun ETag en vigueur après le commit n'y renvoie.
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    _pending_tags(battle).update(battle_tags(battle))
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    state = db.inspect(battle)
+    history = state.attrs.year.history
+    previous_year = history.deleted[0] if history.deleted else None
+    markers = any(state.attrs[attr].history.has_changes() for attr in MARKER_ATTRIBUTES + ('battle_type',))
+    _pending_tags(battle).update(battle_tags(battle, previous_year, markers))
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    _pending_tags(battle).update(battle_tags(battle))
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _invalidate_flushed_tags(session, flush_context):
+    tags = session.info.get(_PENDING_TAGS_KEY)
+    if tags:
+        invalidate_tags(*tags)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_tags(session):
+    tags = session.info.pop(_PENDING_TAGS_KEY, None)
+    if tags:
+        invalidate_tags(*tags)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_pending_tags(session):
+    session.info.pop(_PENDING_TAGS_KEY, None)
+
+def cached_view(timeout=300, tags=None, max_age=DEFAULT_MAX_AGE):
+    """
+    Met en cache une vue selon son chemin, sa query string et la version de ses tags.
+
+    `tags` est une liste fixe ou une fonction recevant les arguments de la vue.
+    Seules les réponses 200 sont mises en cache, avec leurs versions compressées :
+    un hit ne refait ni sérialisation ni compression. Les requêtes conditionnelles
+    dont l'ETag est à jour reçoivent un 304 sans que la vue soit exécutée.
+
+    À expiration, l'entrée est encore servie pendant `timeout` secondes et
+    recalculée en arrière-plan ; en l'absence d'entrée, une seule requête par
+    clé exécute la vue, les autres attendent son résultat.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            view_tags = tags(*args, **kwargs) if callable(tags) else (tags or [])
+            with phase('cache'):
+                request_id, tag_versions = request_key(), _tag_versions(view_tags)
+            etag_base = view_etag_base(request_id, tag_versions)
+            # Date de la dernière écriture, toutes données confondues : plus récente que
+            # nécessaire au pire, If-Modified-Since reste donc sûr
+            last_modified = get_data_version_info()[1]
+            if is_not_modified(etag_base, last_modified):
+                record_cache('not_modified')
+                return not_modified_response(etag_base, last_modified, max_age)
+
+            with phase('cache'):
+                key = _view_key(request_id, tag_versions)
+                cached = cache.get(key)
+            if cached is not None:
+                body, status, headers, variants, fresh_until = cached
+                if time.time() < fresh_until:
+                    record_cache('hit')
+                else:
+                    # Périmée : servie immédiatement, recalculée en arrière-plan
+                    record_cache('stale')
+                    _refresh_in_background(key, f, args, kwargs, timeout)
+                return build_response(body, status, headers, variants, etag_base, last_modified, max_age)
+
+            record_cache('miss')
+            response, entry = _single_flight(key, lambda: _render(f, args, kwargs, key, timeout))
+            if response is not None:
+                return response
+            body, status, headers, variants, _ = entry
+            return build_response(body, status, headers, variants, etag_base, last_modified, max_age)
+        return decorated_function
+    return decorator
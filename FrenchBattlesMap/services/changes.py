@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy import event, text
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from models import Battle, BattleChange
+from services.streaming import battle_columns, rows_to_dicts
+
+# Nombre maximal d'entrées du journal lues par appel à /api/v1/changes
+CHANGES_PAGE_SIZE = 1000
+# Flux SSE : désactivé par défaut, chaque client occupe un worker synchrone pendant la connexion
+CHANGE_STREAM_ENABLED = os.environ.get("CHANGE_STREAM_ENABLED") == "1"
+CHANGE_STREAM_POLL_SECONDS = float(os.environ.get("CHANGE_STREAM_POLL_SECONDS", 2))
+# Durée d'une connexion SSE : le navigateur se reconnecte ensuite avec Last-Event-ID
+CHANGE_STREAM_MAX_SECONDS = int(os.environ.get("CHANGE_STREAM_MAX_SECONDS", 60))
+CHANGE_STREAM_HEARTBEAT_SECONDS = 15
+# Clé du verrou consultatif PostgreSQL sérialisant les écritures dans le journal
+CHANGE_LOG_LOCK_KEY = 0x62617474
+
+# Colonnes tenues par le journal lui-même : leur modification n'est pas un changement
+_STAMP_COLUMNS = ('version', 'updated_at')
+
+def _record_change(connection, battle_id, operation):
+    if connection.dialect.name == 'postgresql':
+        # Sans verrou, une transaction plus ancienne pourrait valider un numéro
+        # inférieur au curseur d'un client déjà passé au-delà
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': CHANGE_LOG_LOCK_KEY})
+    now = datetime.utcnow()
+    result = connection.execute(BattleChange.__table__.insert().values(
+        battle_id=battle_id, operation=operation, changed_at=now
+    ))
+    return result.inserted_primary_key[0], now
+
+def _stamp(connection, battle):
+    version, now = _record_change(connection, battle.id, 'upsert')
+    connection.execute(
+        Battle.__table__.update().where(Battle.id == battle.id).values(version=version, updated_at=now)
+    )
+    set_committed_value(battle, 'version', version)
+    set_committed_value(battle, 'updated_at', now)
+
+def record_reset(conn):
+    """
+    Note un rechargement en masse : les clients antérieurs doivent tout relire.
+
+    Les entrées précédentes deviennent inutiles et sont supprimées ; les lignes
+    sans version (nouvellement chargées) reçoivent celle du rechargement.
+    """
+    version, now = _record_change(conn, None, 'reset')
+    conn.execute(BattleChange.__table__.delete().where(BattleChange.version < version))
+    conn.execute(
+        Battle.__table__.update().where(Battle.version.is_(None)).values(version=version, updated_at=now)
+    )
+    logging.info("Journal des modifications réinitialisé (version %s)", version)
+    return version
+
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    _stamp(connection, battle)
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    # after_update est aussi appelé pour un objet marqué modifié sans changement réel
+    state = db.inspect(battle)
+    if any(state.attrs[column.key].history.has_changes()
+           for column in mapper.column_attrs if column.key not in _STAMP_COLUMNS):
+        _stamp(connection, battle)
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    _record_change(connection, battle.id, 'delete')
+
+def current_change_version():
+    return db.session.query(db.func.max(BattleChange.version)).scalar() or 0
+
+def get_changes(since=None, limit=CHANGES_PAGE_SIZE):
+    """
+    Modifications postérieures à la version `since`, une entrée par bataille.
+
+    Les mises à jour portent l'état courant de la bataille (mêmes champs que
+    to_dict). `reset` indique que le client doit tout recharger : rechargement
+    en masse depuis `since`, ou curseur inconnu. Sans `since`, retourne
+    seulement la version courante, à lire avant le chargement initial.
+    """
+    current = current_change_version()
+    if since is None:
+        return {'version': current, 'reset': False, 'has_more': False, 'changes': []}
+    latest_reset = db.session.query(db.func.max(BattleChange.version)).filter(
+        BattleChange.operation == 'reset'
+    ).scalar() or 0
+    if since < latest_reset or since > current:
+        return {'version': current, 'reset': True, 'has_more': False, 'changes': []}
+
+    rows = db.session.query(BattleChange.version, BattleChange.battle_id, BattleChange.operation).filter(
+        BattleChange.version > since
+    ).order_by(BattleChange.version).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Seule la dernière opération de chaque bataille compte, à sa place dans l'ordre du journal
+    latest = {}
+    for version, battle_id, operation in rows:
+        latest.pop(battle_id, None)
+        latest[battle_id] = (version, operation)
+    upserts = [battle_id for battle_id, (_, operation) in latest.items() if operation == 'upsert']
+    battles = {}
+    if upserts:
+        battle_rows = db.session.query(*battle_columns(), Battle.version).filter(Battle.id.in_(upserts)).all()
+        for row, battle in zip(battle_rows, rows_to_dicts(battle_rows)):
+            battles[row[0]] = (row[-1], battle)
+
+    changes = []
+    for battle_id, (version, operation) in latest.items():
+        if battle_id not in battles:
+            # Supprimée entre-temps : l'entrée 'delete' suit dans le journal
+            changes.append({'op': 'delete', 'id': battle_id, 'version': version})
+        else:
+            battle_version, battle = battles[battle_id]
+            changes.append({'op': 'upsert', 'id': battle_id, 'version': battle_version, 'battle': battle})
+    return {
+        'version': rows[-1].version if rows else since,
+        'reset': False,
+        'has_more': has_more,
+        'changes': changes
+    }
+
+def change_events(since):
+    """
+    Flux Server-Sent Events signalant chaque nouvelle version du journal.
+
+    Les événements ne portent que la version : le client lit ensuite le détail
+    sur /api/v1/changes?since=..., ce qui garde une seule logique de reprise.
+    """
+    yield f"retry: {CHANGE_STREAM_POLL_SECONDS * 1000:.0f}\n\n"
+    started = last_event = time.monotonic()
+    while time.monotonic() - started < CHANGE_STREAM_MAX_SECONDS:
+        version = current_change_version()
+        # Fin de la transaction de lecture : le sondage suivant voit les nouveaux commits
+        db.session.rollback()
+        if since is None or version != since:
+            yield f"id: {version}\nevent: changes\ndata: {json.dumps({'version': version})}\n\n"
+            since, last_event = version, time.monotonic()
+        elif time.monotonic() - last_event >= CHANGE_STREAM_HEARTBEAT_SECONDS:
+            yield ": ping\n\n"
+            last_event = time.monotonic()
+        time.sleep(CHANGE_STREAM_POLL_SECONDS)
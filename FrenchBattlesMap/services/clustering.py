@@ -0,0 +1,95 @@
+import logging
+from app import db
+from models import Battle
+from services.markers import marker_columns, markers_to_dicts
+from services.spatial import bbox_filter
+
+# Taille d'une cellule de regroupement, en pixels à l'écran
+CLUSTER_CELL_PIXELS = 80
+# Au-delà de ce niveau de zoom, les batailles sont renvoyées individuellement
+MAX_CLUSTER_ZOOM = 14
+# Taille des lots pour les requêtes IN (limite de variables SQLite)
+ID_CHUNK_SIZE = 500
+
+def parse_bbox(value):
+    """
+    Convertit un paramètre bbox "ouest,sud,est,nord" en tuple de floats
+    """
+    if not value:
+        return None
+    parts = value.split(',')
+    if len(parts) != 4:
+        raise ValueError("bbox doit être de la forme ouest,sud,est,nord")
+    west, south, east, north = (float(part) for part in parts)
+    if west > east or south > north:
+        raise ValueError("bbox invalide : ouest > est ou sud > nord")
+    return west, south, east, north
+
+def cell_size_for_zoom(zoom):
+    """
+    Retourne la taille (en degrés) d'une cellule de la grille pour un niveau de zoom
+    """
+    return CLUSTER_CELL_PIXELS * 360.0 / (256 * 2 ** zoom)
+
+def _apply_filters(query, start_year, end_year, battle_type=None, bbox=None):
+    query = query.filter(Battle.year >= start_year, Battle.year <= end_year)
+    if battle_type:
+        query = query.filter(Battle.battle_type == battle_type)
+    if bbox:
+        query = query.filter(bbox_filter(bbox, start_year, end_year))
+    return query
+
+def _markers_for_ids(ids):
+    markers = []
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[i:i + ID_CHUNK_SIZE]
+        markers.extend(markers_to_dicts(
+            db.session.query(*marker_columns()).filter(Battle.id.in_(chunk)).all()
+        ))
+    return markers
+
+def get_clusters(start_year, end_year, zoom, bbox=None, battle_type=None):
+    """
+    Regroupe les batailles visibles dans une grille dépendant du zoom.
+
+    Les cellules contenant une seule bataille sont renvoyées comme marqueurs
+    individuels ; les autres comme un centroïde accompagné d'un compte.
+    """
+    if zoom >= MAX_CLUSTER_ZOOM:
+        query = _apply_filters(
+            db.session.query(*marker_columns()),
+            start_year, end_year, battle_type, bbox
+        )
+        markers = markers_to_dicts(query.all())
+        return {'zoom': zoom, 'total': len(markers), 'clusters': [], 'battles': markers}
+
+    size = cell_size_for_zoom(zoom)
+    cell_x = db.func.floor((Battle.longitude + 180.0) / size)
+    cell_y = db.func.floor((Battle.latitude + 90.0) / size)
+    query = db.session.query(
+        cell_x.label('cell_x'),
+        cell_y.label('cell_y'),
+        db.func.count().label('count'),
+        db.func.avg(Battle.latitude),
+        db.func.avg(Battle.longitude),
+        db.func.min(Battle.id)
+    )
+    query = _apply_filters(query, start_year, end_year, battle_type, bbox)
+
+    clusters = []
+    single_ids = []
+    total = 0
+    for _, _, count, latitude, longitude, first_id in query.group_by('cell_x', 'cell_y').all():
+        total += count
+        if count == 1:
+            single_ids.append(first_id)
+        else:
+            clusters.append({'latitude': latitude, 'longitude': longitude, 'count': count})
+
+    logging.debug("Zoom %s : %s groupes, %s batailles isolées", zoom, len(clusters), len(single_ids))
+    return {
+        'zoom': zoom,
+        'total': total,
+        'clusters': clusters,
+        'battles': _markers_for_ids(single_ids)
+    }
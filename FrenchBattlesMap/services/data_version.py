@@ -0,0 +1,79 @@
+import logging
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import Battle, DataVersion
+
+# Compteur des données de marqueurs (noms, années, positions) : incrémenté à
+# chaque rechargement, il déclenche la reconstruction des index en mémoire
+BATTLES_VERSION = 'battles'
+# Compteur de contenu : incrémenté à chaque modification, y compris l'enrichissement ;
+# il sert à dériver les ETags des réponses HTTP
+CONTENT_VERSION = 'content'
+# Colonnes reprises par les marqueurs et l'index des années (MARKER_FIELDS, hors id)
+MARKER_ATTRIBUTES = ('name', 'year', 'latitude', 'longitude')
+
+def get_data_version(name=BATTLES_VERSION):
+    """
+    Retourne la version courante des données (0 si jamais incrémentée).
+
+    Lecture de la colonne seule : l'identity map d'une session longue ne peut
+    pas renvoyer une version périmée.
+    """
+    version = db.session.query(DataVersion.version).filter(DataVersion.name == name).scalar()
+    return version or 0
+
+def get_data_version_info(name=CONTENT_VERSION):
+    """
+    Retourne (version, date de modification) sans passer par l'identity map de la session
+    """
+    row = db.session.query(DataVersion.version, DataVersion.updated_at).filter(DataVersion.name == name).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+def _version_names(name):
+    # Un changement des marqueurs (BATTLES_VERSION) est aussi un changement de contenu
+    return [name, CONTENT_VERSION] if name == BATTLES_VERSION else [name]
+
+def _increment_statement(dialect_name, names):
+    # Incrément calculé par la base : pas de mise à jour perdue entre deux workers
+    dialect_insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    stmt = dialect_insert(table).values([{'name': n, 'version': 1, 'updated_at': now} for n in names])
+    return stmt.on_conflict_do_update(
+        index_elements=['name'], set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at}
+    )
+
+def bump_data_version(name=BATTLES_VERSION):
+    """
+    Incrémente la version des données dans la transaction courante.
+
+    Un changement des marqueurs (BATTLES_VERSION) est aussi un changement de
+    contenu. L'appelant reste responsable du commit.
+    """
+    names = _version_names(name)
+    db.session.execute(_increment_statement(db.session.get_bind(DataVersion).dialect.name, names))
+    version = get_data_version(name)
+    logging.debug("Version des données '%s' : %s", name, version)
+    return version
+
+def _bump_from_flush(connection):
+    connection.execute(_increment_statement(connection.dialect.name, _version_names(BATTLES_VERSION)))
+
+# Écritures ORM unitaires (ajout, correction de position ou d'année...) : sans ces
+# écouteurs, l'index des années ne verrait que les rechargements complets
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    _bump_from_flush(connection)
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    # L'enrichissement ne touche pas aux marqueurs : il incrémente seulement CONTENT_VERSION
+    state = db.inspect(battle)
+    if any(state.attrs[attr].history.has_changes() for attr in MARKER_ATTRIBUTES):
+        _bump_from_flush(connection)
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    _bump_from_flush(connection)
@@ -0,0 +1,90 @@
+import functools
+import os
+import sqlite3
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_DATABASE_URL = "sqlite:///battles.db"
+REPLICA_BIND = 'replica'
+# WAL par défaut : les lectures ne sont plus bloquées par les commits de l'enrichissement
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+def database_url(variable="DATABASE_URL", default=DEFAULT_DATABASE_URL):
+    url = os.environ.get(variable, default)
+    # Les hébergeurs exposent souvent l'ancien schéma postgres://, refusé par SQLAlchemy 2
+    if url and url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+def engine_options(url):
+    """
+    Options du pool de connexions, réglables par variables d'environnement
+    """
+    options = {
+        'pool_pre_ping': os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        'pool_recycle': int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    }
+    # SQLite en mémoire utilise un pool à connexion unique, sans dimensionnement
+    if not (url.startswith("sqlite") and (":memory:" in url or url.rstrip('/') == "sqlite:")):
+        options.update({
+            'pool_size': int(os.environ.get("DB_POOL_SIZE", 5)),
+            'max_overflow': int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+            'pool_timeout': int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        })
+    return options
+
+def configure_database(app):
+    """
+    Base principale (DATABASE_URL) et réplique en lecture optionnelle (DATABASE_REPLICA_URL)
+    """
+    url = database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+    replica_url = database_url("DATABASE_REPLICA_URL", None)
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: {'url': replica_url, **engine_options(replica_url)}}
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_WAL:
+        # Persistant dans le fichier ; sans effet (mode "memory") pour une base en mémoire
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+def _replica_requested():
+    return has_app_context() and g.get('use_replica', False)
+
+class RoutingSession(Session):
+    """
+    Session envoyant les lectures des vues marquées @read_replica vers la
+    réplique ; les écritures et les flush restent sur la base principale.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _replica_requested() and not getattr(clause, 'is_dml', False):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_replica(f):
+    """
+    Sert la vue depuis la réplique en lecture si elle est configurée.
+
+    À placer juste sous @app.route : validateurs HTTP et données sont alors
+    lus sur la même base, au même retard de réplication près.
+    """
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        # g est propre à la requête : le marquage couvre aussi les réponses en flux
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
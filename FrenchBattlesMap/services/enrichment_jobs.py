@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import app, db
+from models import Battle, EnrichmentJob
+from services.battle_enrichment import fetch_enrichment_sources, apply_enrichment
+from services.data_version import bump_data_version, CONTENT_VERSION
+
+# Nombre de batailles enrichies simultanément (chacune interroge deux sources)
+ENRICHMENT_WORKERS = int(os.environ.get("ENRICHMENT_WORKERS", 4))
+# Nombre de batailles enregistrées par transaction
+COMMIT_BATCH_SIZE = 20
+# Nombre maximal de batailles par tâche
+MAX_JOB_SIZE = 50000
+# Taille des lots d'identifiants dans les requêtes IN (limite de variables SQLite)
+ID_CHUNK_SIZE = 500
+# Sans signe de vie depuis ce délai, le worker d'une tâche est considéré comme arrêté
+# (le signe de vie est donné à chaque lot, dont la durée dépend des sources interrogées)
+JOB_HEARTBEAT_TIMEOUT = int(os.environ.get("ENRICHMENT_JOB_TIMEOUT", 15 * 60))
+ACTIVE_STATUSES = ('pending', 'running')
+
+# Une seule tâche exécutée à la fois par worker ; les suivantes attendent leur tour
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enrichment-job")
+_battle_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix="enrichment-battle")
+
+def _worker_id():
+    # Calculé à chaque appel : un worker forké après l'import a un autre pid
+    return f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+def _heartbeat():
+    """
+    Signe de vie pour toutes les tâches actives du worker, y compris celles en file d'attente
+    """
+    EnrichmentJob.query.filter(
+        EnrichmentJob.worker == _worker_id(), EnrichmentJob.status.in_(ACTIVE_STATUSES)
+    ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+
+def expire_orphaned_jobs():
+    """
+    Marque en échec les tâches actives dont le worker ne donne plus signe de vie ;
+    retourne leur nombre
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_HEARTBEAT_TIMEOUT)
+    last_seen = db.func.coalesce(EnrichmentJob.heartbeat_at, EnrichmentJob.created_at)
+    count = EnrichmentJob.query.filter(
+        EnrichmentJob.status.in_(ACTIVE_STATUSES), last_seen < cutoff
+    ).update({
+        'status': 'failed',
+        'error': "Tâche interrompue : le worker qui l'exécutait s'est arrêté",
+        'finished_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logging.warning("%s tâche(s) d'enrichissement orpheline(s) marquée(s) en échec", count)
+    return count
+
+def _select_battle_ids(battle_ids=None, start_year=None, end_year=None, only_missing=True):
+    def selection(query):
+        if start_year is not None:
+            query = query.filter(Battle.year >= start_year)
+        if end_year is not None:
+            query = query.filter(Battle.year <= end_year)
+        if only_missing:
+            query = query.filter(Battle.sources.is_(None))
+        return query
+
+    if not battle_ids:
+        query = selection(db.session.query(Battle.id)).order_by(Battle.year, Battle.id)
+        return [battle_id for (battle_id,) in query.limit(MAX_JOB_SIZE + 1)]
+    # Requêtes IN découpées pour rester sous la limite de paramètres de SQLite
+    rows = []
+    for i in range(0, len(battle_ids), ID_CHUNK_SIZE):
+        chunk = battle_ids[i:i + ID_CHUNK_SIZE]
+        rows.extend(selection(db.session.query(Battle.year, Battle.id).filter(Battle.id.in_(chunk))))
+    return [battle_id for _, battle_id in sorted(rows)]
+
+def submit_enrichment_job(battle_ids=None, start_year=None, end_year=None, only_missing=True):
+    """
+    Crée une tâche d'enrichissement et la place dans la file du worker courant
+    """
+    ids = _select_battle_ids(battle_ids, start_year, end_year, only_missing)
+    if len(ids) > MAX_JOB_SIZE:
+        raise ValueError(f"Une tâche ne peut pas dépasser {MAX_JOB_SIZE} batailles")
+
+    job = EnrichmentJob(
+        status='pending',
+        total=len(ids),
+        worker=_worker_id(),
+        heartbeat_at=datetime.utcnow(),
+        parameters=json.dumps({
+            'battle_ids': battle_ids,
+            'start_year': start_year,
+            'end_year': end_year,
+            'only_missing': only_missing
+        })
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    logging.info("Tâche d'enrichissement %s créée : %s batailles", job.id, len(ids))
+    _job_executor.submit(_run_job, job.id, ids)
+    return job
+
+def _fetch_battle(battle):
+    battle_id, name, year = battle
+    try:
+        gallica, persee, errors = fetch_enrichment_sources(name, year)
+    except Exception as e:
+        return battle_id, None, e
+    if errors:
+        # Bataille laissée non enrichie : une tâche only_missing ultérieure la reprendra
+        return battle_id, None, errors[0]
+    return battle_id, (gallica, persee), None
+
+def _run_job(job_id, ids):
+    with app.app_context():
+        job = db.session.get(EnrichmentJob, job_id)
+        try:
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            job.worker = _worker_id()
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            for i in range(0, len(ids), COMMIT_BATCH_SIZE):
+                _run_batch(job, ids[i:i + COMMIT_BATCH_SIZE])
+
+            job.status = 'completed'
+        except Exception as e:
+            logging.error("Échec de la tâche d'enrichissement %s : %s", job_id, e)
+            db.session.rollback()
+            job = db.session.get(EnrichmentJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+        logging.info("Tâche d'enrichissement %s terminée : %s (%s/%s, %s échecs)", job_id, job.status, job.processed, job.total, job.failed)
+
+def _run_batch(job, batch_ids):
+    """
+    Interroge les sources pour un lot de batailles en parallèle, puis enregistre le lot
+    """
+    battles = Battle.query.filter(Battle.id.in_(batch_ids)).all()
+    # Les appels réseau se font hors session, sur des tuples simples
+    results = _battle_executor.map(_fetch_battle, [(b.id, b.name, b.year) for b in battles])
+
+    by_id = {battle.id: battle for battle in battles}
+    enriched = 0
+    failed = 0
+    for battle_id, sources, error in results:
+        battle = by_id[battle_id]
+        if error is not None:
+            logging.warning("Enrichissement impossible pour la bataille %s : %s", battle_id, error)
+            failed += 1
+            continue
+        apply_enrichment(battle, *sources)
+        enriched += 1
+
+    job.processed += len(batch_ids)
+    job.failed += failed + len(batch_ids) - len(battles)  # Identifiants supprimés entre-temps
+    _heartbeat()
+    if enriched:
+        bump_data_version(CONTENT_VERSION)
+    # Le commit invalide les tags des batailles enrichies (services.cache_tags)
+    db.session.commit()
@@ -0,0 +1,156 @@
+import logging
+import math
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import Battle, YearHistogram, GridHistogram
+
+# Taille (en degrés) des cellules de la grille d'histogrammes ; la modifier impose une reconstruction
+HISTOGRAM_CELL_DEGREES = 1.0
+# Nombre maximal de classes renvoyées par /api/v1/histogram
+MAX_BINS = 5000
+
+def cell_of(latitude, longitude):
+    return (math.floor((longitude + 180.0) / HISTOGRAM_CELL_DEGREES),
+            math.floor((latitude + 90.0) / HISTOGRAM_CELL_DEGREES))
+
+def _cell_expr(column, offset):
+    return db.func.cast(db.func.floor((column + offset) / HISTOGRAM_CELL_DEGREES), db.Integer)
+
+def rebuild_histograms(conn):
+    """
+    Recalcule les deux histogrammes par agrégation (après un chargement en masse)
+    """
+    battle_type = db.func.coalesce(Battle.battle_type, '')
+    conn.execute(YearHistogram.__table__.delete())
+    conn.execute(GridHistogram.__table__.delete())
+    conn.execute(YearHistogram.__table__.insert().from_select(
+        ['year', 'battle_type', 'count'],
+        db.select(Battle.year, battle_type, db.func.count()).group_by(Battle.year, battle_type)
+    ))
+    cell_x, cell_y = _cell_expr(Battle.longitude, 180.0), _cell_expr(Battle.latitude, 90.0)
+    conn.execute(GridHistogram.__table__.insert().from_select(
+        ['cell_x', 'cell_y', 'year', 'battle_type', 'count'],
+        db.select(cell_x, cell_y, Battle.year, battle_type, db.func.count())
+        .group_by(cell_x, cell_y, Battle.year, battle_type)
+    ))
+    logging.info("Histogrammes par année recalculés")
+
+def _add_counts(connection, table, rows):
+    if not rows:
+        return
+    dialect_insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(table).values(rows)
+    keys = [column.name for column in table.primary_key.columns]
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=keys, set_={'count': table.c.count + stmt.excluded.count}
+    ))
+
+def record_histogram(connection, battles, sign=1):
+    """
+    Met à jour les histogrammes pour des (année, type, latitude, longitude)
+    ajoutés (sign=1) ou supprimés (sign=-1)
+    """
+    years, cells = {}, {}
+    for year, battle_type, latitude, longitude in battles:
+        battle_type = battle_type or ''
+        years[(year, battle_type)] = years.get((year, battle_type), 0) + sign
+        key = (*cell_of(latitude, longitude), year, battle_type)
+        cells[key] = cells.get(key, 0) + sign
+    _add_counts(connection, YearHistogram.__table__, [
+        {'year': year, 'battle_type': battle_type, 'count': count}
+        for (year, battle_type), count in years.items()
+    ])
+    _add_counts(connection, GridHistogram.__table__, [
+        {'cell_x': x, 'cell_y': y, 'year': year, 'battle_type': battle_type, 'count': count}
+        for (x, y, year, battle_type), count in cells.items()
+    ])
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+# Ancienne valeur chargée avant modification, même après un commit qui a expiré l'objet :
+# after_update en a besoin pour décrémenter la bonne année ou la bonne cellule
+for _attribute in (Battle.year, Battle.battle_type, Battle.latitude, Battle.longitude):
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True)
+
+def _histogram_entry(battle):
+    return battle.year, battle.battle_type, battle.latitude, battle.longitude
+
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    record_histogram(connection, [_histogram_entry(battle)])
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    # L'enrichissement ne touche à aucune de ces colonnes : rien à faire dans ce cas
+    state = db.inspect(battle)
+    attrs = ('year', 'battle_type', 'latitude', 'longitude')
+    if not any(state.attrs[attr].history.has_changes() for attr in attrs):
+        return
+    previous = tuple(
+        state.attrs[attr].history.deleted[0] if state.attrs[attr].history.deleted else getattr(battle, attr)
+        for attr in attrs
+    )
+    record_histogram(connection, [previous], sign=-1)
+    record_histogram(connection, [_histogram_entry(battle)])
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    record_histogram(connection, [_histogram_entry(battle)], sign=-1)
+
+def get_histogram(start_year=None, end_year=None, battle_type=None, bbox=None, bin_size=1, by_type=False):
+    """
+    Nombre de batailles par classe d'années, éventuellement restreint à une zone.
+
+    Avec bbox, les cellules de la grille recoupant la zone sont comptées en
+    entier : le résultat est exact si la zone suit la grille, sinon approché
+    par excès (`approximate`).
+    """
+    table = GridHistogram if bbox else YearHistogram
+    query = db.session.query(table.year, table.battle_type, db.func.sum(table.count)).filter(table.count > 0)
+    if start_year is not None:
+        query = query.filter(table.year >= start_year)
+    if end_year is not None:
+        query = query.filter(table.year <= end_year)
+    if battle_type:
+        query = query.filter(table.battle_type == battle_type)
+    approximate = False
+    if bbox:
+        west, south, east, north = bbox
+        min_x, min_y = cell_of(south, west)
+        # Borne haute alignée sur la grille : la cellule suivante n'est pas incluse
+        max_x = max(math.ceil((east + 180.0) / HISTOGRAM_CELL_DEGREES) - 1, min_x)
+        max_y = max(math.ceil((north + 90.0) / HISTOGRAM_CELL_DEGREES) - 1, min_y)
+        query = query.filter(GridHistogram.cell_x.between(min_x, max_x), GridHistogram.cell_y.between(min_y, max_y))
+        approximate = any((value / HISTOGRAM_CELL_DEGREES) % 1 for value in bbox)
+    rows = query.group_by(table.year, table.battle_type).all()
+
+    if start_year is None or end_year is None:
+        years = [year for year, _, _ in rows]
+        start_year = start_year if start_year is not None else min(years, default=0)
+        end_year = end_year if end_year is not None else max(years, default=start_year)
+    first_bin = (start_year // bin_size) * bin_size
+    bins = max((end_year // bin_size) * bin_size - first_bin, 0) // bin_size + 1
+    if bins > MAX_BINS:
+        raise ValueError(f"Trop de classes ({bins}) : augmenter bin ou réduire la plage")
+
+    counts = [0] * bins
+    types = {}
+    for year, row_type, count in rows:
+        index = (year // bin_size) * bin_size - first_bin
+        counts[index // bin_size] += count
+        if by_type:
+            types.setdefault(row_type or None, [0] * bins)[index // bin_size] += count
+
+    result = {
+        'start_year': first_bin,
+        'end_year': end_year,
+        'bin': bin_size,
+        'total': sum(counts),
+        'counts': counts,
+        'approximate': approximate
+    }
+    if by_type:
+        result['types'] = {t: values for t, values in types.items() if t is not None}
+    return result
@@ -0,0 +1,120 @@
+import functools
+import gzip
+import hashlib
+from datetime import timezone
+from flask import request, make_response
+from services.data_version import get_data_version_info
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle : sans elle, seul gzip est proposé
+    brotli = None
+
+# En dessous de cette taille, la compression ne fait pas gagner de temps de transfert
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+DEFAULT_MAX_AGE = 60
+
+def request_key():
+    """
+    Chemin et query string triée : identifie la représentation demandée
+    """
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.path}?{query}"
+
+def etag_base_for(key, version):
+    """
+    Base d'ETag de la représentation `key` (voir request_key) à la version de contenu donnée
+    """
+    return f"v{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+def current_validators():
+    """
+    Base d'ETag forte et date de dernière modification pour la requête courante.
+
+    L'ETag dérive de la version de contenu (incrémentée à chaque écriture)
+    et de la requête : deux réponses de même ETag ont le même corps.
+    """
+    version, updated_at = get_data_version_info()
+    if updated_at is not None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+    return etag_base_for(request_key(), version), updated_at
+
+def _etag(base, encoding):
+    # Chaque encodage est une représentation distincte : l'ETag forte doit différer
+    return base if encoding == 'identity' else f"{base}-{encoding}"
+
+def is_not_modified(etag_base, last_modified):
+    if request.if_none_match:
+        return any(request.if_none_match.contains_weak(_etag(etag_base, encoding))
+                   for encoding in ('identity', 'gzip', 'br'))
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def compress_variants(body):
+    """
+    Versions compressées d'un corps de réponse, calculées une fois avant mise en cache
+    """
+    if len(body) < COMPRESS_MIN_SIZE:
+        return {}
+    variants = {'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    # Un format binaire déjà dense peut ne rien gagner : inutile de le servir compressé
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body) * 0.9}
+
+def _choose_encoding(variants):
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+def _set_validators(response, etag, last_modified, max_age):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = f"public, max-age={max_age}"
+    return response
+
+def not_modified_response(etag_base, last_modified, max_age=DEFAULT_MAX_AGE):
+    response = make_response('', 304)
+    response.vary.add('Accept-Encoding')
+    return _set_validators(response, _etag(etag_base, 'identity'), last_modified, max_age)
+
+def encoded_response(body, status, headers, variants):
+    """
+    Réponse dans l'encodage accepté par le client, sans validateurs HTTP
+    """
+    encoding = _choose_encoding(variants)
+    response = make_response(variants.get(encoding, body), status, headers)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def build_response(body, status, headers, variants, etag_base, last_modified, max_age=DEFAULT_MAX_AGE):
+    """
+    Réponse à partir d'un corps déjà sérialisé et de ses versions compressées
+    """
+    response = encoded_response(body, status, headers, variants)
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    return _set_validators(response, _etag(etag_base, encoding), last_modified, max_age)
+
+def conditional_view(max_age=DEFAULT_MAX_AGE):
+    """
+    ETag, Last-Modified et réponses 304 pour une vue non mise en cache côté serveur
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag_base, last_modified = current_validators()
+            if is_not_modified(etag_base, last_modified):
+                return not_modified_response(etag_base, last_modified, max_age)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, _etag(etag_base, 'identity'), last_modified, max_age)
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,273 @@
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bornes (secondes) de l'histogramme des durées de requête
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Profileur par échantillonnage : disponible seulement si PROFILER_ENABLED=1
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED") == "1"
+PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.005))
+PROFILER_MAX_DEPTH = 64
+# Exposition de /metrics : désactivée sauf METRICS_ENABLED=1 ; si METRICS_TOKEN est
+# défini, il doit être présenté en "Authorization: Bearer <jeton>"
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED") == "1"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Instrumentation de la couche SQL : chaque requête est comptée et chronométrée
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._sql_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_started' in g:
+        g.sql_count += 1
+        g.sql_time += time.perf_counter() - g.pop('_sql_started', time.perf_counter())
+
+@contextmanager
+def phase(name):
+    """
+    Chronomètre une phase de la requête courante (ORM, to_dict, jsonify...).
+
+    Le temps passé dans la base pendant la phase est déduit : il est déjà
+    compté dans la phase "db". Sans requête HTTP en cours, ne fait rien.
+    """
+    if not has_request_context() or 'request_started' not in g:
+        yield
+        return
+    started, sql_before = time.perf_counter(), g.sql_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (g.sql_time - sql_before)
+        g.phases[name] = g.phases.get(name, 0.0) + elapsed
+
+def record_cache(result):
+    """
+    Enregistre l'issue d'une consultation du cache de vues : hit, stale, miss ou not_modified
+    """
+    metrics.observe_cache(result)
+    if has_request_context() and 'request_started' in g:
+        g.cache_result = result
+
+class Metrics:
+    """
+    Compteurs et histogrammes du processus, exposés au format texte Prometheus.
+
+    Chaque worker gunicorn tient ses propres séries (label `worker`) : Prometheus
+    agrège ensuite les workers avec sum().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.duration_sum = Counter()
+        self.duration_count = Counter()
+        self.sql_queries = Counter()
+        self.phase_seconds = Counter()
+        self.cache = Counter()
+
+    def observe_request(self, endpoint, method, status, duration, sql_count, phases):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            buckets = self.duration_buckets[endpoint]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.duration_sum[endpoint] += duration
+            self.duration_count[endpoint] += 1
+            self.sql_queries[endpoint] += sql_count
+            for name, seconds in phases.items():
+                self.phase_seconds[(endpoint, name)] += seconds
+
+    def observe_cache(self, result):
+        with self._lock:
+            self.cache[result] += 1
+
+    def render(self):
+        worker = os.getpid()
+        lines = []
+
+        def family(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family('battles_http_requests_total', 'counter', "Requêtes HTTP traitées")
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(f'battles_http_requests_total{{worker="{worker}",endpoint="{endpoint}",'
+                             f'method="{method}",status="{status}"}} {value}')
+
+            family('battles_http_request_duration_seconds', 'histogram', "Durée des requêtes HTTP")
+            for endpoint, buckets in sorted(self.duration_buckets.items()):
+                labels = f'worker="{worker}",endpoint="{endpoint}"'
+                for bound, value in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'battles_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {value}')
+                lines.append(f'battles_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {self.duration_count[endpoint]}')
+                lines.append(f'battles_http_request_duration_seconds_sum{{{labels}}} {self.duration_sum[endpoint]:.6f}')
+                lines.append(f'battles_http_request_duration_seconds_count{{{labels}}} {self.duration_count[endpoint]}')
+
+            family('battles_sql_queries_total', 'counter', "Requêtes SQL exécutées pendant les requêtes HTTP")
+            for endpoint, value in sorted(self.sql_queries.items()):
+                lines.append(f'battles_sql_queries_total{{worker="{worker}",endpoint="{endpoint}"}} {value}')
+
+            family('battles_phase_seconds_total', 'counter', "Temps cumulé par phase de traitement")
+            for (endpoint, name), value in sorted(self.phase_seconds.items()):
+                lines.append(f'battles_phase_seconds_total{{worker="{worker}",endpoint="{endpoint}",phase="{name}"}} {value:.6f}')
+
+            family('battles_view_cache_total', 'counter', "Consultations du cache de vues")
+            for result, value in sorted(self.cache.items()):
+                lines.append(f'battles_view_cache_total{{worker="{worker}",result="{result}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def metrics_authorized(authorization):
+    """
+    Indique si l'en-tête Authorization donne accès à /metrics
+    """
+    if not METRICS_TOKEN:
+        return True
+    scheme, _, token = (authorization or '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), METRICS_TOKEN)
+
+class StackSampler:
+    """
+    Profileur statistique : un thread relève périodiquement la pile des
+    threads en train de servir une requête et cumule les piles "repliées"
+    (format flamegraph.pl / speedscope). Coût nul tant qu'il est arrêté.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._active_threads = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+        logging.info("Profileur par échantillonnage démarré (intervalle %.3fs)", self.interval)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logging.info("Profileur par échantillonnage arrêté")
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+    def enter(self, endpoint):
+        if self._running:
+            self._active_threads[threading.get_ident()] = endpoint
+
+    def leave(self):
+        self._active_threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while self._running:
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, endpoint in list(self._active_threads.items()):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self.samples[self._collapse(endpoint, frame)] += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _collapse(endpoint, frame):
+        stack = []
+        while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        stack.append(endpoint)
+        return ';'.join(reversed(stack))
+
+    def collapsed(self):
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+sampler = StackSampler()
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.phases = {}
+    sampler.enter(request.endpoint or 'unknown')
+
+def _observe(state, endpoint, method, status):
+    duration = time.perf_counter() - state.request_started
+    phases = dict(state.phases)
+    phases['db'] = state.sql_time
+    metrics.observe_request(endpoint, method, status, duration, state.sql_count, phases)
+    return duration, phases
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    if response.is_streamed:
+        # Le générateur ne s'exécute qu'après after_request : la mesure est faite à la
+        # fermeture de la réponse. stream_with_context conserve le même objet g, où les
+        # écouteurs SQL continuent de compter pendant le flux.
+        state, method = g._get_current_object(), request.method
+
+        def observe_streamed():
+            sampler.leave()
+            _observe(state, endpoint, method, response.status_code)
+
+        response.call_on_close(observe_streamed)
+        # Server-Timing part avec les en-têtes : seul le temps avant le flux y figure
+        elapsed = time.perf_counter() - g.request_started
+        response.headers['Server-Timing'] = f'headers;dur={elapsed * 1000:.2f}'
+        return response
+
+    sampler.leave()
+    duration, phases = _observe(g, endpoint, request.method, response.status_code)
+
+    # Détail visible dans les outils de développement du navigateur
+    timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+    # En-tête limité à l'ASCII : valeurs brutes plutôt que libellés
+    timings.append(f'sql-queries;desc="{g.sql_count}"')
+    if 'cache_result' in g:
+        timings.append(f'view-cache;desc="{g.cache_result}"')
+    timings.append(f'total;dur={duration * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("%s %s -> %s en %.1f ms (%d requêtes SQL, %s)", request.method, request.full_path,
+                      response.status_code, duration * 1000, g.sql_count,
+                      ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in phases.items()))
+    return response
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(lambda exc: sampler.leave())
+    if os.environ.get("PROFILER_AUTOSTART") == "1" and PROFILER_ENABLED:
+        sampler.start()
@@ -0,0 +1,70 @@
+import struct
+import sys
+from array import array
+from flask import Response, jsonify
+from models import Battle
+
+# Champs nécessaires pour placer un marqueur sur la carte
+MARKER_FIELDS = ('id', 'name', 'year', 'latitude', 'longitude')
+MARKER_FORMATS = ('full', 'marker', 'columnar', 'packed')
+PACKED_MIMETYPE = 'application/vnd.battles.markers'
+
+def marker_columns():
+    """
+    Colonnes à sélectionner pour une projection "marqueur" (sans hydratation ORM)
+    """
+    return (Battle.id, Battle.name, Battle.year, Battle.latitude, Battle.longitude)
+
+def markers_to_dicts(rows):
+    return [dict(zip(MARKER_FIELDS, row)) for row in rows]
+
+def markers_to_columns(rows):
+    """
+    Transpose les lignes (id, name, year, lat, lon) en tableaux par colonne
+    """
+    columns = {field: [] for field in MARKER_FIELDS}
+    appenders = [columns[field].append for field in MARKER_FIELDS]
+    for row in rows:
+        for append, value in zip(appenders, row):
+            append(value)
+    return {'count': len(columns['id']), 'fields': list(MARKER_FIELDS), **columns}
+
+def pack_markers(rows):
+    """
+    Encode les marqueurs dans un format binaire lisible via des TypedArray.
+
+    Disposition (little-endian) : uint32 count, int32[count] ids,
+    int32[count] years, float32[count] latitudes, float32[count] longitudes,
+    puis les noms en UTF-8 séparés par des retours à la ligne.
+    """
+    ids, years = array('i'), array('i')
+    latitudes, longitudes = array('f'), array('f')
+    names = []
+    for id_, name, year, latitude, longitude in rows:
+        ids.append(id_)
+        years.append(year)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        names.append(name)
+    if sys.byteorder != 'little':
+        for values in (ids, years, latitudes, longitudes):
+            values.byteswap()
+    return b''.join((
+        struct.pack('<I', len(ids)),
+        ids.tobytes(),
+        years.tobytes(),
+        latitudes.tobytes(),
+        longitudes.tobytes(),
+        '\n'.join(names).encode('utf-8')
+    ))
+
+def marker_response(rows, output_format, extra=None):
+    """
+    Construit la réponse pour une liste de marqueurs dans le format demandé
+    """
+    if output_format == 'packed':
+        return Response(pack_markers(rows), mimetype=PACKED_MIMETYPE)
+    payload = markers_to_columns(rows) if output_format == 'columnar' else markers_to_dicts(rows)
+    if extra is None:
+        return jsonify(payload)
+    return jsonify({**extra, 'battles': payload})
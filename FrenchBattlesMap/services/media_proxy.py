@@ -0,0 +1,327 @@
+import fcntl
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import urllib3
+from urllib3.util import Retry
+from services.source_fetcher import USER_AGENT, HostRateLimiter, normalize_url
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Dépendance optionnelle : sans elle, l'image d'origine est servie telle quelle
+    Image = None
+
+# Côté le plus long des vignettes : une largeur demandée est arrondie à la classe supérieure
+THUMBNAIL_SIZES = (160, 320, 640, 1280)
+DEFAULT_THUMBNAIL_SIZE = 320
+# Taille maximale du cache sur disque (originaux et vignettes)
+DEFAULT_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Hôtes (hôte[:port]) que le proxy accepte de contacter : sans liste, il servirait à joindre n'importe quelle adresse
+DEFAULT_ALLOWED_HOSTS = os.environ.get("MEDIA_ALLOWED_HOSTS", "upload.wikimedia.org")
+# Taille maximale d'une image d'origine téléchargée
+MAX_SOURCE_BYTES = int(os.environ.get("MEDIA_MAX_SOURCE_BYTES", 50 * 1024 * 1024))
+# Une URL en échec n'est pas redemandée avant ce délai (secondes)
+FAILURE_TTL = 300
+# Nombre maximal d'URL en échec mémorisées ; au-delà, les plus anciennes sont oubliées
+MAX_TRACKED_FAILURES = 10000
+# Intervalle minimal entre deux mises à jour de la date d'accès d'un fichier
+ACCESS_UPDATE_INTERVAL = 60
+# Au-delà, Pillow refuse de décoder (images « bombes » de décompression)
+MAX_IMAGE_PIXELS = 100 * 1000 * 1000
+JPEG_QUALITY = 82
+_RASTER_TYPES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+def thumbnail_size(width):
+    """
+    Classe de taille pour une largeur demandée (la plus grande si elle est dépassée)
+    """
+    for size in THUMBNAIL_SIZES:
+        if width <= size:
+            return size
+    return THUMBNAIL_SIZES[-1]
+
+def _make_thumbnail(data, size):
+    """
+    Vignette (octets, type MIME) d'une image d'origine, None si elle est illisible
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG : décodage directement à une échelle réduite, bien plus rapide
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                image.save(output, format='PNG', optimize=True)
+                return output.getvalue(), 'image/png'
+            image.convert('RGB').save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            return output.getvalue(), 'image/jpeg'
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.warning("Image illisible : %s", e)
+        return None
+
+class MediaProxy:
+    """
+    Télécharge une fois chaque image distante et en sert des vignettes par classe de taille.
+
+    Le cache disque est adressé par contenu : originals/<sha256 du contenu> et
+    thumbs/<sha256>-<taille>, l'index urls/<sha256 de l'URL>.json reliant une URL
+    à son contenu. Une URL n'étant jamais revalidée, ses vignettes ne changent
+    pas et peuvent être servies comme immuables. Au-delà de `max_bytes`, les
+    fichiers les moins récemment utilisés sont supprimés ; un élément manquant
+    est simplement recalculé ou retéléchargé.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, allowed_hosts=DEFAULT_ALLOWED_HOSTS,
+                 max_source_bytes=MAX_SOURCE_BYTES, host_interval=0.5, timeout=20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if isinstance(allowed_hosts, str):
+            allowed_hosts = allowed_hosts.split(',')
+        self.allowed_hosts = frozenset(host.strip().lower() for host in allowed_hosts if host.strip())
+        self.max_source_bytes = max_source_bytes
+        self.rate_limiter = HostRateLimiter(host_interval)
+        self.http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=4,
+            block=True,
+            timeout=urllib3.Timeout(connect=5, read=timeout),
+            retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504)),
+            headers={'User-Agent': USER_AGENT}
+        )
+        self._failures = {}  # {clé: date d'échec}, dans l'ordre chronologique
+        self._failures_lock = threading.Lock()
+        self._written_since_prune = 0
+        self._prune_lock = threading.Lock()
+        for directory in ('urls', 'originals', 'thumbs', 'locks'):
+            os.makedirs(os.path.join(cache_dir, directory), exist_ok=True)
+
+    def _path(self, directory, name):
+        return os.path.join(self.cache_dir, directory, name[:2], name)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Écriture atomique, visible des autres workers
+        self._after_write(len(data))
+
+    def _touch(self, path):
+        # Date de modification utilisée comme date d'accès pour l'éviction
+        try:
+            if time.time() - os.path.getmtime(path) > ACCESS_UPDATE_INTERVAL:
+                os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _read_entry(self, key):
+        path = self._path('urls', key + '.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return entry
+
+    def _lock(self, key):
+        # Un verrou fichier par préfixe de clé (256 au plus) : une URL n'est téléchargée
+        # qu'une fois, tous workers confondus
+        return open(os.path.join(self.cache_dir, 'locks', key[:2] + '.lock'), 'w')
+
+    def _validate(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError("URL d'image invalide")
+        if parts.netloc not in self.allowed_hosts:
+            raise ValueError(f"Hôte non autorisé : {parts.netloc}")
+
+    def _download(self, url):
+        """
+        Corps et type MIME de l'image, ou None en cas d'échec
+        """
+        self.rate_limiter.wait(urlsplit(url).netloc)
+        try:
+            # Pas de redirection suivie : elle pourrait mener hors des hôtes autorisés
+            response = self.http.request('GET', url, preload_content=False, redirect=False)
+        except urllib3.exceptions.HTTPError as e:
+            logging.warning("Échec du téléchargement de %s : %s", url, e)
+            return None
+        try:
+            content_type = (response.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+            if response.status != 200 or not content_type.startswith('image/'):
+                logging.warning("Réponse %s (%s) pour %s", response.status, content_type or '-', url)
+                return None
+            chunks, size = [], 0
+            for chunk in response.stream(64 * 1024):
+                size += len(chunk)
+                if size > self.max_source_bytes:
+                    logging.warning("Image trop volumineuse (> %s octets) : %s", self.max_source_bytes, url)
+                    return None
+                chunks.append(chunk)
+            return b''.join(chunks), content_type
+        except urllib3.exceptions.HTTPError as e:
+            logging.warning("Échec du téléchargement de %s : %s", url, e)
+            return None
+        finally:
+            response.release_conn()
+
+    def _record_failure(self, key):
+        now = time.monotonic()
+        with self._failures_lock:
+            self._failures.pop(key, None)
+            self._failures[key] = now
+            # Les plus anciennes en tête : échecs expirés, puis excédent au-delà de la limite
+            while self._failures:
+                oldest = next(iter(self._failures))
+                if len(self._failures) <= MAX_TRACKED_FAILURES and now - self._failures[oldest] < FAILURE_TTL:
+                    break
+                del self._failures[oldest]
+
+    def _original(self, key, url, entry):
+        """
+        Entrée d'index de l'URL, l'original étant présent sur disque (téléchargé si besoin)
+        """
+        if entry and os.path.exists(self._path('originals', entry['sha256'])):
+            return entry
+        failed_at = self._failures.get(key)
+        if failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL:
+            return None
+        result = self._download(url)
+        if result is None:
+            self._record_failure(key)
+            return None
+        body, content_type = result
+        digest = hashlib.sha256(body).hexdigest()
+        original_path = self._path('originals', digest)
+        # Deux URL peuvent désigner le même fichier : son contenu n'est stocké qu'une fois
+        if not self._touch(original_path):
+            self._write(original_path, body)
+        entry = {'url': url, 'sha256': digest, 'content_type': content_type, 'size': len(body),
+                 'fetched_at': time.time()}
+        self._write(self._path('urls', key + '.json'), json.dumps(entry).encode('utf-8'))
+        with self._failures_lock:
+            self._failures.pop(key, None)
+        logging.info("Image mise en cache : %s (%s octets)", url, len(body))
+        return entry
+
+    def _cached_thumbnail(self, entry, size):
+        for content_type, extension in (('image/jpeg', '.jpg'), ('image/png', '.png')):
+            path = self._path('thumbs', f"{entry['sha256']}-{size}{extension}")
+            if self._touch(path):
+                return path, content_type
+        return None
+
+    def thumbnail(self, url, width=DEFAULT_THUMBNAIL_SIZE):
+        """
+        (chemin, type MIME, ETag) de la vignette de `url`, ou None si l'image est indisponible.
+
+        Lève ValueError pour une URL invalide ou un hôte non autorisé.
+        """
+        url = normalize_url(url)
+        self._validate(url)
+        size = thumbnail_size(width)
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+        entry = self._read_entry(key)
+        cached = entry and self._cached_thumbnail(entry, size)
+        if not cached:
+            with self._lock(key) as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Un autre worker a pu faire le travail pendant l'attente du verrou
+                entry = self._original(key, url, self._read_entry(key))
+                if entry is None:
+                    return None
+                cached = self._cached_thumbnail(entry, size) or self._render(entry, size)
+        if not cached:
+            return None
+        path, content_type = cached
+        return path, content_type, f"{entry['sha256'][:32]}-{size}"
+
+    def _render(self, entry, size):
+        try:
+            with open(self._path('originals', entry['sha256']), 'rb') as f:
+                data = f.read()
+        except OSError:  # Évincé entre-temps : la prochaine demande le retéléchargera
+            return None
+        if Image is None:
+            # Sans Pillow : l'original, s'il s'agit d'un format que le navigateur affiche sans risque
+            if entry['content_type'] not in _RASTER_TYPES:
+                return None
+            return self._path('originals', entry['sha256']), entry['content_type']
+        thumbnail = _make_thumbnail(data, size)
+        if thumbnail is None:
+            return None
+        body, content_type = thumbnail
+        path = self._path('thumbs', f"{entry['sha256']}-{size}{_RASTER_TYPES[content_type]}")
+        self._write(path, body)
+        return path, content_type
+
+    def _after_write(self, size):
+        self._written_since_prune += size
+        if self._written_since_prune > self.max_bytes // 20:
+            self._written_since_prune = 0
+            self.prune()
+
+    def prune(self):
+        """
+        Supprime les fichiers les moins récemment utilisés au-delà de la taille maximale
+        """
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            entries = []
+            total = 0
+            for directory in ('urls', 'originals', 'thumbs'):
+                for root, _, files in os.walk(os.path.join(self.cache_dir, directory)):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, path, stat.st_size))
+                        total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, path, size in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            logging.info("Cache des images : %s fichiers supprimés", removed)
+        finally:
+            self._prune_lock.release()
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+def get_media_proxy():
+    """
+    Retourne le proxy partagé du processus (cache dans instance/media_cache par défaut)
+    """
+    global _proxy
+    if _proxy is None:
+        with _proxy_lock:
+            if _proxy is None:
+                from app import app
+                cache_dir = os.environ.get("MEDIA_CACHE_DIR", os.path.join(app.instance_path, "media_cache"))
+                _proxy = MediaProxy(cache_dir)
+    return _proxy
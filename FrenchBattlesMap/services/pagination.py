@@ -0,0 +1,58 @@
+import base64
+import json
+from app import db
+from models import Battle, BattleStatistic
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+def encode_cursor(year, battle_id):
+    """
+    Jeton de continuation opaque pour la position (année, identifiant)
+    """
+    raw = json.dumps([year, battle_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """
+    Décode un jeton de continuation ; lève ValueError s'il est invalide
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        year, battle_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(year), int(battle_id)
+    except Exception:
+        raise ValueError("Jeton de pagination invalide")
+
+def ordered(query):
+    # Ordre stable (année, identifiant), servi par l'index ix_battle_year
+    return query.order_by(Battle.year, Battle.id)
+
+def after_cursor(query, cursor):
+    """
+    Restreint la requête aux lignes strictement après la position du curseur
+    """
+    year, battle_id = cursor
+    return query.filter(db.or_(
+        Battle.year > year,
+        db.and_(Battle.year == year, Battle.id > battle_id)
+    ))
+
+def estimate_count(year_index, start_year, end_year, battle_type=None):
+    """
+    Estime le nombre de résultats sans parcourir la table : compte exact par
+    l'index des années, pondéré par la proportion du type demandé
+    """
+    count = year_index.count(
+        start_year if start_year is not None else -10 ** 6,
+        end_year if end_year is not None else 10 ** 6
+    )
+    if not battle_type:
+        return count
+    rows = dict(db.session.query(BattleStatistic.kind + ':' + BattleStatistic.key, BattleStatistic.value).filter(
+        db.or_(
+            db.and_(BattleStatistic.kind == 'total', BattleStatistic.key == ''),
+            db.and_(BattleStatistic.kind == 'type', BattleStatistic.key == battle_type)
+        )
+    ).all())
+    total = rows.get('total:', 0)
+    return round(count * rows.get(f'type:{battle_type}', 0) / total) if total else 0
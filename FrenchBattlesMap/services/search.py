@@ -0,0 +1,142 @@
+import html
+import logging
+import re
+from sqlalchemy import event, text
+from app import db
+from models import Battle
+
+# Colonnes indexées et poids associés pour le classement bm25
+SEARCH_COLUMNS = ('name', 'participants', 'outcome', 'description', 'historical_context')
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0, 1.0)
+FTS_TABLE = 'battle_fts'
+# Délimiteurs des termes trouvés dans l'extrait (caractères à usage privé, sans emploi dans les
+# textes) : l'extrait est échappé en HTML avant qu'ils ne deviennent des balises <mark>
+_MARK_START, _MARK_END = '\ue000', '\ue001'
+
+def highlight_excerpt(excerpt):
+    """
+    Extrait HTML sûr : texte échappé, termes trouvés entre balises <mark>
+    """
+    if excerpt is None:
+        return None
+    return html.escape(excerpt).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+class SearchUnavailable(Exception):
+    """
+    La base configurée ne fournit pas d'index plein texte (SQLite FTS5 requis)
+    """
+
+def create_search_index(conn):
+    # unicode61 + remove_diacritics : recherche insensible à la casse et aux accents
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{', '.join(SEARCH_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+
+def rebuild_search_index(conn):
+    """
+    Reconstruit entièrement l'index (après un chargement en masse)
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    # Valeurs du dictionnaire battle_value rejointes : l'index contient le texte décodé
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+        "SELECT b.id, b.name, p.value, o.value, b.description, "
+        "NULLIF(COALESCE(c.value, '') || COALESCE(b.context_detail, ''), '') FROM battle b "
+        "LEFT JOIN battle_value p ON p.id = b.participants_id "
+        "LEFT JOIN battle_value o ON o.id = b.outcome_id "
+        "LEFT JOIN battle_value c ON c.id = b.context_id"
+    ))
+    logging.info("Index de recherche plein texte reconstruit")
+
+def _index_battle(conn, battle, delete_only=False):
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': battle.id})
+    if not delete_only:
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+                 f"VALUES (:id, {', '.join(':' + c for c in SEARCH_COLUMNS)})"),
+            {'id': battle.id, **{c: getattr(battle, c) for c in SEARCH_COLUMNS}}
+        )
+
+# Mise à jour incrémentale pour les écritures ORM (enrichissement, ajouts unitaires)
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    _index_battle(connection, battle)
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    _index_battle(connection, battle)
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    _index_battle(connection, battle, delete_only=True)
+
+def build_match_query(user_query):
+    """
+    Transforme la saisie utilisateur en requête FTS5 : tous les termes sont
+    requis, le dernier est traité comme un préfixe
+    """
+    terms = re.findall(r"\w+", user_query, flags=re.UNICODE)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def search_battles(user_query, start_year=None, end_year=None, bbox=None, battle_type=None, limit=20, offset=0):
+    """
+    Recherche classée (bm25) avec filtres optionnels d'années, de zone et de type.
+
+    Retourne (total, résultats).
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise SearchUnavailable("La recherche plein texte nécessite SQLite (FTS5)")
+    match = build_match_query(user_query)
+    if match is None:
+        return 0, []
+
+    filters = [f"{FTS_TABLE} MATCH :match"]
+    params = {'match': match, 'limit': limit, 'offset': offset}
+    if start_year is not None:
+        filters.append("b.year >= :start_year")
+        params['start_year'] = start_year
+    if end_year is not None:
+        filters.append("b.year <= :end_year")
+        params['end_year'] = end_year
+    if battle_type:
+        filters.append("b.battle_type = :battle_type")
+        params['battle_type'] = battle_type
+    if bbox:
+        filters.append("b.longitude BETWEEN :west AND :east AND b.latitude BETWEEN :south AND :north")
+        params.update(zip(('west', 'south', 'east', 'north'), bbox))
+
+    where = ' AND '.join(filters)
+    join = f"FROM {FTS_TABLE} JOIN battle b ON b.id = {FTS_TABLE}.rowid WHERE {where}"
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+
+    total = db.session.execute(text(f"SELECT COUNT(*) {join}"), params).scalar()
+    rows = db.session.execute(text(
+        f"SELECT b.id, b.name, b.year, b.latitude, b.longitude, b.battle_type, "
+        f"bm25({FTS_TABLE}, {weights}) AS rank, "
+        f"snippet({FTS_TABLE}, -1, :mark_start, :mark_end, '…', 12) AS excerpt "
+        f"{join} ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {**params, 'mark_start': _MARK_START, 'mark_end': _MARK_END}).all()
+
+    results = [
+        {
+            'id': row.id,
+            'name': row.name,
+            'year': row.year,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'battle_type': row.battle_type,
+            'score': round(-row.rank, 4),
+            'excerpt': highlight_excerpt(row.excerpt)
+        }
+        for row in rows
+    ]
+    return total, results
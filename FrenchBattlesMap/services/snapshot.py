@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from app import app, db
+from models import Battle
+from services.markers import marker_columns, markers_to_columns
+from services.changes import current_change_version
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(app.instance_path, "snapshot"))
+MANIFEST_NAME = 'manifest.json'
+# Nombre de caractères du condensat SHA-256 conservés dans les noms de fichiers
+HASH_LENGTH = 12
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _write_shard(output_dir, prefix, payload):
+    """
+    Écrit un fichier nommé d'après son contenu (et sa version gzip pour nginx gzip_static)
+    """
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    filename = f"{prefix}-{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.json"
+    path = os.path.join(output_dir, filename)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+        _write_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    return filename, len(data)
+
+def _tile_of(latitude, longitude, tile_degrees):
+    return math.floor((longitude + 180.0) / tile_degrees), math.floor((latitude + 90.0) / tile_degrees)
+
+def export_snapshot(output_dir=SNAPSHOT_DIR, period_size=100, tile_degrees=None, prune=False):
+    """
+    Exporte les marqueurs en fichiers statiques, par période et éventuellement par tuile.
+
+    Chaque fichier est nommé d'après le condensat de son contenu et peut être
+    servi avec un cache "immutable" ; seul le manifeste, écrit en dernier,
+    change d'une exportation à l'autre. Le client rejoue par-dessus les
+    modifications journalisées depuis sa version, et ne l'écarte qu'après un
+    rechargement complet. Retourne le manifeste.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Lue avant les batailles : une modification pendant l'export rend le manifeste périmé, jamais l'inverse
+    version = current_change_version()
+    query = db.session.query(*marker_columns(), Battle.battle_type).order_by(Battle.year, Battle.id)
+
+    groups = {}
+    for row in query.yield_per(10000):
+        start = (row.year // period_size) * period_size
+        tile = _tile_of(row.latitude, row.longitude, tile_degrees) if tile_degrees else None
+        groups.setdefault((start, tile), []).append(row)
+
+    shards = []
+    for (start, tile), rows in sorted(groups.items(), key=lambda item: (item[0][0], item[0][1] or ())):
+        payload = markers_to_columns(rows)
+        payload['fields'].append('battle_type')
+        payload['battle_type'] = [row.battle_type for row in rows]
+        prefix = f"markers-{start}" + (f"-{tile[0]}-{tile[1]}" if tile else '')
+        filename, size = _write_shard(output_dir, prefix, payload)
+        shard = {
+            'start_year': start,
+            'end_year': start + period_size - 1,
+            'count': len(rows),
+            'bytes': size,
+            'url': filename
+        }
+        if tile:
+            west, south = tile[0] * tile_degrees - 180.0, tile[1] * tile_degrees - 90.0
+            shard['bbox'] = [west, south, west + tile_degrees, south + tile_degrees]
+        shards.append(shard)
+
+    manifest = {
+        # Version du journal des modifications : le client lit /api/v1/changes?since=<version>
+        'version': version,
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'period_size': period_size,
+        'tile_degrees': tile_degrees,
+        'fields': ['id', 'name', 'year', 'latitude', 'longitude', 'battle_type'],
+        'total': sum(shard['count'] for shard in shards),
+        'shards': shards
+    }
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    if prune:
+        # Les clients encore sur l'ancien manifeste perdent ses fichiers : à lancer après expiration
+        keep = {shard['url'] for shard in shards} | {MANIFEST_NAME}
+        for filename in os.listdir(output_dir):
+            if filename.removesuffix('.gz') not in keep:
+                os.remove(os.path.join(output_dir, filename))
+
+    logging.info("Instantané exporté : %s batailles en %s fichiers dans %s", manifest['total'], len(shards), output_dir)
+    return manifest
+
+def refresh_snapshot(output_dir=SNAPSHOT_DIR):
+    """
+    Réexporte l'instantané existant (mêmes périodes et tuiles) après un
+    remplacement des données ; retourne None s'il n'y en a pas
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return export_snapshot(output_dir, period_size=previous['period_size'], tile_degrees=previous.get('tile_degrees'))
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import urllib3
+from urllib3.util import Retry
+
+# Durée pendant laquelle une réponse est servie sans revalidation (7 jours)
+DEFAULT_TTL = int(os.environ.get("SOURCE_CACHE_TTL", 7 * 24 * 3600))
+# Taille maximale du cache sur disque
+DEFAULT_MAX_BYTES = int(os.environ.get("SOURCE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Intervalle minimal entre deux requêtes vers un même hôte (secondes)
+DEFAULT_HOST_INTERVAL = float(os.environ.get("SOURCE_HOST_INTERVAL", 0.5))
+USER_AGENT = "FrenchBattlesMap/0.1 (+enrichissement historique)"
+# Verrous par URL répartis sur un nombre fixe de verrous : la table ne grandit pas avec les URL vues
+LOCK_STRIPES = 64
+
+class SourceFetchError(Exception):
+    """
+    Source injoignable ou réponse en erreur : à distinguer d'une recherche sans résultat
+    """
+
+def normalize_url(url):
+    """
+    Normalise une URL pour servir de clé de cache (hôte en minuscules,
+    paramètres triés, fragment supprimé)
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    netloc = parts.netloc.lower()
+    if (parts.scheme == 'http' and netloc.endswith(':80')) or (parts.scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or '/', query, ''))
+
+class HostRateLimiter:
+    """
+    Espace les requêtes vers un même hôte d'au moins `interval` secondes
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_allowed = {}
+
+    def wait(self, host):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class SourceFetcher:
+    """
+    Récupère des pages externes via un pool de connexions persistantes,
+    avec un cache disque revalidé par ETag / Last-Modified.
+
+    Pour chaque URL normalisée, le cache conserve les métadonnées (.json),
+    le corps brut (.body) et le texte extrait par trafilatura (.txt).
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES,
+                 host_interval=DEFAULT_HOST_INTERVAL, timeout=15):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.rate_limiter = HostRateLimiter(host_interval)
+        self.http = urllib3.PoolManager(
+            num_pools=10,
+            maxsize=8,
+            block=True,
+            timeout=urllib3.Timeout(connect=5, read=timeout),
+            retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504)),
+            headers={'User-Agent': USER_AGENT}
+        )
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._written_since_prune = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.json', base + '.body', base + '.txt'
+
+    def _key_lock(self, key):
+        # Une seule requête à la fois par URL, au sein du processus
+        return self._locks[int(key[:8], 16) % LOCK_STRIPES]
+
+    def _stale_body(self, meta, body_path, reason):
+        """
+        Corps en cache expiré, servi quand la revalidation échoue ; sinon SourceFetchError
+        """
+        if meta:
+            try:
+                with open(body_path, 'rb') as f:
+                    body = f.read()
+                logging.warning("%s : copie en cache expirée servie", reason)
+                return body
+            except OSError:
+                pass
+        logging.warning("%s", reason)
+        raise SourceFetchError(reason)
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Écriture atomique, visible des autres workers
+
+    def fetch(self, url):
+        """
+        Retourne le corps de la réponse (bytes) ; lève SourceFetchError en cas d'échec
+        sans copie en cache, même expirée.
+
+        L'URL normalisée ne sert que de clé de cache : la requête part avec l'URL
+        demandée, dont certains services attendent l'encodage exact.
+        """
+        normalized = normalize_url(url)
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        meta_path, body_path, _ = self._paths(key)
+
+        with self._key_lock(key):
+            meta = self._read_meta(meta_path)
+            if meta and os.path.exists(body_path):
+                if time.time() - meta['fetched_at'] < self.ttl:
+                    os.utime(meta_path)  # Date d'accès utilisée pour l'éviction
+                    with open(body_path, 'rb') as f:
+                        return f.read()
+            else:
+                meta = None
+
+            headers = {}
+            if meta and meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta and meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+            host = urlsplit(normalized).netloc
+            self.rate_limiter.wait(host)
+            try:
+                response = self.http.request('GET', url, headers=headers, preload_content=True)
+            except urllib3.exceptions.HTTPError as e:
+                return self._stale_body(meta, body_path, f"Échec de la requête vers {url} : {e}")
+
+            if response.status == 304 and meta:
+                logging.debug("Réponse en cache revalidée : %s", normalized)
+                meta['fetched_at'] = time.time()
+                self._write(meta_path, json.dumps(meta).encode('utf-8'))
+                with open(body_path, 'rb') as f:
+                    return f.read()
+
+            if response.status != 200:
+                return self._stale_body(meta, body_path, f"Réponse {response.status} pour {url}")
+
+            body = response.data
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            self._write(body_path, body)
+            self._write(meta_path, json.dumps({
+                'url': normalized,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'body_sha256': hashlib.sha256(body).hexdigest(),
+                'size': len(body)
+            }).encode('utf-8'))
+            self._after_write(len(body))
+            return body
+
+    def fetch_text(self, url, extract):
+        """
+        Retourne le texte extrait de la page, en mémorisant le résultat de `extract`
+        tant que le corps de la réponse ne change pas
+        """
+        body = self.fetch(url)
+        if not body:
+            return None
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        meta_path, _, text_path = self._paths(key)
+        body_hash = hashlib.sha256(body).hexdigest()
+        try:
+            with open(text_path, encoding='utf-8') as f:
+                cached_hash, _, text = f.read().partition('\n')
+            if cached_hash == body_hash:
+                return text or None
+        except OSError:
+            pass
+
+        text = extract(body) or ''
+        self._write(text_path, f"{body_hash}\n{text}".encode('utf-8'))
+        return text or None
+
+    def _after_write(self, size):
+        self._written_since_prune += size
+        if self._written_since_prune > self.max_bytes // 20:
+            self._written_since_prune = 0
+            self.prune()
+
+    def prune(self):
+        """
+        Supprime les entrées les moins récemment utilisées au-delà de la taille maximale
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            sizes = {}
+            for name in files:
+                try:
+                    sizes[name] = os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                size = sum(sizes.get(key + ext, 0) for ext in ('.json', '.body', '.txt'))
+                try:
+                    accessed = os.path.getmtime(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((accessed, root, key, size))
+                total += size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, root, key, size in entries:
+            if total <= target:
+                break
+            for ext in ('.json', '.body', '.txt'):
+                try:
+                    os.remove(os.path.join(root, key + ext))
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        logging.info("Cache des sources : %s entrées supprimées", removed)
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_source_fetcher():
+    """
+    Retourne le fetcher partagé du processus (cache dans instance/source_cache par défaut)
+    """
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                from app import app
+                cache_dir = os.environ.get("SOURCE_CACHE_DIR", os.path.join(app.instance_path, "source_cache"))
+                _fetcher = SourceFetcher(cache_dir)
+    return _fetcher
@@ -0,0 +1,155 @@
+import logging
+import math
+from sqlalchemy import event, text
+from app import db
+from models import Battle
+
+RTREE_TABLE = 'battle_rtree'
+KM_PER_DEGREE = 111.32
+# Recherche des k plus proches voisins : rayon initial et rayon maximal (km)
+KNN_START_RADIUS_KM = 25.0
+KNN_MAX_RADIUS_KM = 2500.0
+MAX_NEAREST = 500
+
+# Index R*Tree à trois dimensions : latitude, longitude et année,
+# pour combiner filtre spatial et filtre temporel dans le même index
+battle_rtree = db.table(
+    RTREE_TABLE,
+    db.column('id'),
+    db.column('min_lat'), db.column('max_lat'),
+    db.column('min_lon'), db.column('max_lon'),
+    db.column('min_year'), db.column('max_year')
+)
+
+def create_spatial_index(conn):
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree("
+        "id, min_lat, max_lat, min_lon, max_lon, min_year, max_year)"
+    ))
+
+def rebuild_spatial_index(conn):
+    """
+    Reconstruit entièrement l'index spatial (après un chargement en masse)
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(f"DELETE FROM {RTREE_TABLE}"))
+    conn.execute(text(
+        f"INSERT INTO {RTREE_TABLE} SELECT id, latitude, latitude, longitude, longitude, year, year FROM battle"
+    ))
+    logging.info("Index spatial reconstruit")
+
+def _index_battle(conn, battle, delete_only=False):
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(f"DELETE FROM {RTREE_TABLE} WHERE id = :id"), {'id': battle.id})
+    if not delete_only:
+        conn.execute(
+            text(f"INSERT INTO {RTREE_TABLE} VALUES (:id, :lat, :lat, :lon, :lon, :year, :year)"),
+            {'id': battle.id, 'lat': battle.latitude, 'lon': battle.longitude, 'year': battle.year}
+        )
+
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    _index_battle(connection, battle)
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    # L'enrichissement ne modifie ni la position ni l'année : rien à réindexer
+    state = db.inspect(battle)
+    if any(state.attrs[attr].history.has_changes() for attr in ('latitude', 'longitude', 'year')):
+        _index_battle(connection, battle)
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    _index_battle(connection, battle, delete_only=True)
+
+def parse_point(value):
+    """
+    Convertit un paramètre "lat,lon" en tuple de floats
+    """
+    parts = value.split(',') if value else []
+    if len(parts) != 2:
+        raise ValueError("near doit être de la forme lat,lon")
+    latitude, longitude = float(parts[0]), float(parts[1])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("near hors des limites lat/lon")
+    return latitude, longitude
+
+def radius_bbox(latitude, longitude, radius_km):
+    """
+    Rectangle (ouest, sud, est, nord) englobant un cercle de rayon radius_km
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    delta_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return longitude - delta_lon, latitude - delta_lat, longitude + delta_lon, latitude + delta_lat
+
+def distance_km_expr(latitude, longitude):
+    """
+    Distance approchée (projection équirectangulaire) en km, en expression SQL.
+
+    Le facteur cos(latitude) est calculé en Python : seules des opérations
+    arithmétiques sont envoyées à la base. Erreur < 0,5 % sous 200 km.
+    """
+    lon_scale = math.cos(math.radians(latitude))
+    dx = (Battle.longitude - longitude) * lon_scale
+    dy = Battle.latitude - latitude
+    return db.func.sqrt(dx * dx + dy * dy) * KM_PER_DEGREE
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """
+    Même approximation que distance_km_expr, calculée en Python
+    """
+    dx = (other_longitude - longitude) * math.cos(math.radians(latitude))
+    dy = other_latitude - latitude
+    return math.sqrt(dx * dx + dy * dy) * KM_PER_DEGREE
+
+def bbox_filter(bbox, start_year=None, end_year=None):
+    """
+    Condition restreignant Battle à un rectangle (et une plage d'années) via l'index R*Tree
+    """
+    west, south, east, north = bbox
+    if db.engine.dialect.name != 'sqlite':
+        return db.and_(
+            Battle.longitude.between(west, east),
+            Battle.latitude.between(south, north)
+        )
+    conditions = [
+        battle_rtree.c.max_lat >= south, battle_rtree.c.min_lat <= north,
+        battle_rtree.c.max_lon >= west, battle_rtree.c.min_lon <= east
+    ]
+    if start_year is not None:
+        conditions.append(battle_rtree.c.max_year >= start_year)
+    if end_year is not None:
+        conditions.append(battle_rtree.c.min_year <= end_year)
+    # Les bornes R*Tree sont arrondies en float32 : le test exact est refait sur la table
+    return db.and_(
+        Battle.id.in_(db.select(battle_rtree.c.id).where(*conditions)),
+        Battle.longitude.between(west, east),
+        Battle.latitude.between(south, north)
+    )
+
+def near_filter(latitude, longitude, radius_km, start_year=None, end_year=None):
+    """
+    Condition "à moins de radius_km du point", servie par l'index R*Tree
+    """
+    distance = distance_km_expr(latitude, longitude)
+    return db.and_(
+        bbox_filter(radius_bbox(latitude, longitude, radius_km), start_year, end_year),
+        distance <= radius_km
+    )
+
+def nearest_query(query, latitude, longitude, k, radius_km=None, start_year=None, end_year=None):
+    """
+    Restreint `query` aux k batailles les plus proches, triées par distance.
+
+    Sans rayon imposé, le rayon de recherche double jusqu'à trouver k
+    candidats : chaque étape ne lit que les lignes de l'index R*Tree.
+    """
+    radius = radius_km or KNN_START_RADIUS_KM
+    while True:
+        candidates = query.filter(near_filter(latitude, longitude, radius, start_year, end_year))
+        if radius_km or radius >= KNN_MAX_RADIUS_KM or candidates.limit(k).count() >= k:
+            break
+        radius *= 2
+    return candidates.order_by(distance_km_expr(latitude, longitude), Battle.id).limit(k)
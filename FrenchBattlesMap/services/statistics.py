@@ -0,0 +1,154 @@
+import logging
+from sqlalchemy import case, event
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import Battle, BattleStatistic, BATTLE_TYPES
+
+def _century(year):
+    return (year // 100) * 100
+
+def _upsert(connection, rows, combine):
+    """
+    Insère ou combine des lignes (kind, key, value) dans battle_statistic.
+
+    combine : 'add' (somme), 'min' ou 'max'
+    """
+    if not rows:
+        return
+    table = BattleStatistic.__table__
+    dialect_insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(table).values([{'kind': k, 'key': key, 'value': v} for k, key, v in rows])
+    excluded = stmt.excluded.value
+    if combine == 'add':
+        new_value = table.c.value + excluded
+    elif combine == 'min':
+        new_value = case((excluded < table.c.value, excluded), else_=table.c.value)
+    else:
+        new_value = case((excluded > table.c.value, excluded), else_=table.c.value)
+    connection.execute(stmt.on_conflict_do_update(index_elements=['kind', 'key'], set_={'value': new_value}))
+
+def refresh_statistics(connection):
+    """
+    Recalcule toutes les statistiques en une seule requête d'agrégation
+    """
+    century = db.func.floor(Battle.year / 100.0)
+    rows = connection.execute(
+        db.select(
+            Battle.battle_type,
+            db.func.cast(century, db.Integer).label('century'),
+            db.func.count(),
+            db.func.min(Battle.year),
+            db.func.max(Battle.year)
+        ).group_by(Battle.battle_type, 'century')
+    ).all()
+
+    totals = {'total': {'': 0}, 'type': {}, 'century': {}}
+    earliest = latest = None
+    for battle_type, century_index, count, min_year, max_year in rows:
+        totals['total'][''] += count
+        if battle_type:
+            totals['type'][battle_type] = totals['type'].get(battle_type, 0) + count
+        key = str(century_index * 100)
+        totals['century'][key] = totals['century'].get(key, 0) + count
+        earliest = min_year if earliest is None else min(earliest, min_year)
+        latest = max_year if latest is None else max(latest, max_year)
+
+    values = [(kind, key, value) for kind, entries in totals.items() for key, value in entries.items()]
+    if earliest is not None:
+        values += [('earliest', '', earliest), ('latest', '', latest)]
+
+    connection.execute(BattleStatistic.__table__.delete())
+    if values:
+        connection.execute(BattleStatistic.__table__.insert(), [
+            {'kind': kind, 'key': key, 'value': value} for kind, key, value in values
+        ])
+    logging.info("Statistiques recalculées : %s batailles", totals['total'][''])
+
+def record_battles_added(connection, battles, sign=1):
+    """
+    Met à jour les statistiques de façon incrémentale pour des (année, type) ajoutés
+    (sign=1) ou supprimés (sign=-1)
+    """
+    counts = {}
+    for year, battle_type in battles:
+        for kind, key in (('total', ''), ('century', str(_century(year))), ('type', battle_type)):
+            if key is not None:
+                counts[(kind, key)] = counts.get((kind, key), 0) + sign
+    _upsert(connection, [(kind, key, value) for (kind, key), value in counts.items()], 'add')
+    if sign > 0 and battles:
+        years = [year for year, _ in battles]
+        _upsert(connection, [('earliest', '', min(years))], 'min')
+        _upsert(connection, [('latest', '', max(years))], 'max')
+
+def _refresh_year_bounds(connection, removed_year):
+    """
+    Recalcule earliest / latest si l'année retirée en était une (deux lectures d'index)
+    """
+    table = BattleStatistic.__table__
+    bounds = connection.execute(
+        db.select(table.c.value).where(table.c.kind.in_(('earliest', 'latest')))
+    ).scalars().all()
+    if removed_year not in bounds:
+        return
+    earliest, latest = connection.execute(db.select(db.func.min(Battle.year), db.func.max(Battle.year))).one()
+    connection.execute(table.delete().where(table.c.kind.in_(('earliest', 'latest'))))
+    if earliest is not None:
+        connection.execute(table.insert(), [
+            {'kind': 'earliest', 'key': '', 'value': earliest},
+            {'kind': 'latest', 'key': '', 'value': latest}
+        ])
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+# Ancienne valeur chargée avant modification : after_update en a besoin pour retirer l'ancien couple
+for _attribute in (Battle.year, Battle.battle_type):
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True)
+
+@event.listens_for(Battle, 'after_insert')
+def _battle_inserted(mapper, connection, battle):
+    record_battles_added(connection, [(battle.year, battle.battle_type)])
+
+@event.listens_for(Battle, 'after_update')
+def _battle_updated(mapper, connection, battle):
+    # L'enrichissement ne touche ni à l'année ni au type : rien à faire dans ce cas
+    state = db.inspect(battle)
+    attrs = ('year', 'battle_type')
+    if not any(state.attrs[attr].history.has_changes() for attr in attrs):
+        return
+    previous_year, previous_type = (
+        state.attrs[attr].history.deleted[0] if state.attrs[attr].history.deleted else getattr(battle, attr)
+        for attr in attrs
+    )
+    record_battles_added(connection, [(previous_year, previous_type)], sign=-1)
+    record_battles_added(connection, [(battle.year, battle.battle_type)])
+    if previous_year != battle.year:
+        _refresh_year_bounds(connection, previous_year)
+
+@event.listens_for(Battle, 'after_delete')
+def _battle_deleted(mapper, connection, battle):
+    record_battles_added(connection, [(battle.year, battle.battle_type)], sign=-1)
+    _refresh_year_bounds(connection, battle.year)
+
+def get_statistics():
+    """
+    Lit les statistiques maintenues (une requête sur une petite table)
+    """
+    rows = db.session.query(BattleStatistic.kind, BattleStatistic.key, BattleStatistic.value).all()
+    by_kind = {}
+    for kind, key, value in rows:
+        by_kind.setdefault(kind, {})[key] = value
+
+    types = by_kind.get('type', {})
+    centuries = by_kind.get('century', {})
+    return {
+        "total_battles": by_kind.get('total', {}).get('', 0),
+        "time_span": {
+            "earliest": by_kind.get('earliest', {}).get(''),
+            "latest": by_kind.get('latest', {}).get('')
+        },
+        "types_distribution": {t: types[t] for t in BATTLE_TYPES if types.get(t, 0) > 0},
+        "century_distribution": {
+            key: centuries[key] for key in sorted(centuries, key=int) if centuries[key] > 0
+        }
+    }
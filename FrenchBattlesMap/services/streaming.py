@@ -0,0 +1,118 @@
+import json
+import math
+from json.encoder import encode_basestring
+from flask import Response, stream_with_context
+from models import Battle
+from services.value_dictionary import value_dictionary, join_context
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle : encodeur standard sinon
+    orjson = None
+
+# Champs de Battle.to_dict(), dans le même ordre
+BATTLE_FIELDS = ('id', 'name', 'year', 'latitude', 'longitude', 'description', 'participants',
+                 'outcome', 'historical_context', 'sources', 'image_url', 'media_urls')
+# Colonnes stockées correspondantes : références vers battle_value décodées en mémoire
+STORED_FIELDS = ('id', 'name', 'year', 'latitude', 'longitude', 'description', 'participants_id',
+                 'outcome_id', 'context_id', 'context_detail', 'sources', 'image_url_id', 'media_urls_id')
+_REFERENCE_INDEXES = (6, 7, 8, 11, 12)
+# Lignes lues par aller-retour avec la base, et encodées par morceau envoyé
+STREAM_BATCH_SIZE = 1000
+# Début de chaque membre des objets JSON produits : `{"id":`, `,"name":`, ...
+_KEY_PREFIXES = tuple(('{' if i == 0 else ',') + json.dumps(field) + ':' for i, field in enumerate(BATTLE_FIELDS))
+
+def battle_columns():
+    """
+    Colonnes nécessaires à to_dict() : les lignes restent des tuples, sans hydratation ORM
+    """
+    return tuple(getattr(Battle, field) for field in STORED_FIELDS)
+
+def _load_references(rows):
+    value_dictionary.load({row[i] for row in rows for i in _REFERENCE_INDEXES})
+
+def rows_to_dicts(rows):
+    """
+    Dictionnaires au format de to_dict() pour des lignes de battle_columns()
+    """
+    _load_references(rows)
+    decode = value_dictionary.decode
+    return [
+        dict(zip(BATTLE_FIELDS, (
+            row[0], row[1], row[2], row[3], row[4], row[5], decode(row[6]), decode(row[7]),
+            join_context(decode(row[8]), row[9]), row[10], decode(row[11]), decode(row[12])
+        )))
+        for row in rows
+    ]
+
+def _encode(value):
+    # Mêmes représentations que json.dumps, sans son coût d'appel pour chaque champ
+    if value is None:
+        return 'null'
+    if value.__class__ is str:
+        return encode_basestring(value)
+    if value.__class__ is int:
+        return int.__repr__(value)
+    if value.__class__ is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+def _encode_context(prefix_id, detail):
+    # Concaténation de deux chaînes JSON : guillemet fermant du préfixe et ouvrant du complément retirés
+    if prefix_id is None or not detail:
+        return value_dictionary.fragment(prefix_id) if prefix_id is not None else _encode(detail)
+    return value_dictionary.fragment(prefix_id)[:-1] + _encode(detail)[1:]
+
+def _encode_row(row):
+    fragment = value_dictionary.fragment
+    values = (
+        _encode(row[0]), _encode(row[1]), _encode(row[2]), _encode(row[3]), _encode(row[4]), _encode(row[5]),
+        fragment(row[6]), fragment(row[7]), _encode_context(row[8], row[9]), _encode(row[10]),
+        fragment(row[11]), fragment(row[12])
+    )
+    return (''.join(prefix + value for prefix, value in zip(_KEY_PREFIXES, values)) + '}').encode('utf-8')
+
+def encode_rows(rows):
+    """
+    Lignes de battle_columns() encodées en objets JSON ; les valeurs du
+    dictionnaire sont recopiées déjà encodées, sans repasser par l'encodeur
+    """
+    _load_references(rows)
+    if orjson is not None:
+        # orjson encode un dictionnaire plus vite que l'assemblage de fragments en Python
+        return [orjson.dumps(item) for item in rows_to_dicts(rows)]
+    return [_encode_row(row) for row in rows]
+
+def _batches(query):
+    # yield_per : curseur côté serveur (PostgreSQL) ou lecture incrémentale (SQLite)
+    batch = []
+    for row in query.execution_options(yield_per=STREAM_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield encode_rows(batch)
+            batch = []
+    if batch:
+        yield encode_rows(batch)
+
+def _json_array(query):
+    yield b'['
+    first = True
+    for batch in _batches(query):
+        chunk = b','.join(batch)
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']'
+
+def _ndjson(query):
+    for batch in _batches(query):
+        yield b'\n'.join(batch) + b'\n'
+
+def stream_battles(query, output_format='json'):
+    """
+    Réponse en flux pour une requête sur battle_columns() : un tableau JSON ou
+    une bataille par ligne (ndjson). La mémoire utilisée ne dépend pas du nombre
+    de résultats et le premier octet part avant la fin de la lecture.
+    """
+    generate = _ndjson if output_format == 'ndjson' else _json_array
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate(query)), mimetype=mimetype)
@@ -0,0 +1,227 @@
+import hashlib
+import sys
+import threading
+from itertools import chain, islice
+from json.encoder import encode_basestring
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from models import BattleValue
+from services.battle_enrichment import PERIOD_CONTEXTS
+
+# Nombre de valeurs gardées en mémoire ; au-delà, les plus anciennes sont évincées par lots
+DICTIONARY_CACHE_SIZE = 100000
+# Part du cache libérée à chaque éviction
+DICTIONARY_EVICTION_RATIO = 0.1
+# Le premier paragraphe du contexte historique (texte de période) est partagé entre batailles,
+# la suite (extraits Gallica / Persée) leur est propre
+CONTEXT_SEPARATOR = '\n\n'
+# Seuls les textes de période sont encodés : un premier paragraphe propre à une
+# bataille ne ferait qu'ajouter une entrée unique au dictionnaire
+SHARED_CONTEXTS = frozenset(context for _, context in PERIOD_CONTEXTS)
+# Valeurs créées par la transaction en cours d'une session, mémorisées après son commit
+_PENDING_KEY = 'pending_values'
+# Requêtes IN découpées pour rester sous la limite de paramètres de SQLite
+_IN_BATCH_SIZE = 500
+
+def value_hash(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+def json_fragment(value):
+    """
+    Chaîne (ou None) encodée en JSON, sous forme de texte
+    """
+    return 'null' if value is None else encode_basestring(value)
+
+def split_context(value):
+    """
+    Sépare un contexte historique en (texte de période partagé, complément propre
+    à la bataille) ; sans texte de période en tête, tout est dans le complément
+    """
+    if value is None:
+        return None, None
+    index = value.find(CONTEXT_SEPARATOR)
+    prefix = value if index == -1 else value[:index]
+    if prefix not in SHARED_CONTEXTS:
+        return None, value
+    return prefix, (None if index == -1 else value[index:])
+
+def join_context(prefix, detail):
+    if prefix is None:
+        return detail
+    return prefix + detail if detail else prefix
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, ({}, {}))
+
+class ValueDictionary:
+    """
+    Cache en mémoire de la table battle_value : chaînes internées (un seul objet
+    par valeur, partagé par toutes les lignes) et fragments JSON pré-encodés.
+
+    Un identifiant désigne toujours la même valeur (la table n'est jamais purgée) :
+    une entrée en mémoire ne devient jamais fausse et les workers n'ont rien à
+    invalider, seulement les identifiants inconnus à charger. Les valeurs créées
+    par une transaction ne sont mémorisées qu'après son commit : un rollback
+    pourrait sinon laisser réattribuer leur identifiant à une autre valeur.
+
+    Une fois plein, le cache évince ses entrées les plus anciennes par lots ;
+    une valeur évincée puis relue est rechargée et redevient récente.
+    """
+
+    def __init__(self, max_size=DICTIONARY_CACHE_SIZE):
+        self.max_size = max_size
+        self._values = {}
+        self._fragments = {}
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def remember(self, rows):
+        with self._lock:
+            overflow = len(self._values) + len(rows) - self.max_size
+            if overflow > 0:
+                self._evict(max(overflow, int(self.max_size * DICTIONARY_EVICTION_RATIO)))
+            for value_id, value in rows:
+                value = sys.intern(value)
+                self._values[value_id] = value
+                self._fragments[value_id] = json_fragment(value)
+                self._ids[value] = value_id
+
+    def _evict(self, count):
+        # Les dictionnaires gardent l'ordre d'insertion : les premières clés sont les plus anciennes.
+        # Les lectures sans verrou restent sûres, une entrée absente est simplement rechargée.
+        for value_id in list(islice(self._values, count)):
+            value = self._values.pop(value_id)
+            self._fragments.pop(value_id, None)
+            if self._ids.get(value) == value_id:
+                del self._ids[value]
+
+    def _pending_values(self):
+        if not has_app_context():
+            return {}
+        pending = db.session.info.get(_PENDING_KEY)
+        return pending[1] if pending else {}
+
+    def load(self, ids):
+        """
+        Charge en une requête les identifiants absents du cache
+        """
+        missing = {value_id for value_id in ids if value_id is not None and value_id not in self._values}
+        if not missing:
+            return
+        missing.difference_update(self._pending_values())
+        if not missing:
+            return
+        # Connexion de la session sur la base principale : la réplique peut être en retard
+        connection = db.session.connection(bind_arguments={'bind': db.engine})
+        missing = list(missing)
+        rows = []
+        for i in range(0, len(missing), _IN_BATCH_SIZE):
+            rows.extend(connection.execute(
+                db.select(BattleValue.id, BattleValue.value).where(BattleValue.id.in_(missing[i:i + _IN_BATCH_SIZE]))
+            ).all())
+        self.remember(rows)
+
+    def decode(self, value_id):
+        if value_id is None:
+            return None
+        value = self._values.get(value_id)
+        if value is None:
+            value = self._pending_values().get(value_id)
+            if value is None:
+                self.load([value_id])
+                value = self._values.get(value_id)
+        return value
+
+    def fragment(self, value_id):
+        """
+        Valeur déjà encodée en JSON ('null' pour None)
+        """
+        if value_id is None:
+            return 'null'
+        fragment = self._fragments.get(value_id)
+        if fragment is None:
+            return json_fragment(self.decode(value_id))
+        return fragment
+
+    def encode_in_session(self, session, values):
+        """
+        {valeur: identifiant} pour des valeurs quelconques (None ignoré) ; les
+        nouvelles sont insérées dans la transaction de la session
+        """
+        by_value, by_id = _pending(session)
+        result, unknown = {}, []
+        for value in values:
+            if value is None or value in result:
+                continue
+            value_id = self._ids.get(value) or by_value.get(value)
+            if value_id is None:
+                unknown.append(value)
+            else:
+                result[value] = value_id
+        if unknown:
+            connection = session.connection(bind_arguments={'bind': db.engine})
+            created = self.encode_many(connection, unknown)
+            by_value.update(created)
+            by_id.update((value_id, value) for value, value_id in created.items())
+            result.update(created)
+        return result
+
+    def encode_many(self, connection, values):
+        """
+        {valeur: identifiant} pour des valeurs quelconques (None ignoré) ; les
+        nouvelles sont insérées dans la transaction de `connection`
+        """
+        result = {}
+        unknown = {}
+        for value in values:
+            if value is None or value in result:
+                continue
+            value_id = self._ids.get(value)
+            if value_id is None:
+                unknown[value_hash(value)] = value
+            else:
+                result[value] = value_id
+        if unknown:
+            table = BattleValue.__table__
+            dialect_insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+            connection.execute(
+                dialect_insert(table).on_conflict_do_nothing(index_elements=['hash']),
+                [{'hash': digest, 'value': value} for digest, value in unknown.items()]
+            )
+            digests = list(unknown)
+            for i in range(0, len(digests), _IN_BATCH_SIZE):
+                for value_id, digest in connection.execute(
+                    db.select(table.c.id, table.c.hash).where(table.c.hash.in_(digests[i:i + _IN_BATCH_SIZE]))
+                ):
+                    result[unknown[digest]] = value_id
+        return result
+
+value_dictionary = ValueDictionary()
+
+@event.listens_for(Session, 'before_flush')
+def _encode_pending_values(session, flush_context, instances):
+    # Valeurs affectées aux attributs dictionnaire (voir models.DictionaryValue) :
+    # encodées en une fois pour tout le flush, dans la transaction de la session
+    objects = [obj for obj in chain(session.new, session.dirty) if getattr(obj, '_pending_values', None)]
+    if not objects:
+        return
+    ids = value_dictionary.encode_in_session(
+        session, [value for obj in objects for value in obj._pending_values.values()]
+    )
+    for obj in objects:
+        for column, value in obj._pending_values.items():
+            setattr(obj, column, ids.get(value))
+        obj._pending_values = None
+
+@event.listens_for(Session, 'after_commit')
+def _remember_committed_values(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and pending[1]:
+        value_dictionary.remember(list(pending[1].items()))
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_pending_values(session):
+    session.info.pop(_PENDING_KEY, None)
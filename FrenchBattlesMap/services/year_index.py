@@ -0,0 +1,113 @@
+import logging
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from app import db
+from models import Battle
+from services.data_version import get_data_version
+from services.markers import MARKER_FIELDS, marker_columns
+
+# Intervalle minimal (secondes) entre deux vérifications de la version des données
+VERSION_CHECK_INTERVAL = 1.0
+
+class YearIndex:
+    """
+    Index en mémoire des marqueurs, triés par année puis par identifiant.
+
+    Les colonnes sont stockées dans des tableaux compacts : une requête sur
+    une plage d'années se résume à deux bisections et une découpe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None  # (version, years, ids, names, latitudes, longitudes)
+        self._checked_at = 0.0
+
+    def build(self, version=None):
+        """
+        Reconstruit l'index à partir de la base de données
+        """
+        if version is None:
+            version = get_data_version()
+        started = time.perf_counter()
+        years, ids = array('i'), array('i')
+        latitudes, longitudes = array('d'), array('d')
+        names = []
+        rows = db.session.query(*marker_columns()).order_by(Battle.year, Battle.id)
+        for id_, name, year, latitude, longitude in rows.yield_per(5000):
+            ids.append(id_)
+            names.append(name)
+            years.append(year)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+        # Remplacement atomique : les lecteurs en cours gardent l'ancienne version
+        self._data = (version, years, ids, names, latitudes, longitudes)
+        self._checked_at = time.monotonic()
+        logging.info("Index des années construit : %s batailles en %.3fs (version %s)", len(ids), time.perf_counter() - started, version)
+
+    def invalidate(self):
+        self._data = None
+
+    def ensure_current(self):
+        """
+        Reconstruit l'index si les données ont changé depuis sa construction
+        """
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return self._data
+        with self._lock:
+            version = get_data_version()
+            self._checked_at = now
+            if self._data is None or self._data[0] != version:
+                self.build(version)
+        return self._data
+
+    def _bounds(self, data, start_year, end_year):
+        years = data[1]
+        return bisect_left(years, start_year), bisect_right(years, end_year)
+
+    def count(self, start_year, end_year):
+        lo, hi = self._bounds(self.ensure_current(), start_year, end_year)
+        return hi - lo
+
+    def rows(self, start_year, end_year):
+        """
+        Retourne les marqueurs (id, name, year, lat, lon) de la plage d'années
+        """
+        data = self.ensure_current()
+        lo, hi = self._bounds(data, start_year, end_year)
+        _, years, ids, names, latitudes, longitudes = data
+        return list(zip(ids[lo:hi], names[lo:hi], years[lo:hi], latitudes[lo:hi], longitudes[lo:hi]))
+
+    def columns(self, start_year, end_year):
+        data = self.ensure_current()
+        lo, hi = self._bounds(data, start_year, end_year)
+        _, years, ids, names, latitudes, longitudes = data
+        return {
+            'count': hi - lo,
+            'fields': list(MARKER_FIELDS),
+            'id': ids[lo:hi].tolist(),
+            'name': names[lo:hi],
+            'year': years[lo:hi].tolist(),
+            'latitude': latitudes[lo:hi].tolist(),
+            'longitude': longitudes[lo:hi].tolist()
+        }
+
+    def packed(self, start_year, end_year):
+        """
+        Même disposition binaire que services.markers.pack_markers, par découpe directe
+        """
+        data = self.ensure_current()
+        lo, hi = self._bounds(data, start_year, end_year)
+        _, years, ids, names, latitudes, longitudes = data
+        parts = [ids[lo:hi], years[lo:hi], array('f', latitudes[lo:hi]), array('f', longitudes[lo:hi])]
+        if sys.byteorder != 'little':
+            for values in parts:
+                values.byteswap()
+        return b''.join([struct.pack('<I', hi - lo)] + [values.tobytes() for values in parts] +
+                        ['\n'.join(names[lo:hi]).encode('utf-8')])
+
+year_index = YearIndex()
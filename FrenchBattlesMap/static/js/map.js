@@ -1,8 +1,37 @@
 let map;
 let markers;
-let battles = [];
+let clusters = { clusters: [], battles: [] };
+let timeline = {};
+let yearDensity = null;
 let currentBattleType = 'all';
+let currentRange = [0, 2025];
 let timelineChart = null;
+let clusterRequest = 0;
+
+// Static snapshot written by `flask export-snapshot`; server clusters are used when absent
+const SNAPSHOT_MANIFEST_URL = '/snapshot/manifest.json';
+let snapshot = null;
+const shardCache = new Map();
+// Changes logged since the snapshot export, replayed on top of its markers (id -> marker,
+// null once deleted); past this size the server clusters are cheaper than the replay
+let snapshotOverlay = new Map();
+const SNAPSHOT_MAX_OVERLAY = 5000;
+
+// Same grid as services/clustering.py, so both paths group battles identically
+const CLUSTER_CELL_PIXELS = 80;
+const MAX_CLUSTER_ZOOM = 14;
+const TIMELINE_PERIOD_SIZE = 25;
+const SLIDER_RANGE = [0, 2025];
+
+// Change feed cursor (/api/v1/changes); null until the initial version is known
+let changesVersion = null;
+let changeSync = Promise.resolve();
+const JOB_POLL_INTERVAL = 1000;
+const popupMarkers = new Map();
+
+// Popup images go through the local thumbnail proxy (/api/v1/media/thumbnail), same size classes
+const MEDIA_THUMBNAIL_URL = '/api/v1/media/thumbnail';
+const POPUP_IMAGE_WIDTH = 320;
 
 // Initialize the map
 function initMap() {
@@ -12,142 +41,421 @@ function initMap() {
         attribution: '© OpenStreetMap contributors'
     }).addTo(map);
 
-    markers = L.markerClusterGroup();
+    // Le regroupement est calculé côté serveur (/api/battles/clusters)
+    markers = L.layerGroup();
     map.addLayer(markers);
+    map.on('moveend', () => fetchClusters());
 }
 
-// Fetch and display battles
-async function fetchBattles(startYear, endYear) {
+// Build the query string shared by cluster requests
+function clusterParams() {
+    const bounds = map.getBounds();
+    const params = new URLSearchParams({
+        start_year: currentRange[0],
+        end_year: currentRange[1],
+        zoom: map.getZoom(),
+        bbox: [
+            bounds.getWest().toFixed(3),
+            bounds.getSouth().toFixed(3),
+            bounds.getEast().toFixed(3),
+            bounds.getNorth().toFixed(3)
+        ].join(',')
+    });
+    if (currentBattleType !== 'all') {
+        params.set('type', currentBattleType);
+    }
+    return params;
+}
+
+// Query string for /api/v1/histogram
+function histogramParams(startYear, endYear, bin) {
+    const params = new URLSearchParams({ start_year: startYear, end_year: endYear, bin: bin });
+    if (currentBattleType !== 'all') {
+        params.set('type', currentBattleType);
+    }
+    return params;
+}
+
+async function fetchHistogram(startYear, endYear, bin) {
+    const response = await fetch(`/api/v1/histogram?${histogramParams(startYear, endYear, bin)}`);
+    if (!response.ok) {
+        throw new Error('Failed to fetch histogram');
+    }
+    return response.json();
+}
+
+// Counts per 25-year period for the chart, from the maintained histogram
+async function fetchTimeline() {
     try {
-        document.getElementById('loading').style.display = 'block';
-        console.log(`Fetching battles between ${startYear} and ${endYear}`);
+        const histogram = await fetchHistogram(currentRange[0], currentRange[1], TIMELINE_PERIOD_SIZE);
+        timeline = {};
+        histogram.counts.forEach((count, i) => {
+            timeline[histogram.start_year + i * histogram.bin] = count;
+        });
+        updateTimelineChart();
+    } catch (error) {
+        console.error('Error fetching timeline:', error);
+    }
+}
 
-        const response = await fetch(`/api/battles?start_year=${startYear}&end_year=${endYear}`);
-        if (!response.ok) {
-            throw new Error('Failed to fetch battles');
+// Per-year counts over the whole slider, as cumulative sums to predict result sizes
+async function fetchYearDensity() {
+    try {
+        const histogram = await fetchHistogram(SLIDER_RANGE[0], SLIDER_RANGE[1], 1);
+        const cumulative = [0];
+        histogram.counts.forEach(count => cumulative.push(cumulative[cumulative.length - 1] + count));
+        yearDensity = { start: histogram.start_year, cumulative: cumulative };
+    } catch (error) {
+        yearDensity = null;
+        console.error('Error fetching year density:', error);
+    }
+}
+
+// Number of battles between two years, without querying the server
+function predictedCount(startYear, endYear) {
+    if (!yearDensity) return null;
+    const last = yearDensity.cumulative.length - 1;
+    const from = Math.min(Math.max(startYear - yearDensity.start, 0), last);
+    const to = Math.min(Math.max(endYear - yearDensity.start + 1, 0), last);
+    return yearDensity.cumulative[to] - yearDensity.cumulative[from];
+}
+
+function rangeLabel(startYear, endYear) {
+    const count = predictedCount(Number(startYear), Number(endYear));
+    return count === null ? `${startYear} - ${endYear}` : `${startYear} - ${endYear} (${count} batailles)`;
+}
+
+// Load the snapshot manifest, or null if no snapshot has been exported
+async function loadSnapshotManifest() {
+    try {
+        const response = await fetch(SNAPSHOT_MANIFEST_URL, { cache: 'no-cache' });
+        if (!response.ok) return null;
+        const manifest = await response.json();
+        return Array.isArray(manifest.shards) ? manifest : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function overlayMarker(change) {
+    if (change.op === 'delete') return null;
+    const battle = change.battle;
+    return {
+        id: battle.id,
+        name: battle.name,
+        year: battle.year,
+        latitude: battle.latitude,
+        longitude: battle.longitude,
+        battle_type: battle.name.split(' ')[0]
+    };
+}
+
+// Record a change on top of the current snapshot; returns false once the overlay is too large
+function recordSnapshotChange(change) {
+    snapshotOverlay.set(change.id, overlayMarker(change));
+    return snapshotOverlay.size <= SNAPSHOT_MAX_OVERLAY;
+}
+
+// The snapshot stays usable after edits such as enrichment: the changes logged since its export
+// are replayed on top of it. A reset (reload) in between may have reassigned ids, so it is dropped.
+async function snapshotWithChanges(manifest, version) {
+    snapshotOverlay = new Map();
+    if (!manifest || version === null || manifest.version > version) return null;
+    let since = manifest.version;
+    let hasMore = since < version;
+    try {
+        while (hasMore) {
+            const response = await fetch(`/api/v1/changes?since=${since}`);
+            if (!response.ok) return null;
+            const data = await response.json();
+            if (data.reset) {
+                console.info(`Data reloaded since snapshot version ${manifest.version}, using server clusters`);
+                return null;
+            }
+            if (!data.changes.every(recordSnapshotChange)) {
+                console.info('Too many changes since the snapshot export, using server clusters');
+                return null;
+            }
+            since = data.version;
+            hasMore = data.has_more;
         }
+    } catch (error) {
+        return null;
+    }
+    return manifest;
+}
 
-        const data = await response.json();
-        if (!Array.isArray(data)) {
+// Fetch a shard once; shard files are content-hashed and never change
+function fetchShard(shard) {
+    if (!shardCache.has(shard.url)) {
+        const url = new URL(shard.url, new URL(SNAPSHOT_MANIFEST_URL, window.location.href)).href;
+        const request = fetch(url).then(response => {
+            if (!response.ok) {
+                throw new Error(`Failed to fetch shard ${shard.url}`);
+            }
+            return response.json();
+        });
+        request.catch(() => shardCache.delete(shard.url));
+        shardCache.set(shard.url, request);
+    }
+    return shardCache.get(shard.url);
+}
+
+function viewportBbox() {
+    const bounds = map.getBounds();
+    return [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()];
+}
+
+// Markers of the shards intersecting the year range (and the bbox, for tiled snapshots)
+async function snapshotMarkers(bbox) {
+    const [start, end] = currentRange;
+    const shards = snapshot.shards.filter(shard =>
+        shard.end_year >= start && shard.start_year <= end &&
+        (!bbox || !shard.bbox || (shard.bbox[0] <= bbox[2] && shard.bbox[2] >= bbox[0] &&
+                                  shard.bbox[1] <= bbox[3] && shard.bbox[3] >= bbox[1]))
+    );
+    const matches = (year, type) =>
+        year >= start && year <= end && (currentBattleType === 'all' || type === currentBattleType);
+    const battles = [];
+    for (const columns of await Promise.all(shards.map(fetchShard))) {
+        for (let i = 0; i < columns.count; i++) {
+            const year = columns.year[i];
+            if (!matches(year, columns.battle_type[i]) || snapshotOverlay.has(columns.id[i])) continue;
+            battles.push({
+                id: columns.id[i],
+                name: columns.name[i],
+                year: year,
+                latitude: columns.latitude[i],
+                longitude: columns.longitude[i]
+            });
+        }
+    }
+    // Battles edited, added or deleted since the export (outside the bbox: filtered by clusterLocally)
+    snapshotOverlay.forEach(battle => {
+        if (battle && matches(battle.year, battle.battle_type)) battles.push(battle);
+    });
+    return battles;
+}
+
+// Client-side equivalent of get_clusters() for the current viewport
+function clusterLocally(battles, zoom, bbox) {
+    const [west, south, east, north] = bbox;
+    const visible = battles.filter(b =>
+        b.longitude >= west && b.longitude <= east && b.latitude >= south && b.latitude <= north);
+    if (zoom >= MAX_CLUSTER_ZOOM) {
+        return { zoom: zoom, total: visible.length, clusters: [], battles: visible };
+    }
+
+    const size = CLUSTER_CELL_PIXELS * 360.0 / (256 * 2 ** zoom);
+    const cells = new Map();
+    visible.forEach(battle => {
+        const key = `${Math.floor((battle.longitude + 180.0) / size)}:${Math.floor((battle.latitude + 90.0) / size)}`;
+        const cell = cells.get(key);
+        if (cell) {
+            cell.count += 1;
+            cell.latitude += battle.latitude;
+            cell.longitude += battle.longitude;
+        } else {
+            cells.set(key, { count: 1, latitude: battle.latitude, longitude: battle.longitude, battle: battle });
+        }
+    });
+
+    const result = { zoom: zoom, total: visible.length, clusters: [], battles: [] };
+    cells.forEach(cell => {
+        if (cell.count === 1) {
+            result.battles.push(cell.battle);
+        } else {
+            result.clusters.push({
+                latitude: cell.latitude / cell.count,
+                longitude: cell.longitude / cell.count,
+                count: cell.count
+            });
+        }
+    });
+    return result;
+}
+
+async function clustersFromSnapshot() {
+    const bbox = viewportBbox();
+    const tiled = snapshot.shards.some(shard => shard.bbox);
+    const battles = await snapshotMarkers(tiled ? bbox : null);
+    return clusterLocally(battles, map.getZoom(), bbox);
+}
+
+async function fetchServerClusters() {
+    const response = await fetch(`/api/battles/clusters?${clusterParams()}`);
+    if (!response.ok) {
+        throw new Error('Failed to fetch battles');
+    }
+    return response.json();
+}
+
+// Fetch clusters for the current viewport
+async function fetchClusters() {
+    const requestId = ++clusterRequest;
+    try {
+        document.getElementById('loading').style.display = 'block';
+
+        let data;
+        if (snapshot) {
+            data = await clustersFromSnapshot().catch(error => {
+                console.warn('Snapshot unavailable, falling back to server clusters:', error);
+                snapshot = null;
+                return fetchServerClusters();
+            });
+        } else {
+            data = await fetchServerClusters();
+        }
+        if (!data || !Array.isArray(data.clusters) || !Array.isArray(data.battles)) {
             throw new Error('Invalid battle data received');
         }
+        // Ignore responses superseded by a more recent pan/zoom
+        if (requestId !== clusterRequest) return;
 
-        battles = data.filter(battle => 
-            battle && 
-            battle.year >= startYear && 
-            battle.year <= endYear
-        );
+        clusters = data;
 
-        console.log(`Received ${battles.length} battles within range`);
+        console.log(`Received ${data.clusters.length} clusters and ${data.battles.length} battles (${data.total} in view)`);
         updateMarkers();
-        updateTimelineChart();
     } catch (error) {
         console.error('Error fetching battles:', error);
         alert('Error loading battle data. Please try again.');
     } finally {
-        document.getElementById('loading').style.display = 'none';
+        if (requestId === clusterRequest) {
+            document.getElementById('loading').style.display = 'none';
+        }
     }
 }
 
+// Fetch and display battles
+async function fetchBattles(startYear, endYear) {
+    currentRange = [Number(startYear), Number(endYear)];
+    console.log(`Fetching battles between ${currentRange[0]} and ${currentRange[1]}`);
+    await Promise.all([fetchClusters(), fetchTimeline()]);
+}
+
+// Icon for a server-side cluster, reusing Leaflet.markercluster styles
+function clusterIcon(count) {
+    const size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+    return L.divIcon({
+        html: `<div><span>${count}</span></div>`,
+        className: `marker-cluster marker-cluster-${size}`,
+        iconSize: L.point(40, 40)
+    });
+}
+
 // Update markers on the map
 function updateMarkers() {
     markers.clearLayers();
+    popupMarkers.clear();
 
-    const filteredBattles = filterBattles();
+    clusters.clusters.forEach(cluster => {
+        const marker = L.marker([cluster.latitude, cluster.longitude], {
+            icon: clusterIcon(cluster.count)
+        });
+        marker.on('click', () => {
+            map.setView([cluster.latitude, cluster.longitude], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+        });
+        markers.addLayer(marker);
+    });
 
-    filteredBattles.forEach(battle => {
+    clusters.battles.forEach(battle => {
         if (!battle || !battle.latitude || !battle.longitude) {
             console.warn('Invalid battle data:', battle);
             return;
         }
 
         const marker = L.marker([battle.latitude, battle.longitude]);
-
-        let sourcesHtml = '';
-        if (battle.sources) {
-            try {
-                const sources = JSON.parse(battle.sources);
-                sourcesHtml = `
-                    <div class="mt-2">
-                        <strong>Sources:</strong><br>
-                        <div class="d-flex flex-column gap-1">
-                            ${Object.entries(sources).map(([name, url]) => 
-                                `<a href="${url}" target="_blank" class="btn btn-sm btn-outline-primary">
-                                    <i class="fas fa-external-link-alt"></i> ${name.charAt(0).toUpperCase() + name.slice(1)}
-                                </a>`
-                            ).join('')}
-                        </div>
-                    </div>`;
-            } catch (e) {
-                console.error('Error parsing sources:', e);
-            }
-        }
-
-        const mediaHtml = battle.media_urls ? 
-            `<div class="media-gallery mt-2">
-                <div class="media-content">
-                    ${getMediaContent(battle)}
-                </div>
-             </div>` : '';
-
-        const contextHtml = battle.historical_context ? 
-            `<div class="mt-2">
-                <strong>Contexte historique:</strong>
-                <p>${battle.historical_context}</p>
-            </div>` : '';
-
-        const enrichButton = !battle.sources ? 
-            `<button onclick="enrichBattle(${battle.id})" class="btn btn-sm btn-outline-secondary mt-2">
-                <i class="fas fa-info-circle"></i> Plus d'informations
-            </button>` : '';
-
-        const popupContent = `
-            <div class="popup-content">
-                ${battle.image_url ? 
-                    `<div class="main-image mb-3">
-                        <img src="${battle.image_url}" alt="${battle.name}" class="img-fluid rounded">
-                    </div>` : ''}
-                <h5>${battle.name} (${battle.year})</h5>
-                <p>${battle.description || 'Description non disponible'}</p>
-                <p><strong>Participants:</strong> ${battle.participants || 'Inconnu'}</p>
-                <p><strong>Résultat:</strong> ${battle.outcome || 'Inconnu'}</p>
-                ${mediaHtml}
-                ${contextHtml}
-                ${sourcesHtml}
-                ${enrichButton}
-            </div>
-        `;
-
-        marker.bindPopup(popupContent, {
+        marker.bindPopup(`<div class="popup-content"><h5>${battle.name} (${battle.year})</h5><p>Chargement...</p></div>`, {
             maxWidth: 400,
             maxHeight: 400,
             autoPan: true,
             className: 'battle-popup'
         });
+        // Les détails complets ne sont chargés qu'à l'ouverture du popup
+        marker.on('popupopen', () => loadBattlePopup(marker, battle.id));
+        popupMarkers.set(battle.id, marker);
         markers.addLayer(marker);
     });
 }
 
-// Filter battles based on current type
-function filterBattles() {
-    return battles.filter(battle => {
-        if (currentBattleType === 'all') return true;
-        return battle.name.startsWith(currentBattleType);
-    });
+// Load the full battle record and fill the popup
+async function loadBattlePopup(marker, battleId) {
+    try {
+        const response = await fetch(`/api/v1/battles/${battleId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const battle = await response.json();
+        marker.setPopupContent(buildPopupContent(battle));
+    } catch (error) {
+        console.error('Error loading battle details:', error);
+        marker.setPopupContent('<div class="popup-content"><p>Détails indisponibles.</p></div>');
+    }
 }
 
-// Create and update timeline chart
-function updateTimelineChart() {
-    const filteredBattles = filterBattles();
+// Build the popup HTML for a full battle record
+function buildPopupContent(battle) {
+    let sourcesHtml = '';
+    if (battle.sources) {
+        try {
+            const sources = JSON.parse(battle.sources);
+            sourcesHtml = `
+                <div class="mt-2">
+                    <strong>Sources:</strong><br>
+                    <div class="d-flex flex-column gap-1">
+                        ${Object.entries(sources).map(([name, url]) => 
+                            `<a href="${url}" target="_blank" class="btn btn-sm btn-outline-primary">
+                                <i class="fas fa-external-link-alt"></i> ${name.charAt(0).toUpperCase() + name.slice(1)}
+                            </a>`
+                        ).join('')}
+                    </div>
+                </div>`;
+        } catch (e) {
+            console.error('Error parsing sources:', e);
+        }
+    }
 
-    // Group battles by periods of 25 years for better granularity
-    const periodSize = 25;
-    const battleCounts = {};
+    const mediaHtml = battle.media_urls ? 
+        `<div class="media-gallery mt-2">
+            <div class="media-content">
+                ${getMediaContent(battle)}
+            </div>
+         </div>` : '';
+
+    const contextHtml = battle.historical_context ? 
+        `<div class="mt-2">
+            <strong>Contexte historique:</strong>
+            <p>${battle.historical_context}</p>
+        </div>` : '';
+
+    const enrichButton = !battle.sources ? 
+        `<button onclick="enrichBattle(${battle.id})" class="btn btn-sm btn-outline-secondary mt-2">
+            <i class="fas fa-info-circle"></i> Plus d'informations
+        </button>` : '';
+
+    return `
+        <div class="popup-content">
+            ${battle.image_url ? 
+                `<div class="main-image mb-3">
+                    ${thumbnailImage(battle.image_url, battle.name)}
+                </div>` : ''}
+            <h5>${battle.name} (${battle.year})</h5>
+            <p>${battle.description || 'Description non disponible'}</p>
+            <p><strong>Participants:</strong> ${battle.participants || 'Inconnu'}</p>
+            <p><strong>Résultat:</strong> ${battle.outcome || 'Inconnu'}</p>
+            ${mediaHtml}
+            ${contextHtml}
+            ${sourcesHtml}
+            ${enrichButton}
+        </div>
+    `;
+}
 
-    filteredBattles.forEach(battle => {
-        const period = Math.floor(battle.year / periodSize) * periodSize;
-        battleCounts[period] = (battleCounts[period] || 0) + 1;
-    });
+// Create and update timeline chart
+function updateTimelineChart() {
+    // Counts per 25-year period, from /api/v1/histogram
+    const periodSize = TIMELINE_PERIOD_SIZE;
+    const battleCounts = timeline;
 
     const labels = Object.keys(battleCounts).sort((a, b) => Number(a) - Number(b))
         .map(year => `${year} - ${Number(year) + periodSize}`);
@@ -229,11 +537,11 @@ function initSlider() {
     const yearDisplay = document.getElementById('yearDisplay');
 
     noUiSlider.create(yearSlider, {
-        start: [0, 2025],
+        start: SLIDER_RANGE,
         connect: true,
         range: {
-            'min': 0,
-            'max': 2025
+            'min': SLIDER_RANGE[0],
+            'max': SLIDER_RANGE[1]
         },
         step: 1,
         behaviour: 'drag',
@@ -252,18 +560,15 @@ function initSlider() {
         }
     });
 
-    // Update display immediately during drag
+    // Update display immediately during drag, with the expected number of results
     yearSlider.noUiSlider.on('drag', function(values) {
-        yearDisplay.textContent = `${values[0]} - ${values[1]}`;
+        yearDisplay.textContent = rangeLabel(values[0], values[1]);
     });
 
     // Fetch battles only when sliding ends
     yearSlider.noUiSlider.on('change', function(values) {
         fetchBattles(values[0], values[1]);
     });
-
-    // Initial fetch
-    fetchBattles(0, 2025);
 }
 
 // Initialize battle type filters
@@ -276,26 +581,132 @@ function initBattleTypeFilters() {
             button.classList.add('active');
 
             currentBattleType = button.getAttribute('data-type');
-            updateMarkers();
-            updateTimelineChart();
+            fetchClusters();
+            fetchTimeline();
+            fetchYearDensity().then(() => {
+                document.getElementById('yearDisplay').textContent = rangeLabel(currentRange[0], currentRange[1]);
+            });
         });
     });
 }
 
+// Current change feed version, read before the initial load so no change is missed
+async function fetchChangesVersion() {
+    try {
+        const response = await fetch('/api/v1/changes');
+        if (!response.ok) return null;
+        return (await response.json()).version;
+    } catch (error) {
+        return null;
+    }
+}
+
+function isInView(battle) {
+    const type = battle.name.split(' ')[0];
+    return battle.year >= currentRange[0] && battle.year <= currentRange[1] &&
+        (currentBattleType === 'all' || type === currentBattleType) &&
+        map.getBounds().contains([battle.latitude, battle.longitude]);
+}
+
+// Apply one change to the displayed data; returns true when markers must be reloaded
+function applyChange(change) {
+    if (change.op === 'delete') {
+        return true;
+    }
+    const battle = change.battle;
+    const marker = popupMarkers.get(battle.id);
+    if (marker && marker.isPopupOpen()) {
+        marker.setPopupContent(buildPopupContent(battle));
+    }
+    const shown = clusters.battles.find(b => b.id === battle.id);
+    if (shown) {
+        return shown.name !== battle.name || shown.year !== battle.year ||
+            shown.latitude !== battle.latitude || shown.longitude !== battle.longitude;
+    }
+    // New, moved or clustered battle: only the visible area is affected
+    return isInView(battle);
+}
+
+async function applyPendingChanges() {
+    let reload = false;
+    let hasMore = true;
+    while (changesVersion !== null && hasMore) {
+        const response = await fetch(`/api/v1/changes?since=${changesVersion}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        changesVersion = data.version;
+        if (data.reset) {
+            reload = true;
+            // Reloads re-export an existing snapshot: use it from its own version
+            shardCache.clear();
+            snapshot = await snapshotWithChanges(await loadSnapshotManifest(), changesVersion);
+            break;
+        }
+        data.changes.forEach(change => {
+            if (snapshot && !recordSnapshotChange(change)) {
+                snapshot = null;
+            }
+            reload = applyChange(change) || reload;
+        });
+        hasMore = data.has_more;
+    }
+    if (reload) {
+        await fetchBattles(currentRange[0], currentRange[1]);
+    }
+}
+
+// Apply changes since the last sync, one sync at a time
+function syncChanges() {
+    changeSync = changeSync.then(applyPendingChanges).catch(error => {
+        console.error('Error applying changes:', error);
+    });
+    return changeSync;
+}
+
+// Optional push notifications; the stream answers 404 when disabled on the server
+function watchChanges() {
+    if (changesVersion === null || !window.EventSource) return;
+    const source = new EventSource(`/api/v1/changes/stream?since=${changesVersion}`);
+    source.addEventListener('changes', () => syncChanges());
+}
+
 // Initialize the application
-document.addEventListener('DOMContentLoaded', () => {
+document.addEventListener('DOMContentLoaded', async () => {
     initMap();
     initSlider();
     initBattleTypeFilters();
     initDensityToggle();
-    fetchBattles(0, 2025);
+    const [manifest, version] = await Promise.all([loadSnapshotManifest(), fetchChangesVersion()]);
+    changesVersion = version;
+    snapshot = await snapshotWithChanges(manifest, version);
+    fetchBattles(SLIDER_RANGE[0], SLIDER_RANGE[1]);
+    watchChanges();
+    fetchYearDensity().then(() => {
+        document.getElementById('yearDisplay').textContent = rangeLabel(SLIDER_RANGE[0], SLIDER_RANGE[1]);
+    });
 });
 
+// Poll an enrichment job until it finishes
+async function waitForJob(url) {
+    for (;;) {
+        const response = await fetch(url, { cache: 'no-cache' });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'completed' || job.status === 'failed') return job;
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
 // Fonction pour enrichir les informations d'une bataille
 async function enrichBattle(battleId) {
     try {
         document.getElementById('loading').style.display = 'block';
 
+        // Enrichissement en tâche de fond : la requête rend la main immédiatement
         const response = await fetch(`/api/battles/${battleId}/enrich`, {
             method: 'POST',
             headers: {
@@ -307,14 +718,18 @@ async function enrichBattle(battleId) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const data = await response.json();
-        console.log('Battle enriched:', data);
+        const submitted = await response.json();
+        const job = await waitForJob(`/api/v1/enrichment/jobs/${submitted.id}`);
+        console.log('Enrichment job finished:', job);
+        if (job.status !== 'completed' || job.failed > 0) {
+            throw new Error(job.error || 'Enrichment failed');
+        }
 
-        // Recharger les batailles pour mettre à jour les informations
-        const slider = document.getElementById('yearSlider');
-        if (slider && slider.noUiSlider) {
-            const values = slider.noUiSlider.get();
-            await fetchBattles(values[0], values[1]);
+        // Appliquer uniquement les modifications depuis la dernière synchronisation
+        if (changesVersion !== null) {
+            await syncChanges();
+        } else {
+            await fetchBattles(currentRange[0], currentRange[1]);
         }
 
         // Afficher un message de succès
@@ -327,6 +742,24 @@ async function enrichBattle(battleId) {
     }
 }
 
+function thumbnailUrl(url, width) {
+    return `${MEDIA_THUMBNAIL_URL}?url=${encodeURIComponent(url)}&w=${width}`;
+}
+
+// Thumbnail (2x on high-density screens), linked to the original; falls back to the
+// original if the proxy cannot serve it, then hides the image
+function thumbnailImage(url, alt) {
+    if (!/^https?:\/\//.test(url)) {
+        return `<img src="${url}" alt="${alt}" class="img-fluid rounded" onerror="this.style.display='none'">`;
+    }
+    return `<a href="${url}" target="_blank" rel="noopener">
+        <img src="${thumbnailUrl(url, POPUP_IMAGE_WIDTH)}"
+             srcset="${thumbnailUrl(url, POPUP_IMAGE_WIDTH)} 1x, ${thumbnailUrl(url, POPUP_IMAGE_WIDTH * 2)} 2x"
+             data-original="${url}" alt="${alt}" class="img-fluid rounded" loading="lazy"
+             onerror="if (this.dataset.original) { this.removeAttribute('srcset'); this.src = this.dataset.original; delete this.dataset.original; } else { this.style.display = 'none'; }">
+    </a>`;
+}
+
 // Add this new function to handle different types of media
 function getMediaContent(battle) {
     if (!battle.media_urls) return '';
@@ -340,7 +773,7 @@ function getMediaContent(battle) {
             switch (type) {
                 case 'image':
                     return `<div class="media-item">
-                        <img src="${url}" alt="Image historique" class="img-fluid rounded" onerror="this.style.display='none'">
+                        ${thumbnailImage(url, 'Image historique')}
                     </div>`;
                 case 'video':
                     return `<div class="media-item">
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# Avant l'import de l'application : base et cache de l'instance globale hors de instance/
+_session_dir = tempfile.mkdtemp(prefix="battles-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_session_dir, 'app.db')}")
+os.environ.setdefault("CACHE_DIR", os.path.join(_session_dir, "cache"))
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ.pop("AUTO_INIT_DB", None)
+
+from flask import Flask  # noqa: E402
+from app import cache, cache_config, db  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+from services import database  # noqa: E402
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    Construit une application sur un fichier SQLite temporaire, migrations appliquées.
+
+    `wal` règle SQLITE_WAL ; `replica=True` ajoute une réplique (autre fichier, même schéma).
+    """
+    apps = []
+
+    def factory(wal=True, replica=False):
+        monkeypatch.setattr(database, "SQLITE_WAL", wal)
+        name = f"{len(apps)}-{'wal' if wal else 'delete'}"
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / (name + '.db')}")
+        if replica:
+            monkeypatch.setenv("DATABASE_REPLICA_URL", f"sqlite:///{tmp_path / (name + '-replica.db')}")
+        else:
+            monkeypatch.delenv("DATABASE_REPLICA_URL", raising=False)
+        test_app = Flask(__name__)
+        database.configure_database(test_app)
+        db.init_app(test_app)
+        # Les écritures ORM invalident des tags de cache : cache propre à l'application
+        cache.init_app(test_app, config={**cache_config, 'CACHE_TYPE': 'services.cache_backend.SQLiteLRUCache',
+                                         'CACHE_DIR': str(tmp_path / (name + '-cache'))})
+        with test_app.app_context():
+            apply_migrations()
+            if replica:
+                db.metadata.create_all(db.engines[database.REPLICA_BIND])
+        apps.append(test_app)
+        return test_app
+
+    yield factory
+    for test_app in apps:
+        with test_app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+class StubServer:
+    """
+    Serveur HTTP local : `routes` associe un chemin à une fonction (en-têtes de la
+    requête) -> (statut, en-têtes, corps) ; chaque requête reçue est enregistrée.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers), time.monotonic()))
+                route = stub.routes.get(self.path.split('?', 1)[0])
+                status, headers, body = route(self.headers) if route else (404, {}, b'')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def paths(self):
+        return [path for path, _, _ in self.requests]
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
@@ -0,0 +1,22 @@
+import os
+from services.cache_backend import SQLiteLRUCache
+
+def test_no_connection_is_opened_at_creation(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.sqlite3"))
+    assert getattr(cache._local, "conn", None) is None
+    cache.set("clé", "valeur")
+    assert cache.get("clé") == "valeur"
+
+def test_forked_process_opens_its_own_connection(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("parent", 1)
+    parent_conn = cache._connection()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # Processus enfant
+        ok = cache._connection() is not parent_conn and cache.get("parent") == 1 and cache.set("enfant", 2)
+        os.write(write, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
+    assert cache._connection() is parent_conn and cache.get("enfant") == 2
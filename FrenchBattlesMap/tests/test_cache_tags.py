@@ -0,0 +1,16 @@
+from services.cache_tags import MAX_YEAR, MIN_YEAR, year_bucket_tags
+
+def test_year_inside_span_maps_to_its_bucket():
+    assert year_bucket_tags(1515, 1515) == ["years:1500"]
+    assert year_bucket_tags(1490, 1610) == ["years:1400", "years:1500", "years:1600"]
+
+def test_years_outside_span_get_sentinel_tags():
+    assert year_bucket_tags(2500, 2500) == [f"years:>{MAX_YEAR}"]
+    assert year_bucket_tags(-2000, -2000) == [f"years:<{MIN_YEAR}"]
+    assert year_bucket_tags(-2000, -900) == [f"years:<{MIN_YEAR}", "years:-1000", "years:-900"]
+
+def test_open_ended_ranges_cover_out_of_span_years():
+    tags = year_bucket_tags(None, None)
+    assert tags[0] == f"years:<{MIN_YEAR}" and tags[-1] == f"years:>{MAX_YEAR}"
+    assert set(year_bucket_tags(2500, 2500)) <= set(year_bucket_tags(1900, None))
+    assert set(year_bucket_tags(-2000, -2000)) <= set(year_bucket_tags(None, 0))
@@ -0,0 +1,45 @@
+from app import db
+from models import Battle, DataVersion
+from services.data_version import BATTLES_VERSION, CONTENT_VERSION, bump_data_version, get_data_version
+
+def _battle():
+    return Battle(name="Bataille de Fleurus", year=1794, latitude=50.48, longitude=4.55, description="Test")
+
+def test_version_is_not_read_from_identity_map(make_app):
+    with make_app().app_context():
+        bump_data_version()
+        db.session.commit()
+        loaded = db.session.get(DataVersion, BATTLES_VERSION)  # Reste dans l'identity map
+        with db.engine.begin() as conn:
+            conn.execute(DataVersion.__table__.update().values(version=DataVersion.version + 5))
+        assert get_data_version() == loaded.version + 5
+
+def test_bump_from_stale_session_is_not_lost(make_app):
+    with make_app().app_context():
+        first = bump_data_version()
+        db.session.commit()
+        db.session.get(DataVersion, BATTLES_VERSION)
+        with db.engine.begin() as conn:  # Incrément par un autre worker
+            conn.execute(DataVersion.__table__.update().values(version=DataVersion.version + 1))
+        assert bump_data_version() == first + 2
+
+def test_orm_writes_bump_marker_version_only_for_marker_columns(make_app):
+    with make_app().app_context():
+        battle = _battle()
+        db.session.add(battle)
+        db.session.commit()
+        inserted = get_data_version()
+        assert inserted > 0
+
+        battle.description = "Victoire de Jourdan"
+        db.session.commit()
+        assert get_data_version() == inserted
+
+        battle.year = 1690
+        db.session.commit()
+        assert get_data_version() == inserted + 1
+        assert get_data_version(CONTENT_VERSION) >= inserted + 1
+
+        db.session.delete(battle)
+        db.session.commit()
+        assert get_data_version() == inserted + 2
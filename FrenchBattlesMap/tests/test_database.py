@@ -0,0 +1,86 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import text
+from app import db
+from models import Battle
+from migrations import MIGRATIONS, current_schema_version
+from services.database import REPLICA_BIND, SQLITE_BUSY_TIMEOUT_MS, read_replica
+
+def _pragma(name):
+    with db.engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+def _battle(name, year=1515):
+    return Battle(name=name, year=year, latitude=45.0, longitude=9.0, description="Test")
+
+def test_wal_pragmas(make_app):
+    with make_app(wal=True).app_context():
+        assert _pragma("journal_mode") == "wal"
+        assert _pragma("synchronous") == 1  # NORMAL
+        assert _pragma("busy_timeout") == SQLITE_BUSY_TIMEOUT_MS
+
+def test_single_file_pragmas(make_app):
+    with make_app(wal=False).app_context():
+        assert _pragma("journal_mode") == "delete"
+        assert _pragma("synchronous") == 2  # FULL, valeur par défaut
+        assert _pragma("busy_timeout") == SQLITE_BUSY_TIMEOUT_MS
+
+@pytest.mark.parametrize("wal", [True, False])
+def test_migrations_and_round_trip(make_app, wal):
+    with make_app(wal=wal).app_context():
+        assert current_schema_version() == MIGRATIONS[-1][0]
+        battle = _battle("Bataille de Marignan")
+        db.session.add(battle)
+        db.session.commit()
+        battle_id = battle.id
+        db.session.remove()
+
+        loaded = db.session.get(Battle, battle_id)
+        assert loaded.name == "Bataille de Marignan"
+        assert loaded.version is not None  # Journal des modifications renseigné à l'insertion
+        loaded.description = "Victoire de François Ier"
+        db.session.commit()
+        db.session.remove()
+        assert db.session.get(Battle, battle_id).description == "Victoire de François Ier"
+
+def test_session_uses_primary_without_replica_marking(make_app):
+    app = make_app(replica=True)
+    with app.app_context():
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(Battle.__table__.insert().values(name="Réplique", year=1, latitude=0.0, longitude=0.0))
+        db.session.add(_battle("Principale"))
+        db.session.commit()
+        assert [b.name for b in Battle.query.all()] == ["Principale"]
+
+def test_read_replica_routes_reads_and_keeps_writes_on_primary(make_app):
+    app = make_app(replica=True)
+
+    @app.route('/names')
+    @read_replica
+    def names():
+        return jsonify([b.name for b in Battle.query.order_by(Battle.id).all()])
+
+    @app.route('/write', methods=['POST'])
+    @read_replica
+    def write():
+        db.session.add(_battle("Écrite"))
+        db.session.commit()
+        # Une instruction DML explicite reste aussi sur la base principale
+        db.session.execute(Battle.__table__.update().values(description="Mise à jour"))
+        db.session.commit()
+        return jsonify({"ok": True})
+
+    with app.app_context():
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(Battle.__table__.insert().values(name="Réplique", year=1, latitude=0.0, longitude=0.0))
+
+    client = app.test_client()
+    assert client.get('/names').get_json() == ["Réplique"]
+    assert client.post('/write').status_code == 200
+
+    with app.app_context():
+        primary = db.session.query(Battle.name, Battle.description).all()
+        assert primary == [("Écrite", "Mise à jour")]
+        with db.engines[REPLICA_BIND].connect() as conn:
+            replica = conn.execute(db.select(Battle.name, Battle.description)).all()
+        assert replica == [("Réplique", None)]
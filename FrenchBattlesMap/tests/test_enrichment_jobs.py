@@ -0,0 +1,44 @@
+import pytest
+from app import app, db
+from migrations import apply_migrations
+from models import Battle
+from services import enrichment_jobs
+
+@pytest.fixture
+def client(monkeypatch):
+    # Tâches non exécutées : seule la sélection et la validation sont testées
+    monkeypatch.setattr(enrichment_jobs._job_executor, "submit", lambda *args: None)
+    with app.app_context():
+        apply_migrations()
+        db.session.execute(Battle.__table__.delete())
+        db.session.add_all([Battle(name=f"Bataille {i}", year=1500 + i, latitude=45.0, longitude=2.0)
+                            for i in range(3)])
+        db.session.commit()
+    return app.test_client()
+
+@pytest.mark.parametrize("payload", [
+    {"battle_ids": "abc"},
+    {"battle_ids": ["abc"]},
+    {"battle_ids": [True]},
+    {"start_year": "x"},
+    {"end_year": 1.5},
+    {"start_year": 1500, "only_missing": "non"},
+    ["battle_ids"],
+    {},
+])
+def test_invalid_payload_is_rejected(client, payload):
+    response = client.post('/api/v1/enrichment/jobs', json=payload)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_year_range_job(client):
+    response = client.post('/api/v1/enrichment/jobs', json={"start_year": 1501})
+    assert response.status_code == 202
+    assert response.get_json()["total"] == 2
+
+def test_large_id_list_is_selected_in_chunks(client):
+    with app.app_context():
+        ids = [battle_id for (battle_id,) in db.session.query(Battle.id)]
+        # Bien au-delà de la limite de variables de SQLite pour une seule requête IN
+        requested = ids + list(range(10**6, 10**6 + 40000))
+        assert enrichment_jobs._select_battle_ids(requested, only_missing=False) == sorted(ids)
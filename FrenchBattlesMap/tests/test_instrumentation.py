@@ -0,0 +1,31 @@
+from flask import Response, stream_with_context
+from sqlalchemy import text
+from app import db
+from services import instrumentation
+
+def test_streamed_response_is_recorded_after_generator(make_app):
+    app = make_app()
+    instrumentation.init_app(app)
+
+    @app.route('/stream')
+    def stream():
+        def generate():
+            for _ in range(3):
+                db.session.execute(text("SELECT 1"))
+                yield "ligne\n"
+        return Response(stream_with_context(generate()), mimetype='text/plain')
+
+    before = instrumentation.metrics.sql_queries['stream']
+    response = app.test_client().get('/stream')
+    assert response.get_data(as_text=True) == "ligne\n" * 3
+    response.close()
+    assert instrumentation.metrics.requests[('stream', 'GET', 200)] == 1
+    assert instrumentation.metrics.sql_queries['stream'] - before == 3
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_TOKEN", None)
+    assert instrumentation.metrics_authorized(None)
+    monkeypatch.setattr(instrumentation, "METRICS_TOKEN", "secret")
+    assert not instrumentation.metrics_authorized(None)
+    assert not instrumentation.metrics_authorized("Bearer autre")
+    assert instrumentation.metrics_authorized("Bearer secret")
@@ -0,0 +1,77 @@
+import io
+import os
+from PIL import Image
+from services import media_proxy
+from services.media_proxy import MediaProxy
+
+def _image_bytes(size=(1000, 500), mode='RGB', format='JPEG'):
+    output = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(output, format=format)
+    return output.getvalue()
+
+def _serve(body, content_type='image/jpeg'):
+    return lambda headers: (200, {'Content-Type': content_type}, body)
+
+def _proxy(stub_server, tmp_path, **options):
+    host = stub_server.url.split('://', 1)[1]
+    return MediaProxy(str(tmp_path / "media"), allowed_hosts=host, host_interval=0, **options)
+
+def _files(tmp_path, directory):
+    return [name for _, _, files in os.walk(tmp_path / "media" / directory) for name in files]
+
+def test_thumbnail_is_resized_to_its_size_class(stub_server, tmp_path):
+    stub_server.routes['/photo.jpg'] = _serve(_image_bytes())
+    stub_server.routes['/logo.png'] = _serve(_image_bytes(mode='RGBA', format='PNG'), 'image/png')
+    proxy = _proxy(stub_server, tmp_path)
+
+    path, mimetype, etag = proxy.thumbnail(f"{stub_server.url}/photo.jpg", 300)
+    assert mimetype == 'image/jpeg' and etag.endswith('-320')
+    with Image.open(path) as image:
+        assert max(image.size) == 320
+
+    path, mimetype, _ = proxy.thumbnail(f"{stub_server.url}/logo.png", 100)
+    assert mimetype == 'image/png'  # Transparence conservée
+    with Image.open(path) as image:
+        assert max(image.size) == 160
+
+def test_same_content_is_stored_once(stub_server, tmp_path):
+    body = _image_bytes()
+    stub_server.routes['/a.jpg'] = _serve(body)
+    stub_server.routes['/b.jpg'] = _serve(body)
+    proxy = _proxy(stub_server, tmp_path)
+    first = proxy.thumbnail(f"{stub_server.url}/a.jpg")
+    second = proxy.thumbnail(f"{stub_server.url}/b.jpg")
+    assert first == second
+    assert len(_files(tmp_path, 'originals')) == 1 and len(_files(tmp_path, 'thumbs')) == 1
+    assert proxy.thumbnail(f"{stub_server.url}/a.jpg", 300) == first
+    assert stub_server.paths() == ['/a.jpg', '/b.jpg']  # L'original en cache n'est pas retéléchargé
+
+def test_failed_url_is_not_retried_before_backoff(stub_server, tmp_path, monkeypatch):
+    stub_server.routes['/missing.jpg'] = lambda headers: (500, {}, b'')
+    proxy = _proxy(stub_server, tmp_path)
+    url = f"{stub_server.url}/missing.jpg"
+    assert proxy.thumbnail(url) is None
+    assert proxy.thumbnail(url) is None
+    assert len(stub_server.requests) == 1
+    monkeypatch.setattr(media_proxy, "FAILURE_TTL", 0)
+    assert proxy.thumbnail(url) is None
+    assert len(stub_server.requests) == 2
+
+def test_oversized_and_non_image_responses_are_rejected(stub_server, tmp_path):
+    stub_server.routes['/big.jpg'] = _serve(_image_bytes(size=(2000, 2000)))
+    stub_server.routes['/page.jpg'] = _serve(b'<html></html>', 'text/html')
+    stub_server.routes['/broken.jpg'] = _serve(b'pas une image')
+    proxy = _proxy(stub_server, tmp_path, max_source_bytes=10 * 1024)
+    for name in ('big.jpg', 'page.jpg', 'broken.jpg'):
+        assert proxy.thumbnail(f"{stub_server.url}/{name}") is None
+    assert _files(tmp_path, 'thumbs') == []
+
+def test_failures_table_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_proxy, "MAX_TRACKED_FAILURES", 3)
+    proxy = MediaProxy(str(tmp_path / "media"), allowed_hosts="example.org")
+    for i in range(10):
+        proxy._record_failure(f"clé-{i}")
+    assert list(proxy._failures) == ["clé-7", "clé-8", "clé-9"]
+    monkeypatch.setattr(media_proxy, "FAILURE_TTL", 0)
+    proxy._record_failure("clé-10")  # Échecs expirés purgés au passage
+    assert list(proxy._failures) == []
@@ -0,0 +1,14 @@
+from app import db
+from models import Battle
+from services.search import search_battles
+
+def test_excerpt_is_escaped_around_marks(make_app):
+    with make_app().app_context():
+        db.session.add(Battle(name="Bataille de Rocroi", year=1643, latitude=49.92, longitude=4.52,
+                              description='Condé <img src=x onerror="alert(1)"> & les tercios à Rocroi'))
+        db.session.commit()
+        total, results = search_battles("tercios")
+        assert total == 1
+        excerpt = results[0]['excerpt']
+        assert '<img' not in excerpt
+        assert '&lt;img src=x onerror=&quot;alert(1)&quot;&gt; &amp; les <mark>tercios</mark>' in excerpt
@@ -0,0 +1,70 @@
+import os
+import pytest
+from services.source_fetcher import SourceFetchError, SourceFetcher
+
+def _fetcher(tmp_path, **options):
+    options.setdefault('host_interval', 0)
+    return SourceFetcher(str(tmp_path / "sources"), **options)
+
+def _page(body, etag=None):
+    def route(headers):
+        if etag and headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, ({'ETag': etag} if etag else {}), body
+    return route
+
+def test_request_uses_the_exact_url(stub_server, tmp_path):
+    stub_server.routes['/search'] = _page(b"ok")
+    _fetcher(tmp_path).fetch(f"{stub_server.url}/search?q=Bataille%20de%20Bouvines&b=1&a=2")
+    assert stub_server.paths() == ["/search?q=Bataille%20de%20Bouvines&b=1&a=2"]
+
+def test_fresh_entry_is_served_without_request_until_ttl(stub_server, tmp_path):
+    stub_server.routes['/page'] = _page(b"contenu")
+    fetcher = _fetcher(tmp_path, ttl=60)
+    assert fetcher.fetch(f"{stub_server.url}/page") == b"contenu"
+    assert fetcher.fetch(f"{stub_server.url}/page") == b"contenu"
+    assert len(stub_server.requests) == 1
+    fetcher.ttl = 0  # Entrée expirée : nouvelle requête
+    fetcher.fetch(f"{stub_server.url}/page")
+    assert len(stub_server.requests) == 2
+
+def test_expired_entry_is_revalidated_with_etag(stub_server, tmp_path):
+    stub_server.routes['/page'] = _page(b"contenu", etag='"v1"')
+    fetcher = _fetcher(tmp_path, ttl=0)
+    assert fetcher.fetch(f"{stub_server.url}/page") == b"contenu"
+    assert fetcher.fetch(f"{stub_server.url}/page") == b"contenu"
+    (_, first, _), (_, second, _) = stub_server.requests
+    assert 'If-None-Match' not in first and second['If-None-Match'] == '"v1"'
+
+def test_stale_body_is_served_when_upstream_fails(stub_server, tmp_path):
+    stub_server.routes['/page'] = _page(b"ancien")
+    fetcher = _fetcher(tmp_path, ttl=0)
+    fetcher.fetch(f"{stub_server.url}/page")
+    stub_server.routes['/page'] = lambda headers: (500, {}, b"erreur")
+    assert fetcher.fetch(f"{stub_server.url}/page") == b"ancien"
+
+def test_failure_without_cached_copy_raises(stub_server, tmp_path):
+    stub_server.routes['/page'] = lambda headers: (500, {}, b"erreur")
+    with pytest.raises(SourceFetchError):
+        _fetcher(tmp_path).fetch(f"{stub_server.url}/page")
+
+def test_requests_to_a_host_are_spaced(stub_server, tmp_path):
+    stub_server.routes['/page'] = _page(b"ok")
+    fetcher = _fetcher(tmp_path, host_interval=0.2)
+    for i in range(3):
+        fetcher.fetch(f"{stub_server.url}/page?n={i}")
+    times = [started for _, _, started in stub_server.requests]
+    assert all(later - earlier >= 0.18 for earlier, later in zip(times, times[1:]))
+
+def test_prune_keeps_cache_under_budget(stub_server, tmp_path):
+    stub_server.routes['/page'] = _page(b"x" * 1000)
+    fetcher = _fetcher(tmp_path, max_bytes=3000)
+    urls = [f"{stub_server.url}/page?n={i}" for i in range(6)]
+    for url in urls:
+        fetcher.fetch(url)
+    cache_dir = tmp_path / "sources"
+    sizes = [os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(cache_dir) for name in files]
+    assert sum(sizes) <= 3000
+    fetcher.fetch(urls[-1])  # Entrée la plus récente conservée
+    fetcher.fetch(urls[0])  # La plus ancienne a été évincée
+    assert stub_server.paths().count("/page?n=5") == 1 and stub_server.paths().count("/page?n=0") == 2
@@ -0,0 +1,36 @@
+from app import db
+from models import Battle
+from services.statistics import get_statistics, refresh_statistics
+
+def _recomputed():
+    # Même résultat attendu qu'un recalcul complet
+    incremental = get_statistics()
+    refresh_statistics(db.session.connection())
+    return incremental, get_statistics()
+
+def test_orm_edits_keep_statistics_in_sync(make_app):
+    with make_app().app_context():
+        battles = [
+            Battle(name="Bataille de Bouvines", year=1214, latitude=50.58, longitude=3.21),
+            Battle(name="Siège d'Orléans", year=1428, latitude=47.90, longitude=1.90),
+            Battle(name="Bataille de Valmy", year=1792, latitude=49.08, longitude=4.76),
+        ]
+        db.session.add_all(battles)
+        db.session.commit()
+        bouvines, orleans, valmy = battles
+
+        orleans.name = "Assaut d'Orléans"  # Type dérivé du nom
+        bouvines.year = 1315  # Ancienne année minimale
+        db.session.commit()
+        assert orleans.battle_type == "Assaut"
+        incremental, full = _recomputed()
+        assert incremental == full
+        assert incremental["time_span"] == {"earliest": 1315, "latest": 1792}
+        assert incremental["types_distribution"] == {"Bataille": 2, "Assaut": 1}
+
+        db.session.delete(valmy)  # Année maximale supprimée
+        db.session.commit()
+        incremental, full = _recomputed()
+        assert incremental == full
+        assert incremental["time_span"] == {"earliest": 1315, "latest": 1428}
+        assert incremental["century_distribution"] == {"1300": 1, "1400": 1}
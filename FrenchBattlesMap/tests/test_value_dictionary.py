@@ -0,0 +1,56 @@
+from app import db
+from models import Battle, BattleValue
+from services.battle_enrichment import get_period_context
+from services.value_dictionary import ValueDictionary, join_context, split_context
+
+PERIOD = get_period_context(1515)
+
+def _values_count():
+    return db.session.query(BattleValue).count()
+
+def test_split_context_encodes_only_period_text():
+    detail = "\n\nInformations complémentaires de Gallica :\nExtrait..."
+    assert split_context(PERIOD + detail) == (PERIOD, detail)
+    assert split_context(PERIOD) == (PERIOD, None)
+    unique = "Paragraphe propre à une seule bataille" + detail
+    assert split_context(unique) == (None, unique)
+    for value in (PERIOD + detail, unique, "", None):
+        assert join_context(*split_context(value)) == value
+
+def test_remember_evicts_oldest_entries_in_batches():
+    dictionary = ValueDictionary(max_size=10)
+    dictionary.remember([(i, f"valeur {i}") for i in range(10)])
+    dictionary.remember([(10, "valeur 10")])
+    assert len(dictionary._values) == 10
+    assert 0 not in dictionary._values and "valeur 0" not in dictionary._ids
+    assert dictionary._values[10] == "valeur 10" and dictionary._ids["valeur 9"] == 9
+
+def test_values_are_encoded_at_flush(make_app):
+    with make_app().app_context():
+        detail = "\n\nInformations complémentaires de Gallica :\nExtrait..."
+        battle = Battle(name="Bataille de Marignan", year=1515, latitude=45.37, longitude=9.32)
+        db.session.add(battle)
+        battle.participants = "France contre Confédérés"
+        battle.historical_context = PERIOD
+        battle.historical_context += detail
+        with db.session.no_autoflush:
+            # Rien n'est écrit par les affectations ; les attributs rendent la valeur en attente
+            assert _values_count() == 0 and battle.participants_id is None
+            assert battle.to_dict()['historical_context'] == PERIOD + detail
+        db.session.commit()
+        assert _values_count() == 2
+        assert battle.context_detail == detail and battle.context_id is not None
+
+        other = Battle(name="Siège de Metz", year=1552, latitude=49.12, longitude=6.18)
+        other.historical_context = "Contexte rédigé pour cette seule bataille"
+        other.participants = "France contre Confédérés"
+        db.session.add(other)
+        db.session.commit()
+        assert _values_count() == 2
+        assert other.context_id is None and other.context_detail == "Contexte rédigé pour cette seule bataille"
+
+        battle_id = battle.id
+        db.session.expunge_all()
+        loaded = db.session.get(Battle, battle_id)
+        assert loaded.to_dict()['participants'] == "France contre Confédérés"
+        assert loaded.historical_context == PERIOD + detail
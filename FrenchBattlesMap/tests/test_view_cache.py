@@ -0,0 +1,51 @@
+import pytest
+from app import app, cache, db
+from migrations import apply_migrations
+from models import Battle
+from services.data_version import CONTENT_VERSION, bump_data_version
+
+def _cache_result(response):
+    return response.headers['Server-Timing'].split('view-cache;desc="')[1].split('"')[0]
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        apply_migrations()
+        db.session.execute(Battle.__table__.delete())
+        db.session.add_all([
+            Battle(name="Bataille de Bouvines", year=1214, latitude=50.58, longitude=3.21),
+            Battle(name="Bataille de Castillon", year=1453, latitude=44.85, longitude=-0.04),
+        ])
+        db.session.commit()
+        cache.clear()
+        ids = [battle.id for battle in Battle.query.order_by(Battle.year)]
+    yield app.test_client(), ids
+
+def test_enrichment_keeps_unrelated_views_cached(client):
+    client, (first, second) = client
+    urls = [f'/api/v1/battles/{first}', f'/api/v1/battles/{second}', '/api/v1/statistics']
+    etags = {url: client.get(url).headers['ETag'] for url in urls}
+
+    with app.app_context():
+        battle = db.session.get(Battle, first)
+        battle.description = "Victoire de Philippe Auguste"  # Comme l'enrichissement : aucun marqueur modifié
+        bump_data_version(CONTENT_VERSION)
+        db.session.commit()
+
+    responses = {url: client.get(url) for url in urls}
+    assert _cache_result(responses[urls[0]]) == 'miss'
+    assert responses[urls[0]].headers['ETag'] != etags[urls[0]]
+    assert responses[urls[0]].get_json()['description'] == "Victoire de Philippe Auguste"
+    for url in urls[1:]:
+        assert _cache_result(responses[url]) == 'hit'
+        assert responses[url].headers['ETag'] == etags[url]
+        assert client.get(url, headers={'If-None-Match': etags[url]}).status_code == 304
+
+def test_marker_change_invalidates_statistics(client):
+    client, (first, _) = client
+    etag = client.get('/api/v1/statistics').headers['ETag']
+    with app.app_context():
+        db.session.get(Battle, first).year = 1815
+        db.session.commit()
+    response = client.get('/api/v1/statistics')
+    assert _cache_result(response) == 'miss' and response.headers['ETag'] != etag
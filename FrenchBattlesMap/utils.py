@@ -1,97 +1,118 @@
 import json
+import os
 from app import db, cache
-from models import Battle
+from models import Battle, BATTLE_TYPES
+from services.data_version import bump_data_version
+from services.year_index import year_index
+from services.bulk_loader import bulk_insert_battles
 import logging
 import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
 from datetime import datetime, timedelta
 
-def generate_location_in_france():
+# Graine par défaut : la même base fictive est régénérée d'une installation à l'autre
+MOCK_SEED = int(os.environ.get("MOCK_SEED", 42))
+# Nombre de processus de génération (1 : dans le processus courant)
+MOCK_WORKERS = int(os.environ.get("MOCK_WORKERS", 1))
+# Lignes par tranche ; chaque tranche a son propre générateur, dérivé de la graine et
+# de sa position. La modifier change les données produites pour une même graine.
+MOCK_CHUNK_SIZE = 10000
+
+BATTLE_LOCATIONS = ('Paris', 'Lyon', 'Marseille', 'Bordeaux', 'Toulouse', 'Nice', 'Nantes',
+                    'Strasbourg', 'Montpellier', 'Lille', 'Rennes', 'Reims', 'Tours', 'Caen',
+                    'Orléans', 'Rouen', 'Grenoble', 'Dijon', 'Amiens', 'Nîmes', 'Saint-Étienne',
+                    'Angers', 'Villeurbanne', 'Le Mans', 'Clermont-Ferrand', 'Aix-en-Provence')
+LOCATION_SUFFIXES = ('sur-Loire', 'sur-Seine', 'sur-Rhône', 'sur-Garonne', 'en-Provence',
+                     'le-Château', 'la-Ville', 'sur-Mer', 'les-Bains', 'le-Comte')
+
+def generate_location_in_france(rng=random):
     # France mainland bounding box
     return {
-        'latitude': random.uniform(42.333333, 51.083333),
-        'longitude': random.uniform(-4.833333, 8.233333)
+        'latitude': rng.uniform(42.333333, 51.083333),
+        'longitude': rng.uniform(-4.833333, 8.233333)
     }
 
-def generate_battle_name(year, region=None):
-    battle_types = ['Bataille', 'Siège', 'Escarmouche', 'Défense', 'Assaut']
-    locations = ['Paris', 'Lyon', 'Marseille', 'Bordeaux', 'Toulouse', 'Nice', 'Nantes', 
-                'Strasbourg', 'Montpellier', 'Lille', 'Rennes', 'Reims', 'Tours', 'Caen',
-                'Orléans', 'Rouen', 'Grenoble', 'Dijon', 'Amiens', 'Nîmes', 'Saint-Étienne',
-                'Angers', 'Villeurbanne', 'Le Mans', 'Clermont-Ferrand', 'Aix-en-Provence']
-
-    if random.random() < 0.7:  # 70% chance of using a real city name
-        location = random.choice(locations)
+def generate_battle_name(year, region=None, rng=random):
+    if rng.random() < 0.7:  # 70% chance of using a real city name
+        location = rng.choice(BATTLE_LOCATIONS)
     else:
-        suffixes = ['sur-Loire', 'sur-Seine', 'sur-Rhône', 'sur-Garonne', 'en-Provence', 
-                   'le-Château', 'la-Ville', 'sur-Mer', 'les-Bains', 'le-Comte']
-        location = f"{random.choice(locations)}-{random.choice(suffixes)}"
+        location = f"{rng.choice(BATTLE_LOCATIONS)}-{rng.choice(LOCATION_SUFFIXES)}"
 
     # Utiliser "d'" devant les villes commençant par une voyelle
     vowels = ('a', 'e', 'i', 'o', 'u', 'é', 'è', 'ê', 'h')
     preposition = "d'" if location.lower().startswith(vowels) else "de "
 
-    return f"{random.choice(battle_types)} {preposition}{location}"
+    return f"{rng.choice(BATTLE_TYPES)} {preposition}{location}"
 
+@lru_cache(maxsize=None)
 def get_period_details(year):
+    """
+    Participants et issues possibles selon la période ; résultat partagé par le cache, donc non modifiable
+    """
     if year < 0:
-        return {
-            'participants': ['Tribus Gauloises', 'République Romaine', 'Tribus Germaniques', 'Tribus Celtes'],
-            'outcomes': ['Victoire des Gaulois', 'Victoire Romaine', 'Retraite stratégique', 'Issue indécise']
-        }
+        return MappingProxyType({
+            'participants': ('Tribus Gauloises', 'République Romaine', 'Tribus Germaniques', 'Tribus Celtes'),
+            'outcomes': ('Victoire des Gaulois', 'Victoire Romaine', 'Retraite stratégique', 'Issue indécise')
+        })
     elif year < 500:
-        return {
-            'participants': ['Empire Romain', 'Royaumes Francs', 'Wisigoths', 'Burgondes', 'Armée des Huns'],
-            'outcomes': ['Victoire Romaine', 'Victoire des Francs', 'Victoire des Wisigoths', 'Conquête territoriale']
-        }
+        return MappingProxyType({
+            'participants': ('Empire Romain', 'Royaumes Francs', 'Wisigoths', 'Burgondes', 'Armée des Huns'),
+            'outcomes': ('Victoire Romaine', 'Victoire des Francs', 'Victoire des Wisigoths', 'Conquête territoriale')
+        })
     elif year < 1000:
-        return {
-            'participants': ['Royaume des Francs', 'Raiders Vikings', 'Forces Carolingiennes', 'Duché de Bretagne'],
-            'outcomes': ['Victoire des Francs', 'Victoire Viking', 'Victoire Carolingienne', 'Paix négociée']
-        }
+        return MappingProxyType({
+            'participants': ('Royaume des Francs', 'Raiders Vikings', 'Forces Carolingiennes', 'Duché de Bretagne'),
+            'outcomes': ('Victoire des Francs', 'Victoire Viking', 'Victoire Carolingienne', 'Paix négociée')
+        })
     elif year < 1300:
-        return {
-            'participants': ['Royaume de France', 'Saint-Empire Romain', 'Royaume d\'Angleterre', 'Duché de Normandie'],
-            'outcomes': ['Victoire Française', 'Victoire Impériale', 'Victoire Anglaise', 'Trêve établie']
-        }
+        return MappingProxyType({
+            'participants': ('Royaume de France', 'Saint-Empire Romain', 'Royaume d\'Angleterre', 'Duché de Normandie'),
+            'outcomes': ('Victoire Française', 'Victoire Impériale', 'Victoire Anglaise', 'Trêve établie')
+        })
     elif year < 1500:
-        return {
-            'participants': ['Royaume de France', 'Royaume d\'Angleterre', 'Duché de Bourgogne', 'Couronne d\'Aragon'],
-            'outcomes': ['Victoire des Français', 'Victoire des Anglais', 'Victoire Bourguignonne', 'Accord de paix']
-        }
+        return MappingProxyType({
+            'participants': ('Royaume de France', 'Royaume d\'Angleterre', 'Duché de Bourgogne', 'Couronne d\'Aragon'),
+            'outcomes': ('Victoire des Français', 'Victoire des Anglais', 'Victoire Bourguignonne', 'Accord de paix')
+        })
     elif year < 1700:
-        return {
-            'participants': ['Royaume de France', 'Empire des Habsbourg', 'Provinces-Unies', 'États Protestants'],
-            'outcomes': ['Victoire Française', 'Victoire des Habsbourg', 'Victoire Protestante', 'Compromis trouvé']
-        }
+        return MappingProxyType({
+            'participants': ('Royaume de France', 'Empire des Habsbourg', 'Provinces-Unies', 'États Protestants'),
+            'outcomes': ('Victoire Française', 'Victoire des Habsbourg', 'Victoire Protestante', 'Compromis trouvé')
+        })
     elif year < 1800:
-        return {
-            'participants': ['Royaume de France', 'Coalition Européenne', 'République Française', 'Armée Révolutionnaire'],
-            'outcomes': ['Victoire Royaliste', 'Victoire Républicaine', 'Victoire de la Coalition', 'Armistice signé']
-        }
+        return MappingProxyType({
+            'participants': ('Royaume de France', 'Coalition Européenne', 'République Française', 'Armée Révolutionnaire'),
+            'outcomes': ('Victoire Royaliste', 'Victoire Républicaine', 'Victoire de la Coalition', 'Armistice signé')
+        })
     elif year < 1900:
-        return {
-            'participants': ['Empire Français', 'Royaume de Prusse', 'Empire Russe', 'Empire d\'Autriche'],
-            'outcomes': ['Victoire Française', 'Victoire Prussienne', 'Victoire de la Coalition', 'Traité de paix']
-        }
+        return MappingProxyType({
+            'participants': ('Empire Français', 'Royaume de Prusse', 'Empire Russe', 'Empire d\'Autriche'),
+            'outcomes': ('Victoire Française', 'Victoire Prussienne', 'Victoire de la Coalition', 'Traité de paix')
+        })
     else:
-        return {
-            'participants': ['Armée Française', 'Empire Allemand', 'Forces Alliées', 'Forces de l\'Axe'],
-            'outcomes': ['Victoire Française', 'Victoire Alliée', 'Retraite ordonnée', 'Position maintenue']
-        }
-
-def generate_description(year, battle_type, participants):
-    actions = ['a lancé une offensive contre', 'a défendu sa position contre', 'a assiégé', 'a tendu une embuscade à', 'a affronté']
-    resultats = [
-        'entraînant de lourdes pertes dans les deux camps',
-        'dans une bataille décisive',
-        'changeant l\'équilibre des forces',
-        'marquant un tournant stratégique',
-        'avec des conséquences majeures sur la suite du conflit'
-    ]
+        return MappingProxyType({
+            'participants': ('Armée Française', 'Empire Allemand', 'Forces Alliées', 'Forces de l\'Axe'),
+            'outcomes': ('Victoire Française', 'Victoire Alliée', 'Retraite ordonnée', 'Position maintenue')
+        })
+
+DESCRIPTION_ACTIONS = ('a lancé une offensive contre', 'a défendu sa position contre', 'a assiégé',
+                       'a tendu une embuscade à', 'a affronté')
+DESCRIPTION_RESULTS = (
+    'entraînant de lourdes pertes dans les deux camps',
+    'dans une bataille décisive',
+    'changeant l\'équilibre des forces',
+    'marquant un tournant stratégique',
+    'avec des conséquences majeures sur la suite du conflit'
+)
 
+def generate_description(year, battle_type, participants, rng=random):
     parts = participants.split(' contre ')
-    return f"Les forces de {parts[0]} {random.choice(actions)} {parts[1]}, {random.choice(resultats)}."
+    return f"Les forces de {parts[0]} {rng.choice(DESCRIPTION_ACTIONS)} {parts[1]}, {rng.choice(DESCRIPTION_RESULTS)}."
 
+@lru_cache(maxsize=None)
 def generate_sample_media_urls(year):
     """
     Génère des URLs d'exemple pour les médias en fonction de la période
@@ -135,76 +156,117 @@ def generate_sample_image_url(year):
     else:
         return 'https://upload.wikimedia.org/wikipedia/commons/9/99/Napoleon_Bonaparte_battle.jpg'
 
-def create_mock_data():
+# Répartition des batailles générées par période
+MOCK_DATA_PERIODS = [
+    {'range': (-100, 0), 'count': 600, 'name': 'Antiquité'},
+    {'range': (1, 1789), 'count': 6900, 'name': 'Moyen-Âge à Époque Moderne'},
+    {'range': (1789, 1815), 'count': 3000, 'name': 'Période Révolutionnaire'},
+    {'range': (1815, 1945), 'count': 4500, 'name': 'Époque Contemporaine'}
+]
+
+def generate_mock_row(year_range, rng=random):
+    """
+    Génère une bataille fictive sous forme de tuple (ordre de BATTLE_COLUMNS)
+    """
+    year = rng.randint(year_range[0], year_range[1])
+    period_details = get_period_details(year)
+    loc = generate_location_in_france(rng)
+
+    # Ensure different participants
+    participant1 = rng.choice(period_details['participants'])
+    participant2 = rng.choice([p for p in period_details['participants'] if p != participant1])
+    participants = f"{participant1} contre {participant2}"
+
+    battle_name = generate_battle_name(year, rng=rng)
+
+    return (
+        battle_name,
+        year,
+        loc['latitude'],
+        loc['longitude'],
+        generate_description(year, battle_name.split()[0], participants, rng),
+        participants,
+        rng.choice(period_details['outcomes']),
+        None,
+        None,
+        generate_sample_image_url(year),
+        generate_sample_media_urls(year)
+    )
+
+def generate_mock_chunk(seed, period_index, chunk_index, year_range, count):
+    """
+    Génère une tranche de batailles ; le résultat ne dépend que des arguments
+    """
+    # Graine textuelle : hachée en SHA-512, indépendante de PYTHONHASHSEED et du processus
+    rng = random.Random(f"{seed}:{period_index}:{chunk_index}")
+    return [generate_mock_row(year_range, rng) for _ in range(count)]
+
+def _mock_chunks(periods, seed):
+    for period_index, period in enumerate(periods):
+        for chunk_index, offset in enumerate(range(0, period['count'], MOCK_CHUNK_SIZE)):
+            count = min(MOCK_CHUNK_SIZE, period['count'] - offset)
+            yield seed, period_index, chunk_index, tuple(period['range']), count
+
+def _generate_chunks_in_pool(chunks, workers):
+    # Fenêtre bornée de tranches en cours : la mémoire ne dépend pas de la taille totale,
+    # et les tranches sont rendues dans l'ordre de soumission
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(generate_mock_chunk, *chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def generate_mock_rows(periods=MOCK_DATA_PERIODS, seed=MOCK_SEED, workers=MOCK_WORKERS):
+    """
+    Génère les batailles fictives sous forme de tuples (ordre de BATTLE_COLUMNS).
+
+    Les lignes sont produites par tranches de MOCK_CHUNK_SIZE, chacune avec son
+    propre générateur : pour une même graine, le résultat est identique quel
+    que soit le nombre de processus `workers`.
+    """
+    total = sum(period['count'] for period in periods)
+    logging.info("Génération de %s batailles (graine %s, %s processus)", total, seed, workers)
+    chunks = _mock_chunks(periods, seed)
+    if workers > 1:
+        batches = _generate_chunks_in_pool(chunks, workers)
+    else:
+        batches = (generate_mock_chunk(*chunk) for chunk in chunks)
+    for batch in batches:
+        yield from batch
+
+def scaled_periods(size, periods=MOCK_DATA_PERIODS):
+    """
+    Périodes de MOCK_DATA_PERIODS dont les effectifs sont ajustés pour totaliser `size` batailles
+    """
+    base = sum(period['count'] for period in periods)
+    scaled = [dict(period, count=period['count'] * size // base) for period in periods]
+    scaled[-1]['count'] += size - sum(period['count'] for period in scaled)
+    return scaled
+
+def create_mock_data(size=None, seed=MOCK_SEED, workers=MOCK_WORKERS):
+    """
+    Remplace les batailles par des données fictives (15 000 par défaut, ou `size`)
+    """
     logging.info("Starting to create mock data...")
     try:
-        # Clear existing data
-        logging.info("Deleting existing battles...")
-        Battle.query.delete()
+        # Suppression et insertion dans une seule transaction, par executemany
+        logging.info("Replacing existing battles...")
+        periods = scaled_periods(size) if size else MOCK_DATA_PERIODS
+        total_processed = bulk_insert_battles(generate_mock_rows(periods, seed, workers), replace=True)
+
+        # Les index en mémoire des autres workers se reconstruisent à la prochaine requête
+        bump_data_version()
         db.session.commit()
-        logging.info("Cleared existing data")
-
-        # Clear cache before adding new data
-        from routes import get_battles
-        cache.delete_memoized(get_battles)
-
-        # Define total battles per period with the same proportions
-        periods = [
-            {'range': (-100, 0), 'count': 600, 'name': 'Antiquité'},
-            {'range': (1, 1789), 'count': 6900, 'name': 'Moyen-Âge à Époque Moderne'},
-            {'range': (1789, 1815), 'count': 3000, 'name': 'Période Révolutionnaire'},
-            {'range': (1815, 1945), 'count': 4500, 'name': 'Époque Contemporaine'}
-        ]
-
-        total_processed = 0
-        batch_size = 100
-
-        for period in periods:
-            logging.info(f"Traitement de la période {period['name']}...")
-            battles_created = 0
-
-            while battles_created < period['count']:
-                batch = []
-                for _ in range(min(batch_size, period['count'] - battles_created)):
-                    year = random.randint(period['range'][0], period['range'][1])
-                    period_details = get_period_details(year)
-                    loc = generate_location_in_france()
-
-                    # Ensure different participants
-                    participant1 = random.choice(period_details['participants'])
-                    participant2 = random.choice([p for p in period_details['participants'] if p != participant1])
-                    participants = f"{participant1} contre {participant2}"
-
-                    battle_name = generate_battle_name(year)
-
-                    batch.append(Battle(
-                        name=battle_name,
-                        year=year,
-                        latitude=loc['latitude'],
-                        longitude=loc['longitude'],
-                        description=generate_description(year, battle_name.split()[0], participants),
-                        participants=participants,
-                        outcome=random.choice(period_details['outcomes']),
-                        image_url=generate_sample_image_url(year),
-                        media_urls=generate_sample_media_urls(year)
-                    ))
-
-                try:
-                    db.session.bulk_save_objects(batch)
-                    db.session.commit()
-                    battles_created += len(batch)
-                    total_processed += len(batch)
-                    logging.info(f"Ajout du lot : {total_processed}/15000 batailles. Période en cours : {period['name']}")
-                except Exception as e:
-                    logging.error(f"Erreur lors de l'ajout du lot dans la période {period['name']} : {str(e)}")
-                    db.session.rollback()
-                    raise
+        year_index.invalidate()
+        cache.clear()
 
         # Verify data was inserted
-        count = Battle.query.count()
-        logging.info(f"Nombre total de batailles dans la base de données après insertion : {count}")
+        logging.info("Nombre total de batailles dans la base de données après insertion : %s", total_processed)
         return True
     except Exception as e:
-        logging.error(f"Erreur lors de la création des données : {str(e)}")
+        logging.error("Erreur lors de la création des données : %s", e)
         db.session.rollback()
-        raise
\ No newline at end of file
+        raise